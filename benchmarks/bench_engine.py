@@ -0,0 +1,92 @@
+"""Micro-benchmark du moteur : coût par coup, ancienne grille de chaînes vs bitboards.
+
+Mesure aussi la grille générale (détection incrémentale) en 3×3, 4×4 et 5×5.
+
+Usage : python benchmarks/bench_engine.py [nombre_de_parties]
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import engine  # noqa: E402
+
+WIN_CONDITIONS = [
+    (0, 1, 2), (3, 4, 5), (6, 7, 8),
+    (0, 3, 6), (1, 4, 7), (2, 5, 8),
+    (0, 4, 8), (2, 4, 6),
+]
+
+
+def ancienne_partie(ordre):
+    """Reproduction de l'ancienne logique (liste de chaînes + check_win / check_draw)."""
+    board = [" " for _ in range(9)]
+    symbole = "X"
+    coups = 0
+    for case in ordre:
+        board[case] = symbole
+        coups += 1
+        if any(board[a] == board[b] == board[c] == symbole for a, b, c in WIN_CONDITIONS):
+            return coups
+        if " " not in board:
+            return coups
+        symbole = "O" if symbole == "X" else "X"
+    return coups
+
+
+def nouvelle_partie(ordre):
+    partie = engine.Morpion()
+    camp = engine.X
+    coups = 0
+    for case in ordre:
+        coups += 1
+        if partie.jouer(case, camp) != engine.EN_COURS:
+            return coups
+        camp ^= 1
+    return coups
+
+
+def partie_grille(taille, aligner):
+    def jouer(ordre):
+        partie = engine.Grille(taille, aligner)
+        camp = engine.X
+        coups = 0
+        for case in ordre:
+            coups += 1
+            if partie.jouer(case, camp) != engine.EN_COURS:
+                return coups
+            camp ^= 1
+        return coups
+    return jouer
+
+
+def mesurer(fonction, ordres):
+    debut = time.perf_counter()
+    coups = sum(fonction(ordre) for ordre in ordres)
+    duree = time.perf_counter() - debut
+    return duree / coups * 1e9, coups
+
+
+def main():
+    parties = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    rng = random.Random(42)
+    ordres = [rng.sample(range(9), 9) for _ in range(parties)]
+
+    ns_ancien, coups_ancien = mesurer(ancienne_partie, ordres)
+    ns_nouveau, coups_nouveau = mesurer(nouvelle_partie, ordres)
+    assert coups_ancien == coups_nouveau
+
+    print(f"{parties} parties, {coups_nouveau} coups")
+    print(f"  grille de chaînes : {ns_ancien:8.1f} ns/coup")
+    print(f"  bitboards         : {ns_nouveau:8.1f} ns/coup  (x{ns_ancien / ns_nouveau:.1f})")
+
+    for nom, (taille, aligner) in engine.VARIANTES.items():
+        ordres = [rng.sample(range(taille * taille), taille * taille) for _ in range(parties // 4)]
+        ns, _ = mesurer(partie_grille(taille, aligner), ordres)
+        print(f"  grille {nom} ({aligner} alignés) : {ns:8.1f} ns/coup")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""Micro-benchmark de TicTacToeView : coût d'un coup côté composants Discord.
+
+Compare l'ancienne vue, qui recréait ses boutons et re-sérialisait tout le
+payload à chaque coup, à la vue actuelle, qui ne met à jour que la case
+jouée. Pour chaque coup : temps, pic de mémoire allouée (tracemalloc) et
+nombre de boutons sérialisés (`to_component_dict`).
+
+Usage : python benchmarks/bench_vue.py [nombre_de_parties]
+"""
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DOSSIER = tempfile.mkdtemp(prefix="morpion-vue-")
+os.environ.setdefault("TOKEN_BOT_DISCORD", "hors-ligne")
+os.environ["DB_CHEMIN"] = os.path.join(DOSSIER, "vue.db")
+
+import discord  # noqa: E402
+
+import engine  # noqa: E402
+import main  # noqa: E402
+from duels import Duel, EtatDuel  # noqa: E402
+from rendu import EMOJIS_MORPION  # noqa: E402
+
+
+class AncienneVue(discord.ui.View):
+    """Reproduction de l'ancienne vue : neuf boutons recréés à chaque coup."""
+
+    def __init__(self):
+        super().__init__(timeout=None)
+        self.partie = engine.Morpion()
+        self.update_buttons()
+
+    def update_buttons(self):
+        self.clear_items()
+        for i in range(engine.CASES):
+            symbole = self.partie.symbole(i)
+            self.add_item(discord.ui.Button(
+                emoji=EMOJIS_MORPION[symbole],
+                style=discord.ButtonStyle.secondary,
+                custom_id=f"case_{i}",
+                disabled=symbole != " ",
+                row=i // 3
+            ))
+
+    def jouer(self, case, camp):
+        resultat = self.partie.jouer(case, camp)
+        self.update_buttons()
+        return resultat
+
+
+class VueActuelle:
+    """Adaptateur sur main.TicTacToeView : seule la case jouée est mise à jour."""
+
+    def __init__(self):
+        duel = Duel(
+            joueur1_id=1, joueur1_nom="joueur1", montant=0, channel_id=1,
+            etat=EtatDuel.LANCE, joueur2_id=2, joueur2_nom="joueur2"
+        )
+        self.vue = main.TicTacToeView(duel, joueur_actif_id=1)
+        main.metrics.vues.discard(self.vue)
+
+    def jouer(self, case, camp):
+        return self.vue.appliquer_coup(case)
+
+    def to_components(self):
+        return self.vue.to_components()
+
+
+def jouer_partie(vue, ordre):
+    """Joue une partie ; chaque coup se termine par la sérialisation envoyée à Discord."""
+    camp = engine.X
+    coups = 0
+    for case in ordre:
+        coups += 1
+        resultat = vue.jouer(case, camp)
+        vue.to_components()
+        if resultat != engine.EN_COURS:
+            break
+        camp ^= 1
+    return coups
+
+
+def mesurer(fabrique, ordres, echantillon=2000):
+    """(µs par coup, octets alloués au pic par coup, boutons sérialisés par coup).
+
+    Les vues sont créées avant la mesure : seuls les coups comptent.
+    """
+    vues = [fabrique() for _ in ordres]
+    debut = time.perf_counter()
+    coups = sum(jouer_partie(vue, ordre) for vue, ordre in zip(vues, ordres))
+    duree = time.perf_counter() - debut
+
+    serialisations = 0
+    origine = discord.ui.Button.to_component_dict
+
+    def compter(self):
+        nonlocal serialisations
+        serialisations += 1
+        return origine(self)
+
+    vues = [fabrique() for _ in ordres[:echantillon]]
+    octets = coups_echantillon = 0
+    discord.ui.Button.to_component_dict = compter
+    tracemalloc.start()
+    try:
+        for vue, ordre in zip(vues, ordres):
+            camp = engine.X
+            for case in ordre:
+                tracemalloc.reset_peak()
+                avant = tracemalloc.get_traced_memory()[0]
+                resultat = vue.jouer(case, camp)
+                vue.to_components()
+                octets += tracemalloc.get_traced_memory()[1] - avant
+                coups_echantillon += 1
+                if resultat != engine.EN_COURS:
+                    break
+                camp ^= 1
+    finally:
+        tracemalloc.stop()
+        discord.ui.Button.to_component_dict = origine
+    return duree / coups * 1e6, octets / coups_echantillon, serialisations / coups_echantillon
+
+
+async def principal():
+    parties = int(sys.argv[1]) if len(sys.argv) > 1 else 5_000
+    rng = random.Random(42)
+    ordres = [rng.sample(range(9), 9) for _ in range(parties)]
+    print(f"{parties} parties (3×3)")
+    for nom, fabrique in (("boutons recréés", AncienneVue), ("case mise à jour", VueActuelle)):
+        us, octets, boutons = mesurer(fabrique, ordres)
+        print(f"  {nom:17}: {us:7.1f} µs/coup, {octets:7.0f} octets alloués/coup, {boutons:4.1f} boutons sérialisés/coup")
+
+
+if __name__ == "__main__":
+    asyncio.run(principal())
@@ -0,0 +1,287 @@
+"""Test de charge hors ligne : commandes et vues pilotées par de faux objets Discord.
+
+Importe main.py avec une base SQLite temporaire, remplace l'API Discord par
+des objets factices (Interaction, Member, Channel, Message) qui simulent
+une latence réseau, puis fait jouer des duels complets en parallèle :
+/sleeping, rejoindre, croupier, lancement et coups jusqu'à la fin. Des
+lecteurs appellent /statsall et /mystats pendant ce temps.
+
+Mesures : latence p50/p99 par gestionnaire, retard de la boucle
+d'événements, parties par seconde et mémoire par duel vivant (tracemalloc).
+
+Usage : python benchmarks/charge.py [--duels 200] [--paralleles 50] [--lecteurs 5]
+                                    [--latence-api 0.02] [--duels-vivants 500]
+"""
+import argparse
+import asyncio
+import gc
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+RACINE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RACINE)
+
+DOSSIER = tempfile.mkdtemp(prefix="morpion-charge-")
+os.environ.setdefault("TOKEN_BOT_DISCORD", "hors-ligne")
+os.environ["DB_CHEMIN"] = os.path.join(DOSSIER, "charge.db")
+os.environ["IA_TABLE"] = os.path.join(DOSSIER, "ia.bin")
+# Aucune expiration pendant la mesure
+for variable in ("DELAI_REJOINDRE", "DELAI_CROUPIER", "DELAI_COUP", "DELAI_FILE"):
+    os.environ[variable] = "3600"
+
+import discord  # noqa: E402
+
+import main  # noqa: E402
+
+LATENCE_API = 0.02
+
+
+async def appel_api():
+    """Latence simulée d'un aller-retour vers Discord (±50 %)."""
+    if LATENCE_API:
+        await asyncio.sleep(random.uniform(0.5, 1.5) * LATENCE_API)
+
+
+class FauxRole:
+    def __init__(self, role_id, nom):
+        self.id = role_id
+        self.name = nom
+        self.mention = f"<@&{role_id}>"
+
+
+class FauxMembre:
+    def __init__(self, membre_id, roles=()):
+        self.id = membre_id
+        self.display_name = f"joueur{membre_id}"
+        self.mention = f"<@{membre_id}>"
+        self.avatar = None
+        self.roles = list(roles)
+        self._roles = {role.id for role in roles}
+
+    def get_role(self, role_id):
+        return role_id if role_id in self._roles else None
+
+
+class FauxServeur:
+    def __init__(self, roles):
+        self.id = 1
+        self.roles = roles
+        self.filesize_limit = 25 * 1024 * 1024
+
+
+class FauxMessage:
+    _ids = iter(range(10**12, 10**13))
+
+    def __init__(self, embed=None):
+        self.id = next(self._ids)
+        self.embeds = [embed] if embed else []
+
+    async def edit(self, embed=None, **kwargs):
+        await appel_api()
+        if embed is not None:
+            self.embeds = [embed]
+
+    async def delete(self):
+        await appel_api()
+
+
+class FauxSalon(discord.TextChannel):
+    """TextChannel sans état interne : passe le contrôle isinstance de /sleeping."""
+
+    def __init__(self):
+        self.id = 42
+        self.name = "morpion"
+
+    async def send(self, embed=None, **kwargs):
+        await appel_api()
+        return FauxMessage(embed)
+
+
+class FausseReponse:
+    def __init__(self, interaction):
+        self.interaction = interaction
+
+    async def send_message(self, content=None, embed=None, **kwargs):
+        await appel_api()
+        self.interaction.message = FauxMessage(embed)
+
+    async def edit_message(self, embed=None, **kwargs):
+        await appel_api()
+        if embed is not None and self.interaction.message is not None:
+            self.interaction.message.embeds = [embed]
+
+    async def defer(self, **kwargs):
+        await appel_api()
+
+
+class FausseInteraction:
+    def __init__(self, membre, serveur, salon, message=None, custom_id=None):
+        self.user = membre
+        self.guild = serveur
+        self.channel = salon
+        self.message = message
+        self.data = {"custom_id": custom_id}
+        self.response = FausseReponse(self)
+
+    async def original_response(self):
+        return self.message
+
+    async def edit_original_response(self, **kwargs):
+        await appel_api()
+
+
+class Mesures:
+    def __init__(self):
+        self.latences = {}
+
+    async def chronometrer(self, nom, coroutine):
+        debut = time.perf_counter()
+        await coroutine
+        self.latences.setdefault(nom, []).append(time.perf_counter() - debut)
+
+    def rapport(self):
+        for nom, valeurs in sorted(self.latences.items()):
+            valeurs.sort()
+            p99 = valeurs[min(len(valeurs) - 1, int(len(valeurs) * 0.99))]
+            print(
+                f"  {nom:<12} n={len(valeurs):<6} p50={statistics.median(valeurs) * 1000:7.2f} ms"
+                f"  p99={p99 * 1000:7.2f} ms"
+            )
+
+
+async def surveiller_boucle(retards, arret, periode=0.01):
+    """Retard de réveil d'une tâche qui dort `periode` : mesure du blocage de la boucle."""
+    while not arret.is_set():
+        debut = time.perf_counter()
+        await asyncio.sleep(periode)
+        retards.append(time.perf_counter() - debut - periode)
+
+
+async def jouer_duel(numero, serveur, salon, role_croupier, mesures):
+    joueur1 = FauxMembre(1_000_000 + 2 * numero)
+    joueur2 = FauxMembre(1_000_001 + 2 * numero)
+    croupier = FauxMembre(2_000_000 + numero, [role_croupier])
+
+    lancement = FausseInteraction(joueur1, serveur, salon)
+    await mesures.chronometrer("sleeping", main.duel.callback(lancement, random.randint(1, 10_000)))
+    lobby = lancement.message
+    duel = main.registre.duel_du_message(lobby.id)
+    vue = duel.vue
+
+    await mesures.chronometrer("rejoindre", vue.rejoindre.callback(FausseInteraction(joueur2, serveur, salon, lobby)))
+    await mesures.chronometrer("croupier", vue.rejoindre_croupier(FausseInteraction(croupier, serveur, salon, lobby)))
+    await mesures.chronometrer("lancer", vue.lancer_partie(FausseInteraction(croupier, serveur, salon, lobby)))
+
+    partie = duel.vue
+    joueurs = {joueur1.id: joueur1, joueur2.id: joueur2}
+    while not partie.is_finished():
+        case = random.choice([c for c in range(partie.partie.cases_total) if partie.partie.case_libre(c)])
+        interaction = FausseInteraction(
+            joueurs[partie.joueur_actif_id], serveur, salon, custom_id=f"morpion:{duel.duel_id}:{case}"
+        )
+        await mesures.chronometrer("coup", partie.on_button_click(interaction))
+
+
+async def lire_stats(serveur, salon, mesures, arret):
+    lecteur = FauxMembre(1_000_000 + 2 * random.randint(0, 100))
+    while not arret.is_set():
+        await mesures.chronometrer("statsall", main.statsall.callback(FausseInteraction(lecteur, serveur, salon)))
+        await mesures.chronometrer("mystats", main.mystats.callback(FausseInteraction(lecteur, serveur, salon), "tout"))
+        await asyncio.sleep(0.01)
+
+
+async def phase_charge(args, serveur, salon, role_croupier):
+    mesures = Mesures()
+    retards = []
+    arret = asyncio.Event()
+    surveillant = asyncio.create_task(surveiller_boucle(retards, arret))
+    lecteurs = [asyncio.create_task(lire_stats(serveur, salon, mesures, arret)) for _ in range(args.lecteurs)]
+
+    limite = asyncio.Semaphore(args.paralleles)
+
+    async def duel_limite(numero):
+        async with limite:
+            await jouer_duel(numero, serveur, salon, role_croupier, mesures)
+
+    debut = time.perf_counter()
+    await asyncio.gather(*(duel_limite(numero) for numero in range(args.duels)))
+    await main.db.flush()
+    duree = time.perf_counter() - debut
+
+    arret.set()
+    await asyncio.gather(surveillant, *lecteurs)
+
+    print(f"{args.duels} duels ({args.paralleles} en parallèle), {args.lecteurs} lecteurs de stats, "
+          f"latence API simulée {LATENCE_API * 1000:.0f} ms")
+    print(f"  parties/s    : {args.duels / duree:.1f} ({duree:.2f} s)")
+    mesures.rapport()
+    retards.sort()
+    print(f"  retard boucle : p50={statistics.median(retards) * 1000:.2f} ms  "
+          f"p99={retards[int(len(retards) * 0.99)] * 1000:.2f} ms  max={retards[-1] * 1000:.2f} ms")
+    print(f"  writer       : {main.db.compteur.resume()}")
+
+
+async def phase_memoire(args, serveur, salon, role_croupier):
+    """Mémoire par duel vivant : lobbies rejoints et parties lancées gardés en mémoire."""
+    global LATENCE_API
+    LATENCE_API = 0
+    gc.collect()
+    tracemalloc.start()
+    avant = tracemalloc.take_snapshot()
+    for numero in range(args.duels_vivants):
+        numero += 10 * args.duels
+        joueur1 = FauxMembre(1_000_000 + 2 * numero)
+        joueur2 = FauxMembre(1_000_001 + 2 * numero)
+        croupier = FauxMembre(2_000_000 + numero, [role_croupier])
+        lancement = FausseInteraction(joueur1, serveur, salon)
+        await main.duel.callback(lancement, 100)
+        lobby = lancement.message
+        vue = main.registre.duel_du_message(lobby.id).vue
+        await vue.rejoindre.callback(FausseInteraction(joueur2, serveur, salon, lobby))
+        await vue.rejoindre_croupier(FausseInteraction(croupier, serveur, salon, lobby))
+        await vue.lancer_partie(FausseInteraction(croupier, serveur, salon, lobby))
+    await main.db.flush()
+    gc.collect()
+    apres = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    octets = sum(stat.size_diff for stat in apres.compare_to(avant, "filename"))
+    print(f"  mémoire      : {octets / args.duels_vivants / 1024:.1f} Ko par partie lancée "
+          f"({args.duels_vivants} parties vivantes)")
+
+
+async def executer(args):
+    global LATENCE_API
+    LATENCE_API = args.latence_api
+    await main.preparer()
+    main.bot._connection.user = FauxMembre(999)
+    role_croupier = FauxRole(50, "croupier")
+    serveur = FauxServeur([FauxRole(49, "sleeping"), role_croupier])
+    salon = FauxSalon()
+
+    await phase_charge(args, serveur, salon, role_croupier)
+    await phase_memoire(args, serveur, salon, role_croupier)
+
+
+def analyser_arguments():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--duels", type=int, default=200, help="duels joués jusqu'au bout")
+    parser.add_argument("--paralleles", type=int, default=50, help="duels simultanés")
+    parser.add_argument("--lecteurs", type=int, default=5, help="lecteurs de stats en boucle")
+    parser.add_argument("--latence-api", type=float, default=LATENCE_API, help="latence simulée de Discord (s)")
+    parser.add_argument("--duels-vivants", type=int, default=500, help="parties gardées en vie pour la mesure mémoire")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    arguments = analyser_arguments()
+    try:
+        asyncio.run(executer(arguments))
+    finally:
+        main.db.close()
+        shutil.rmtree(DOSSIER, ignore_errors=True)
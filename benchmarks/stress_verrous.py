@@ -0,0 +1,179 @@
+"""Stress des verrous par duel : clics simultanés sur les vraies vues.
+
+Reprend les faux objets Discord de charge.py (base SQLite temporaire,
+latence API simulée) et envoie des rafales de clics concurrents aux
+transitions « vérifier puis modifier » de main.py :
+
+- rejoindre : plusieurs joueurs cliquent « rejoindre » sur le même lobby ;
+- lancer : le croupier clique plusieurs fois « lancer la partie » ;
+- coups : le joueur actif clique deux cases pendant que l'adversaire en
+  clique une, jusqu'à la fin de la partie.
+
+Le scénario est joué deux fois : en appelant directement les méthodes
+`_rejoindre`, `_lancer_partie` et `_jouer_coup` (sans verrou), puis par les
+callbacks qui prennent VerrousDuels. Les anomalies sont comptées dans les
+deux cas ; avec verrou, le registre et la liste `coups` de chaque partie
+doivent rester cohérents et les duels distincts avancer en parallèle.
+
+Usage : python benchmarks/stress_verrous.py [duels] [clics_par_duel]
+"""
+import asyncio
+import os
+import random
+import shutil
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import charge  # noqa: E402
+from charge import FausseInteraction, FauxMembre, FauxRole, FauxSalon, FauxServeur  # noqa: E402
+
+import engine  # noqa: E402
+
+main = charge.main
+
+LATENCE_API = 0.005
+
+
+class SalonCompteur(FauxSalon):
+    """Salon qui compte les messages envoyés (un par partie lancée)."""
+
+    def __init__(self):
+        super().__init__()
+        self.envois = 0
+
+    async def send(self, embed=None, **kwargs):
+        self.envois += 1
+        return await super().send(embed=embed, **kwargs)
+
+
+def rejoindre(vue, verrou):
+    return vue.rejoindre.callback if verrou else vue._rejoindre
+
+
+def lancer(vue, verrou):
+    return vue.lancer_partie if verrou else vue._lancer_partie
+
+
+def jouer(vue, verrou):
+    return vue.on_button_click if verrou else vue._jouer_coup
+
+
+def coups_coherents(vue):
+    """Les coups enregistrés sont distincts et rejouent exactement la grille affichée."""
+    if len(set(vue.coups)) != len(vue.coups):
+        return False
+    autre_id = vue.duel.adversaire(vue.premier_id)
+    rejeu = engine.nouvelle_partie(vue.duel.taille, vue.duel.aligner)
+    for i, case in enumerate(vue.coups):
+        rejeu.jouer(case, vue.camps[vue.premier_id if i % 2 == 0 else autre_id])
+    return all(rejeu.symbole(case) == vue.partie.symbole(case) for case in range(vue.partie.cases_total))
+
+
+async def scenario(verrou, premier, nb_duels, nb_clics, serveur, role_croupier):
+    salon = SalonCompteur()
+    anomalies = {"rejoindre": 0, "lancer": 0, "coups": 0, "registre": 0}
+
+    # Lobbies : un par duel, ouverts en parallèle
+    lobbies = []
+    for numero in range(premier, premier + nb_duels):
+        joueur1 = FauxMembre(1_000_000 + 100 * numero)
+        candidats = [FauxMembre(1_000_001 + 100 * numero + c) for c in range(nb_clics)]
+        croupier = FauxMembre(2_000_000 + numero, [role_croupier])
+        lobbies.append((FausseInteraction(joueur1, serveur, salon), candidats, croupier))
+    await asyncio.gather(*(main.duel.callback(lancement, 100) for lancement, _, _ in lobbies))
+    duels = []
+    for lancement, candidats, croupier in lobbies:
+        duel = main.registre.duel_du_message(lancement.message.id)
+        duels.append((duel, lancement.message, candidats, croupier))
+
+    # Rafale « rejoindre » : un seul candidat doit devenir joueur 2
+    debut = time.perf_counter()
+    await asyncio.gather(*(
+        rejoindre(duel.vue, verrou)(FausseInteraction(candidat, serveur, salon, lobby))
+        for duel, lobby, candidats, _ in duels
+        for candidat in candidats
+    ))
+    duree = time.perf_counter() - debut
+    for duel, _, candidats, _ in duels:
+        lies = [c.id for c in candidats if main.registre.duel_du_joueur(c.id) is duel]
+        if lies != [duel.joueur2_id]:
+            anomalies["rejoindre"] += 1
+
+    for duel, lobby, _, croupier in duels:
+        await duel.vue.rejoindre_croupier(FausseInteraction(croupier, serveur, salon, lobby))
+
+    # Rafale « lancer » : une seule partie doit être publiée par duel
+    await asyncio.gather(*(
+        lancer(duel.vue, verrou)(FausseInteraction(croupier, serveur, salon, lobby))
+        for duel, lobby, _, croupier in duels
+        for _ in range(nb_clics)
+    ))
+    anomalies["lancer"] = salon.envois - nb_duels
+    vues = []
+    for duel, _, _, _ in duels:
+        if duel.etat != main.EtatDuel.LANCE or main.registre.duel_du_message(duel.message_id) is not duel:
+            anomalies["registre"] += 1
+        vues.append(duel.vue)
+
+    # Rafales de coups : deux clics du joueur actif, un de l'adversaire
+    while True:
+        en_cours = [vue for vue in vues if not vue.is_finished()]
+        if not en_cours:
+            break
+        rafale = []
+        for vue in en_cours:
+            libres = [c for c in range(vue.partie.cases_total) if vue.partie.case_libre(c)]
+            actif_id = vue.joueur_actif_id
+            cliqueurs = [actif_id, actif_id, vue.duel.adversaire(actif_id)]
+            for joueur_id, case in zip(cliqueurs, random.sample(libres, min(3, len(libres)))):
+                interaction = FausseInteraction(
+                    FauxMembre(joueur_id), serveur, salon, custom_id=f"morpion:{vue.game_id}:{case}"
+                )
+                rafale.append(jouer(vue, verrou)(interaction))
+        await asyncio.gather(*rafale)
+
+    await main.db.flush()
+    for vue in vues:
+        if not coups_coherents(vue):
+            anomalies["coups"] += 1
+        duel = vue.duel
+        if duel.duel_id in {d.duel_id for d in main.registre} or main.registre.duel_du_joueur(duel.joueur1_id):
+            anomalies["registre"] += 1
+    return duree, anomalies
+
+
+async def executer(nb_duels, nb_clics):
+    charge.LATENCE_API = LATENCE_API
+    await main.preparer()
+    main.bot._connection.user = FauxMembre(999)
+    role_croupier = FauxRole(50, "croupier")
+    serveur = FauxServeur([FauxRole(49, "sleeping"), role_croupier])
+
+    duree, anomalies = await scenario(False, 0, nb_duels, nb_clics, serveur, role_croupier)
+    print(f"sans verrou : {anomalies} sur {nb_duels} duels (rejoindre en {duree * 1000:.0f} ms)")
+
+    duree, anomalies = await scenario(True, nb_duels, nb_duels, nb_clics, serveur, role_croupier)
+    print(f"avec verrou : {anomalies} sur {nb_duels} duels (rejoindre en {duree * 1000:.0f} ms)")
+    print(f"verrous restants : {len(main.verrous)}")
+    assert not any(anomalies.values())
+    assert len(main.verrous) == 0
+    # Un duel sérialisé prend au plus `clics` × latence ; tous les duels en parallèle
+    # doivent tenir dans le même ordre de grandeur.
+    assert duree < nb_clics * LATENCE_API * 1.5 * 20
+
+
+def principal():
+    nb_duels = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    nb_clics = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    random.seed(1)
+    try:
+        asyncio.run(executer(nb_duels, nb_clics))
+    finally:
+        main.db.close()
+        shutil.rmtree(charge.DOSSIER, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    principal()
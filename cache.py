@@ -0,0 +1,86 @@
+from collections import OrderedDict
+
+# Marqueur d'entrée absente (None est une valeur valide à mettre en cache)
+_ABSENT = object()
+
+
+class CacheVersionne:
+    """Cache LRU borné dont chaque entrée est liée à une version des données.
+
+    Une entrée n'est servie que si sa version est égale à la version demandée ;
+    dès que la base change de version, la lecture suivante la recharge. Les
+    compteurs `hits` / `misses` mesurent l'efficacité du cache.
+    """
+
+    def __init__(self, taille_max=1024):
+        self.taille_max = taille_max
+        self.hits = 0
+        self.misses = 0
+        self._entrees = OrderedDict()
+
+    def get(self, cle, version, defaut=None):
+        entree = self._entrees.get(cle)
+        if entree is None or entree[0] != version:
+            self.misses += 1
+            return defaut
+        self._entrees.move_to_end(cle)
+        self.hits += 1
+        return entree[1]
+
+    def set(self, cle, version, valeur):
+        self._entrees[cle] = (version, valeur)
+        self._entrees.move_to_end(cle)
+        if len(self._entrees) > self.taille_max:
+            self._entrees.popitem(last=False)
+
+    async def obtenir(self, cle, version, charger):
+        """Lecture à travers le cache : `charger()` n'est attendu qu'en cas de miss."""
+        valeur = self.get(cle, version, _ABSENT)
+        if valeur is _ABSENT:
+            valeur = await charger()
+            self.set(cle, version, valeur)
+        return valeur
+
+    def __len__(self):
+        return len(self._entrees)
+
+
+class CacheMessages:
+    """Derniers objets Message connus des duels, indexés par ID (LRU borné).
+
+    Garder le message renvoyé à l'envoi (ou reçu avec une interaction) évite
+    un `fetch_message` avant de l'éditer. Les embeds modifiés en place par
+    les boutons restent ceux de l'objet gardé, qui reste donc à jour.
+    """
+
+    def __init__(self, taille_max=1024):
+        self.taille_max = taille_max
+        self.hits = 0
+        self.misses = 0
+        self._messages = OrderedDict()
+
+    def get(self, message_id):
+        message = self._messages.get(message_id)
+        if message is None:
+            self.misses += 1
+            return None
+        self._messages.move_to_end(message_id)
+        self.hits += 1
+        return message
+
+    def set(self, message):
+        self._messages[message.id] = message
+        self._messages.move_to_end(message.id)
+        if len(self._messages) > self.taille_max:
+            self._messages.popitem(last=False)
+
+    def remplacer(self, message):
+        """Met à jour l'entrée seulement si le message est encore suivi."""
+        if message.id in self._messages:
+            self._messages[message.id] = message
+
+    def retirer(self, message_id):
+        self._messages.pop(message_id, None)
+
+    def __len__(self):
+        return len(self._messages)
@@ -0,0 +1,170 @@
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+
+from cache import CacheVersionne
+
+# Nombre de joueurs par page du classement
+JOUEURS_PAR_PAGE = 10
+
+# Pages gardées en mémoire par instantané du classement
+PAGES_EN_CACHE = 32
+
+
+class Classement:
+    """Instantané paginé du classement pour une version donnée de la base.
+
+    Les pages sont lues à la demande par pagination sur clé
+    (kamas_gagnes, joueur_id) : passer à la page voisine, à la première ou à
+    la dernière coûte une seule petite requête indexée. Les pages lues sont
+    gardées dans un petit cache LRU partagé par toutes les vues ouvertes sur
+    le même instantané ; les bornes d'une page sont tirées de ses lignes,
+    elles quittent le cache avec elle. Une page vide arrête la pagination.
+    """
+
+    def __init__(self, db, version, total):
+        self.db = db
+        self.version = version
+        self.total = total
+        self.max_page = max(0, (total - 1) // JOUEURS_PAR_PAGE)
+        self._pages = OrderedDict()
+
+    @staticmethod
+    def _cle(ligne):
+        return ligne[2], ligne[0]
+
+    def _garder(self, numero, lignes):
+        self._pages[numero] = lignes
+        self._pages.move_to_end(numero)
+        if len(self._pages) > PAGES_EN_CACHE:
+            self._pages.popitem(last=False)
+        return lignes
+
+    async def page(self, numero):
+        """Retourne les lignes de la page `numero` (à partir de 0)."""
+        if numero in self._pages:
+            self._pages.move_to_end(numero)
+            return self._pages[numero]
+
+        precedente = self._pages.get(numero - 1)
+        suivante = self._pages.get(numero + 1)
+        if numero > 0 and precedente == []:
+            # Page précédente vide : les suivantes le sont aussi
+            lignes = []
+        elif numero == 0:
+            lignes = await self.db.fetch_leaderboard_page(JOUEURS_PAR_PAGE)
+        elif precedente:
+            lignes = await self.db.fetch_leaderboard_page(JOUEURS_PAR_PAGE, apres=self._cle(precedente[-1]))
+        elif suivante:
+            lignes = await self.db.fetch_leaderboard_page(JOUEURS_PAR_PAGE, avant=self._cle(suivante[0]))
+        elif numero == self.max_page and self.db.version == self.version:
+            # `total` n'est exact que tant que la base n'a pas bougé depuis l'instantané
+            lignes = await self.db.fetch_leaderboard_page(self.total - numero * JOUEURS_PAR_PAGE, fin=True)
+        else:
+            # Voisines sorties du cache (ou total périmé) : une seule lecture par décalage
+            lignes = await self.db.fetch_leaderboard_page(JOUEURS_PAR_PAGE, decalage=numero * JOUEURS_PAR_PAGE)
+        return self._garder(numero, lignes)
+
+    async def derniere_page(self):
+        """Retourne les lignes de la dernière page, lue depuis la fin en une requête.
+
+        Si des parties ont été commitées depuis l'instantané, le nombre de
+        joueurs est relu d'abord : `total` et `max_page` (et donc les rangs
+        affichés) suivent la base actuelle.
+        """
+        if self.db.version != self.version:
+            total = await self.db.count_players()
+            if total != self.total:
+                self.total = total
+                self.max_page = max(0, (total - 1) // JOUEURS_PAR_PAGE)
+                # Les numéros des pages déjà lues ne correspondent plus aux rangs
+                self._pages.clear()
+        reste = self.total - self.max_page * JOUEURS_PAR_PAGE
+        lignes = await self.db.fetch_leaderboard_page(reste, fin=True) if reste > 0 else []
+        return self._garder(self.max_page, lignes)
+
+
+class ClassementPeriode:
+    """Classement d'une période, calculé en une requête sur les agrégats quotidiens.
+
+    Même interface que Classement ; les joueurs actifs sur une période
+    sont peu nombreux, la liste complète est gardée en mémoire.
+    """
+
+    def __init__(self, lignes):
+        self.lignes = lignes
+        self.total = len(lignes)
+        self.max_page = max(0, (self.total - 1) // JOUEURS_PAR_PAGE)
+
+    async def page(self, numero):
+        debut = numero * JOUEURS_PAR_PAGE
+        return self.lignes[debut:debut + JOUEURS_PAR_PAGE]
+
+    async def derniere_page(self):
+        return await self.page(self.max_page)
+
+
+# Périodes proposées par /statsall et /mystats
+PERIODES = {
+    "tout": "à vie",
+    "jour": "aujourd'hui",
+    "semaine": "cette semaine",
+    "mois": "ce mois-ci",
+}
+
+
+def bornes_periode(periode, debut=None, fin=None, aujourd_hui=None):
+    """Jours [début, fin) de la période (dates ISO, UTC), ou None pour les stats à vie.
+
+    `debut` / `fin` (AAAA-MM-JJ, fin incluse) définissent une plage
+    personnalisée et l'emportent sur `periode`. Lève ValueError si une
+    date est invalide.
+    """
+    if debut or fin:
+        premier = date.fromisoformat(debut) if debut else date.min
+        dernier = date.fromisoformat(fin) if fin else date.max - timedelta(days=1)
+        return premier.isoformat(), (dernier + timedelta(days=1)).isoformat()
+    if periode == "tout":
+        return None
+    jour = aujourd_hui or datetime.utcnow().date()
+    if periode == "jour":
+        premier = jour
+    elif periode == "semaine":
+        premier = jour - timedelta(days=jour.weekday())
+    elif periode == "mois":
+        premier = jour.replace(day=1)
+    else:
+        raise ValueError(f"période inconnue : {periode}")
+    return premier.isoformat(), (jour + timedelta(days=1)).isoformat()
+
+
+# Cache des lectures de stats, indexé par la version de la base : un
+# instantané de classement et les stats de chaque joueur restent servis
+# depuis la mémoire tant qu'aucune partie n'a été commitée.
+cache_stats = CacheVersionne(taille_max=2048)
+
+
+async def classement_courant(db):
+    """Retourne l'instantané du classement pour la version actuelle de la base."""
+    version = db.version
+
+    async def charger():
+        return Classement(db, version, await db.count_players())
+
+    return await cache_stats.obtenir("classement", version, charger)
+
+
+async def classement_periode(db, debut, fin):
+    """Classement des jours [debut, fin), mis en cache comme l'instantané à vie."""
+    async def charger():
+        return ClassementPeriode(await db.fetch_leaderboard_period(debut, fin))
+
+    return await cache_stats.obtenir(("classement", debut, fin), db.version, charger)
+
+
+async def stats_joueur(db, joueur_id, bornes=None):
+    """Stats d'un joueur (ou None), à vie ou sur les jours `bornes`, servies depuis le cache si la base n'a pas bougé."""
+    if bornes is None:
+        return await cache_stats.obtenir(("joueur", joueur_id), db.version, lambda: db.fetch_player_stats(joueur_id))
+    return await cache_stats.obtenir(
+        ("joueur", joueur_id, *bornes), db.version, lambda: db.fetch_player_stats_period(joueur_id, *bornes)
+    )
@@ -0,0 +1,92 @@
+import itertools
+
+
+class CacheRoles:
+    """Rôles résolus une fois par serveur, indexés par nom.
+
+    Évite de parcourir `guild.roles` à chaque commande ou clic ; le cache
+    d'un serveur est invalidé à chaque création, modification ou
+    suppression de rôle.
+    """
+
+    def __init__(self):
+        self._par_guilde = {}
+        self.hits = 0
+        self.misses = 0
+
+    def role(self, guild, nom):
+        roles = self._par_guilde.get(guild.id)
+        if roles is None:
+            self.misses += 1
+            roles = self._par_guilde[guild.id] = {}
+            # En cas de doublon, le premier rôle du nom gagne (comme discord.utils.get)
+            for role in guild.roles:
+                roles.setdefault(role.name, role)
+        else:
+            self.hits += 1
+        return roles.get(nom)
+
+    def invalider(self, guild_id):
+        self._par_guilde.pop(guild_id, None)
+
+
+class PoolCroupiers:
+    """Croupiers en service et répartition des duels prêts.
+
+    Un duel prêt est attribué au croupier en service le moins chargé (duels
+    attribués et pas encore terminés) ; à charge égale, celui servi il y a le
+    plus longtemps, ce qui revient à un tourniquet quand tout le monde est
+    libre. Le nombre de croupiers en service reste petit : un parcours
+    linéaire suffit.
+    """
+
+    def __init__(self):
+        # croupier_id -> [guild_id, numéro de la dernière attribution]
+        self._en_service = {}
+        # croupier_id -> duels attribués et pas encore terminés (en service ou non)
+        self._charges = {}
+        self._tours = itertools.count()
+
+    def basculer(self, croupier_id, guild_id):
+        """Prend ou quitte le service ; renvoie True si le croupier est désormais en service."""
+        if self._en_service.pop(croupier_id, None) is not None:
+            return False
+        self._en_service[croupier_id] = [guild_id, next(self._tours)]
+        return True
+
+    def en_service(self, croupier_id):
+        return croupier_id in self._en_service
+
+    def charge(self, croupier_id):
+        return self._charges.get(croupier_id, 0)
+
+    def assigner(self, guild_id, exclus=()):
+        """Croupier à pinguer pour un duel prêt, ou None si personne n'est disponible."""
+        choix = None
+        for croupier_id, (guilde, tour) in self._en_service.items():
+            if guilde != guild_id or croupier_id in exclus:
+                continue
+            cle = (self.charge(croupier_id), tour)
+            if choix is None or cle < choix[0]:
+                choix = (cle, croupier_id)
+        if choix is None:
+            return None
+        croupier_id = choix[1]
+        self.prendre(croupier_id)
+        self._en_service[croupier_id][1] = next(self._tours)
+        return croupier_id
+
+    def prendre(self, croupier_id):
+        self._charges[croupier_id] = self.charge(croupier_id) + 1
+
+    def liberer(self, croupier_id):
+        charge = self._charges.get(croupier_id)
+        if charge is None:
+            return
+        if charge <= 1:
+            del self._charges[croupier_id]
+        else:
+            self._charges[croupier_id] = charge - 1
+
+    def __len__(self):
+        return len(self._en_service)
@@ -0,0 +1,756 @@
+import asyncio
+import itertools
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+# --- Schéma de la base ---
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS parties (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    joueur1_id INTEGER NOT NULL,
+    joueur2_id INTEGER NOT NULL,
+    montant INTEGER NOT NULL,
+    gagnant_id INTEGER,
+    est_nul BOOLEAN NOT NULL,
+    date TIMESTAMP NOT NULL
+)
+"""
+
+# Agrégats par joueur recalculés depuis l'historique brut de `parties`.
+# {source} : `parties`, ou seulement les duels une fois les tournois ajoutés.
+MODELE_TOTAUX_DEPUIS_PARTIES = """
+SELECT joueur_id,
+       SUM(montant) as kamas_mises,
+       SUM(CASE WHEN gagnant_id = joueur_id THEN montant * 2 ELSE 0 END) as kamas_gagnes,
+       SUM(CASE WHEN gagnant_id = joueur_id THEN 1 ELSE 0 END) as victoires,
+       SUM(CASE WHEN est_nul = 1 THEN 1 ELSE 0 END) as nuls,
+       SUM(CASE WHEN gagnant_id != joueur_id AND est_nul = 0 THEN 1 ELSE 0 END) as defaites,
+       COUNT(*) as total_parties
+FROM (
+    SELECT joueur1_id as joueur_id, montant, gagnant_id, est_nul FROM {source}
+    UNION ALL
+    SELECT joueur2_id as joueur_id, montant, gagnant_id, est_nul FROM {source}
+)
+GROUP BY joueur_id
+"""
+REQUETE_TOTAUX_DEPUIS_PARTIES = MODELE_TOTAUX_DEPUIS_PARTIES.format(source="parties")
+REQUETE_TOTAUX_DEPUIS_DUELS = MODELE_TOTAUX_DEPUIS_PARTIES.format(source="parties WHERE tournoi_id IS NULL")
+
+# Agrégats quotidiens recalculés depuis les participations (date UTC)
+REQUETE_STATS_JOUR_DEPUIS_PARTICIPATIONS = """
+SELECT date(date) as jour, joueur_id,
+       SUM(montant),
+       SUM(CASE WHEN resultat = 1 THEN montant * 2 ELSE 0 END),
+       SUM(resultat = 1), SUM(resultat = 0), SUM(resultat = -1),
+       COUNT(*)
+FROM participations
+GROUP BY jour, joueur_id
+"""
+
+# Migrations appliquées dans l'ordre ; PRAGMA user_version mémorise la dernière.
+MIGRATIONS = [
+    # 1 : une ligne par joueur et par partie, groupée par joueur (résultat :
+    # 1 victoire, 0 nul, -1 défaite) pour que les stats d'un joueur soient
+    # une simple lecture d'intervalle sur la clé primaire.
+    """
+    CREATE TABLE IF NOT EXISTS participations (
+        joueur_id INTEGER NOT NULL,
+        partie_id INTEGER NOT NULL,
+        montant INTEGER NOT NULL,
+        resultat INTEGER NOT NULL,
+        date TIMESTAMP NOT NULL,
+        PRIMARY KEY (joueur_id, partie_id)
+    ) WITHOUT ROWID;
+    INSERT OR IGNORE INTO participations (joueur_id, partie_id, montant, resultat, date)
+    SELECT joueur1_id, id, montant,
+           CASE WHEN est_nul THEN 0 WHEN gagnant_id = joueur1_id THEN 1 ELSE -1 END, date
+    FROM parties;
+    INSERT OR IGNORE INTO participations (joueur_id, partie_id, montant, resultat, date)
+    SELECT joueur2_id, id, montant,
+           CASE WHEN est_nul THEN 0 WHEN gagnant_id = joueur2_id THEN 1 ELSE -1 END, date
+    FROM parties;
+    """,
+    # 2 : totaux par joueur tenus à jour à chaque insertion, indexés pour le
+    # classement (kamas gagnés décroissants).
+    """
+    CREATE TABLE IF NOT EXISTS totaux_joueurs (
+        joueur_id INTEGER PRIMARY KEY,
+        kamas_mises INTEGER NOT NULL,
+        kamas_gagnes INTEGER NOT NULL,
+        victoires INTEGER NOT NULL,
+        nuls INTEGER NOT NULL,
+        defaites INTEGER NOT NULL,
+        total_parties INTEGER NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_totaux_classement ON totaux_joueurs (kamas_gagnes DESC, joueur_id DESC);
+    DELETE FROM totaux_joueurs;
+    INSERT INTO totaux_joueurs """ + REQUETE_TOTAUX_DEPUIS_PARTIES + """;
+    """,
+    # 3 : état des duels en cours (lobby, croupier, partie lancée et coups
+    # joués), rechargé au démarrage pour survivre aux redémarrages.
+    """
+    CREATE TABLE IF NOT EXISTS duels_actifs (
+        duel_id TEXT PRIMARY KEY,
+        etat TEXT NOT NULL,
+        channel_id INTEGER NOT NULL,
+        message_id INTEGER NOT NULL,
+        montant INTEGER NOT NULL,
+        joueur1_id INTEGER NOT NULL,
+        joueur1_nom TEXT NOT NULL,
+        joueur2_id INTEGER,
+        joueur2_nom TEXT,
+        croupier_id INTEGER,
+        croupier_nom TEXT,
+        joueur_actif_id INTEGER,
+        coups BLOB NOT NULL DEFAULT x'',
+        maj TIMESTAMP NOT NULL
+    );
+    """,
+    # 4 : variantes N×N (taille de la grille, nombre de symboles à aligner)
+    """
+    ALTER TABLE duels_actifs ADD COLUMN taille INTEGER NOT NULL DEFAULT 3;
+    ALTER TABLE duels_actifs ADD COLUMN aligner INTEGER NOT NULL DEFAULT 3;
+    """,
+    # 5 : journal des coups, écrit avec le résultat. La clé est l'id de la
+    # partie (alias du rowid) ; `entete` tient sur un octet (voir
+    # encoder_entete) et `coups` contient un octet par coup : une partie
+    # occupe une trentaine d'octets au plus.
+    """
+    CREATE TABLE IF NOT EXISTS coups_parties (
+        partie_id INTEGER PRIMARY KEY,
+        entete INTEGER NOT NULL,
+        coups BLOB NOT NULL
+    );
+    """,
+    # 6 : agrégats quotidiens par joueur, tenus à jour à l'insertion. Un
+    # classement sur un mois additionne ~30 petites lignes par joueur au lieu
+    # de parcourir les parties brutes (dont la date n'est pas indexée).
+    """
+    CREATE TABLE IF NOT EXISTS stats_jour (
+        jour TEXT NOT NULL,
+        joueur_id INTEGER NOT NULL,
+        kamas_mises INTEGER NOT NULL,
+        kamas_gagnes INTEGER NOT NULL,
+        victoires INTEGER NOT NULL,
+        nuls INTEGER NOT NULL,
+        defaites INTEGER NOT NULL,
+        total_parties INTEGER NOT NULL,
+        PRIMARY KEY (jour, joueur_id)
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS idx_stats_jour_joueur ON stats_jour (joueur_id, jour);
+    INSERT INTO stats_jour """ + REQUETE_STATS_JOUR_DEPUIS_PARTICIPATIONS + """;
+    """,
+    # 7 : petites valeurs propres au bot (empreinte des commandes synchronisées…)
+    """
+    CREATE TABLE IF NOT EXISTS meta (
+        cle TEXT PRIMARY KEY,
+        valeur TEXT NOT NULL
+    );
+    """,
+    # 8 : parties de tournoi. Elles restent dans `parties` (ids, /replay,
+    # export) mais marquées, et n'entrent ni dans les participations ni dans
+    # les agrégats : les stats restent celles des duels avec mise.
+    """
+    ALTER TABLE parties ADD COLUMN tournoi_id TEXT;
+    """,
+]
+
+REQUETE_PARTIE = """
+SELECT p.joueur1_id, p.joueur2_id, p.montant, p.gagnant_id, p.est_nul, p.date, c.entete, c.coups
+FROM parties p
+JOIN coups_parties c ON c.partie_id = p.id
+WHERE p.id = ?
+"""
+
+# Pagination par clé (kamas_gagnes, joueur_id) : chaque page est une lecture
+# d'intervalle sur idx_totaux_classement, quelle que soit sa position.
+COLONNES_CLASSEMENT = "joueur_id, kamas_mises, kamas_gagnes, victoires, nuls, defaites, total_parties"
+REQUETE_PAGE_DEBUT = f"""
+SELECT {COLONNES_CLASSEMENT} FROM totaux_joueurs
+ORDER BY kamas_gagnes DESC, joueur_id DESC LIMIT ?
+"""
+REQUETE_PAGE_APRES = f"""
+SELECT {COLONNES_CLASSEMENT} FROM totaux_joueurs
+WHERE (kamas_gagnes, joueur_id) < (?, ?)
+ORDER BY kamas_gagnes DESC, joueur_id DESC LIMIT ?
+"""
+REQUETE_PAGE_AVANT = f"""
+SELECT {COLONNES_CLASSEMENT} FROM totaux_joueurs
+WHERE (kamas_gagnes, joueur_id) > (?, ?)
+ORDER BY kamas_gagnes ASC, joueur_id ASC LIMIT ?
+"""
+REQUETE_PAGE_DECALAGE = f"""
+SELECT {COLONNES_CLASSEMENT} FROM totaux_joueurs
+ORDER BY kamas_gagnes DESC, joueur_id DESC LIMIT ? OFFSET ?
+"""
+REQUETE_PAGE_FIN = f"""
+SELECT {COLONNES_CLASSEMENT} FROM totaux_joueurs
+ORDER BY kamas_gagnes ASC, joueur_id ASC LIMIT ?
+"""
+
+REQUETE_STATS_JOUEUR = """
+SELECT joueur_id, kamas_mises, kamas_gagnes, nuls, defaites, total_parties
+FROM totaux_joueurs
+WHERE joueur_id = ?
+"""
+
+# Classement et stats sur une période [debut, fin) de jours (AAAA-MM-JJ)
+REQUETE_CLASSEMENT_PERIODE = """
+SELECT joueur_id, SUM(kamas_mises), SUM(kamas_gagnes) as gagnes,
+       SUM(victoires), SUM(nuls), SUM(defaites), SUM(total_parties)
+FROM stats_jour
+WHERE jour >= ? AND jour < ?
+GROUP BY joueur_id
+ORDER BY gagnes DESC, joueur_id DESC
+"""
+
+REQUETE_STATS_JOUEUR_PERIODE = """
+SELECT joueur_id, SUM(kamas_mises), SUM(kamas_gagnes), SUM(nuls), SUM(defaites), SUM(total_parties)
+FROM stats_jour
+WHERE joueur_id = ? AND jour >= ? AND jour < ?
+GROUP BY joueur_id
+"""
+
+REQUETE_MAJ_STATS_JOUR = """
+INSERT INTO stats_jour (jour, joueur_id, kamas_mises, kamas_gagnes, victoires, nuls, defaites, total_parties)
+VALUES (?, ?, ?, ?, ?, ?, ?, 1)
+ON CONFLICT(jour, joueur_id) DO UPDATE SET
+    kamas_mises = kamas_mises + excluded.kamas_mises,
+    kamas_gagnes = kamas_gagnes + excluded.kamas_gagnes,
+    victoires = victoires + excluded.victoires,
+    nuls = nuls + excluded.nuls,
+    defaites = defaites + excluded.defaites,
+    total_parties = total_parties + 1
+"""
+
+REQUETE_MAJ_TOTAUX = """
+INSERT INTO totaux_joueurs (joueur_id, kamas_mises, kamas_gagnes, victoires, nuls, defaites, total_parties)
+VALUES (?, ?, ?, ?, ?, ?, 1)
+ON CONFLICT(joueur_id) DO UPDATE SET
+    kamas_mises = kamas_mises + excluded.kamas_mises,
+    kamas_gagnes = kamas_gagnes + excluded.kamas_gagnes,
+    victoires = victoires + excluded.victoires,
+    nuls = nuls + excluded.nuls,
+    defaites = defaites + excluded.defaites,
+    total_parties = total_parties + 1
+"""
+
+
+# Plus grand id de partie déjà utilisé (lignes présentes ou supprimées)
+REQUETE_DERNIER_ID = (
+    "SELECT MAX(COALESCE((SELECT MAX(id) FROM parties), 0),"
+    " COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'parties'), 0))"
+)
+
+COLONNES_DUEL = (
+    "duel_id", "etat", "channel_id", "message_id", "montant",
+    "joueur1_id", "joueur1_nom", "joueur2_id", "joueur2_nom",
+    "croupier_id", "croupier_nom", "joueur_actif_id", "coups", "maj",
+    "taille", "aligner",
+)
+REQUETE_SAUVER_DUEL = (
+    f"INSERT OR REPLACE INTO duels_actifs ({', '.join(COLONNES_DUEL)}) "
+    f"VALUES ({', '.join('?' for _ in COLONNES_DUEL)})"
+)
+
+def encoder_entete(taille, aligner, joueur1_commence):
+    """Taille (3 bits), nombre à aligner (3 bits) et premier joueur (1 bit) dans un octet."""
+    return (taille << 4) | (aligner << 1) | int(joueur1_commence)
+
+
+def decoder_entete(entete):
+    """Inverse de encoder_entete : (taille, aligner, joueur1_commence)."""
+    return entete >> 4, (entete >> 1) & 0b111, bool(entete & 1)
+
+
+# Signaux internes du thread d'écriture
+_ARRET = object()
+_BARRIERE = object()
+_TACHE = object()
+
+# Genres d'écritures mises en file
+_PARTIE = "partie"
+_DUEL = "duel"
+_FIN_DUEL = "fin_duel"
+
+# Bornes des tranches de l'histogramme des tailles de lots
+TRANCHES_LOTS = (1, 2, 5, 10, 20, 50, 100, 200)
+
+# Essais d'une écriture en échec avant qu'elle soit abandonnée (et journalisée)
+ESSAIS_MAX = 5
+
+
+class EcrituresEnEchec(Exception):
+    """Levée par flush() quand des écritures sont en attente de nouvel essai ou ont été abandonnées."""
+
+    def __init__(self, en_attente, abandonnees):
+        super().__init__(f"{en_attente} écriture(s) en attente de nouvel essai, {abandonnees} abandonnée(s)")
+        self.en_attente = en_attente
+        self.abandonnees = abandonnees
+
+
+class CompteurEcriture:
+    """Compteurs du writer : tailles de lots et latence de flush."""
+
+    def __init__(self):
+        self.lots = 0
+        self.lignes = 0
+        self.erreurs = 0
+        self.abandons = 0
+        self.latence_totale_ms = 0.0
+        self.latence_max_ms = 0.0
+        self.tailles = {borne: 0 for borne in TRANCHES_LOTS}
+        self.tailles["+"] = 0
+
+    def enregistrer(self, taille, latence_ms):
+        self.lots += 1
+        self.lignes += taille
+        self.latence_totale_ms += latence_ms
+        self.latence_max_ms = max(self.latence_max_ms, latence_ms)
+        for borne in TRANCHES_LOTS:
+            if taille <= borne:
+                self.tailles[borne] += 1
+                break
+        else:
+            self.tailles["+"] += 1
+
+    def resume(self):
+        return {
+            "lots": self.lots,
+            "lignes": self.lignes,
+            "erreurs": self.erreurs,
+            "abandons": self.abandons,
+            "taille_moyenne": self.lignes / self.lots if self.lots else 0.0,
+            "latence_moyenne_ms": self.latence_totale_ms / self.lots if self.lots else 0.0,
+            "latence_max_ms": self.latence_max_ms,
+            "tailles": dict(self.tailles),
+        }
+
+
+class Database:
+    """Accès SQLite hors de la boucle d'événements.
+
+    Les résultats de parties sont mis en file puis écrits par un thread dédié
+    en transactions groupées : un commit tous les `lot_max` enregistrements ou
+    toutes les `fenetre_ms` millisecondes, au premier des deux. Un crash fait
+    donc perdre au plus une fenêtre ; un arrêt propre (`close`) vide la file.
+    Les lectures passent par un petit pool ; chaque thread possède sa propre
+    connexion et le journal WAL évite que les lecteurs bloquent le writer.
+
+    Avec `ouvrir=False`, le schéma (et ses migrations) et le writer attendent
+    un appel à `ouvrir()`, que le démarrage du bot fait dans un thread.
+    """
+
+    def __init__(self, chemin, lecteurs=2, lot_max=50, fenetre_ms=200, ouvrir=True):
+        self.chemin = chemin
+        self.lot_max = lot_max
+        self.fenetre = fenetre_ms / 1000
+        self.compteur = CompteurEcriture()
+        # Incrémentée par le writer à chaque commit visible par les lecteurs
+        self.version = 0
+        self._local = threading.local()
+        self._connexions = []
+        self._verrou_connexions = threading.Lock()
+        # Écritures en échec (genre, données, essais), retentées en tête du lot suivant
+        self._en_echec = []
+        # Abandons pas encore signalés à un flush()
+        self._abandons_non_signales = 0
+        self._file = queue.Queue()
+        self._writer = threading.Thread(target=self._boucle_ecriture, name="db-ecriture", daemon=True)
+        self._lecture = ThreadPoolExecutor(max_workers=lecteurs, thread_name_prefix="db-lecture")
+        if ouvrir:
+            self.ouvrir()
+
+    @property
+    def ouverte(self):
+        """Vrai une fois le writer démarré : les écritures mises en file aboutiront."""
+        return self._writer.is_alive()
+
+    @property
+    def ecritures_en_echec(self):
+        """Nombre d'écritures en attente d'un nouvel essai."""
+        return len(self._en_echec)
+
+    def ouvrir(self):
+        """Crée ou migre le schéma puis démarre le writer (bloquant, idempotent)."""
+        if self.ouverte:
+            return
+        self._creer_schema()
+        self._writer.start()
+
+    def _connexion(self):
+        """Retourne la connexion propre au thread courant."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.chemin, check_same_thread=False)
+            self._local.conn = conn
+            with self._verrou_connexions:
+                self._connexions.append(conn)
+        return conn
+
+    def _creer_schema(self):
+        conn = sqlite3.connect(self.chemin)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(SCHEMA)
+            conn.commit()
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            for numero, script in enumerate(MIGRATIONS[version:], start=version + 1):
+                print(f"🗃️ Migration de la base vers la version {numero}...")
+                conn.executescript(f"BEGIN;\n{script}\nPRAGMA user_version = {numero};\nCOMMIT;")
+            # Les ids de parties sont attribués ici, à la mise en file, pour
+            # pouvoir être affichés avant le commit (un seul writer par base)
+            dernier = conn.execute(REQUETE_DERNIER_ID).fetchone()[0]
+            self._ids_parties = itertools.count(dernier + 1)
+        finally:
+            conn.close()
+
+    async def _executer(self, executor, fonction, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, fonction, *args)
+
+    # --- Écritures ---
+    def _boucle_ecriture(self):
+        """Thread writer : regroupe les enregistrements en transactions.
+
+        Aucune exception ne sort de la boucle : un writer arrêté laisserait
+        flush() et les tâches en attente bloqués pour toujours.
+        """
+        lot = []
+        barrieres = []
+        echeance = None
+        while True:
+            attente = None if not lot else max(0.0, echeance - time.monotonic())
+            try:
+                element = self._file.get(timeout=attente)
+            except queue.Empty:
+                element = None
+
+            try:
+                if element is _ARRET:
+                    self._ecrire_lot(lot)
+                    self._liberer(barrieres)
+                    return
+                if isinstance(element, tuple) and element[0] is _BARRIERE:
+                    barrieres.append(element[1:])
+                    if not lot:
+                        self._liberer(barrieres)
+                    continue
+                if isinstance(element, tuple) and element[0] is _TACHE:
+                    # Une tâche voit toutes les parties mises en file avant elle
+                    self._ecrire_lot(lot)
+                    lot = []
+                    self._liberer(barrieres)
+                    self._executer_tache(*element[1:])
+                    continue
+                if element is not None:
+                    if not lot:
+                        echeance = time.monotonic() + self.fenetre
+                    lot.append(element)
+                    if len(lot) < self.lot_max:
+                        continue
+                elif lot and time.monotonic() < echeance:
+                    continue
+
+                self._ecrire_lot(lot)
+                lot = []
+                self._liberer(barrieres)
+            except Exception as e:
+                print("❌ Erreur inattendue du writer:", e)
+                self._en_echec.extend((genre, donnees, 1) for genre, donnees in lot)
+                lot = []
+                self._liberer(barrieres)
+                if element is _ARRET:
+                    return
+
+    def _executer_tache(self, fonction, loop, futur):
+        try:
+            resultat = fonction(self._connexion())
+        except Exception as e:
+            loop.call_soon_threadsafe(_echouer, futur, e)
+        else:
+            loop.call_soon_threadsafe(_resoudre, futur, resultat)
+
+    def _liberer(self, barrieres):
+        if not barrieres:
+            return
+        echec = None
+        if self._en_echec or self._abandons_non_signales:
+            echec = EcrituresEnEchec(len(self._en_echec), self._abandons_non_signales)
+            self._abandons_non_signales = 0
+        for loop, futur in barrieres:
+            try:
+                if echec is None:
+                    loop.call_soon_threadsafe(_resoudre, futur)
+                else:
+                    loop.call_soon_threadsafe(_echouer, futur, echec)
+            except RuntimeError:
+                # Boucle déjà fermée : plus personne n'attend
+                pass
+        barrieres.clear()
+
+    def _appliquer(self, conn, genre, donnees):
+        """Exécute une écriture dans la transaction courante ; renvoie 1 pour une partie."""
+        if genre == _PARTIE:
+            self._inserer_partie(conn, *donnees)
+            # Une partie de tournoi ne change pas les stats : les caches restent valides
+            return int(donnees[-1] is None)
+        if genre == _DUEL:
+            conn.execute(REQUETE_SAUVER_DUEL, donnees)
+        elif genre == _FIN_DUEL:
+            conn.execute("DELETE FROM duels_actifs WHERE duel_id = ?", (donnees,))
+        return 0
+
+    def _ecrire_lot(self, lot):
+        """Écrit le lot (précédé des écritures en échec) en une transaction.
+
+        Si la transaction échoue (base verrouillée, id en conflit…), le lot
+        est réécrit ligne par ligne : seules les lignes fautives sont gardées
+        pour le lot suivant. Une ligne en échec ESSAIS_MAX fois (contrainte
+        violée…) est abandonnée et journalisée, au lieu de faire repasser
+        chaque lot suivant en écriture ligne par ligne.
+        """
+        lot = self._en_echec + [(genre, donnees, 0) for genre, donnees in lot]
+        self._en_echec = []
+        if not lot:
+            return
+        debut = time.perf_counter()
+        conn = self._connexion()
+        try:
+            with conn:
+                parties = sum(self._appliquer(conn, genre, donnees) for genre, donnees, _ in lot)
+        except Exception as e:
+            self.compteur.erreurs += 1
+            print(f"❌ Erreur lors de l'écriture d'un lot ({len(lot)} lignes), écriture ligne par ligne:", e)
+            parties = self._ecrire_ligne_par_ligne(conn, lot)
+        if parties:
+            # Seules les parties changent les stats : les caches restent valides sinon
+            self.version += 1
+        self.compteur.enregistrer(len(lot), (time.perf_counter() - debut) * 1000)
+
+    def _ecrire_ligne_par_ligne(self, conn, lot):
+        parties = 0
+        for indice, (genre, donnees, essais) in enumerate(lot):
+            try:
+                with conn:
+                    parties += self._appliquer(conn, genre, donnees)
+                continue
+            except sqlite3.IntegrityError as e:
+                if genre != _PARTIE:
+                    erreur = e
+                else:
+                    # Id déjà pris (autre processus sur la même base) : nouvel id
+                    donnees = (self._resynchroniser_ids(conn), *donnees[1:])
+                    print(f"⚠️ Id de partie {lot[indice][1][0]} déjà utilisé, partie écrite sous l'id {donnees[0]}.")
+                    try:
+                        with conn:
+                            parties += self._appliquer(conn, genre, donnees)
+                        continue
+                    except Exception as e2:
+                        erreur = e2
+            except Exception as e:
+                erreur = e
+            # Un état de duel dépassé par une écriture plus récente du même duel n'est pas retenté
+            if genre == _DUEL and any(
+                (autre_genre == _FIN_DUEL and autre == donnees[0])
+                or (autre_genre == _DUEL and autre[0] == donnees[0])
+                for autre_genre, autre, _ in lot[indice + 1:]
+            ):
+                continue
+            if essais + 1 >= ESSAIS_MAX:
+                print(f"❌ Écriture {genre} abandonnée après {ESSAIS_MAX} essais ({donnees!r}):", erreur)
+                self.compteur.abandons += 1
+                self._abandons_non_signales += 1
+                continue
+            print(f"❌ Écriture {genre} en échec, retentée au prochain lot:", erreur)
+            self._en_echec.append((genre, donnees, essais + 1))
+        return parties
+
+    def _resynchroniser_ids(self, conn):
+        """Recale le compteur d'ids sur la base ; renvoie un id libre."""
+        dernier = conn.execute(REQUETE_DERNIER_ID).fetchone()[0]
+        self._ids_parties = itertools.count(dernier + 1)
+        return next(self._ids_parties)
+
+    def _inserer_partie(self, conn, partie_id, joueur1_id, joueur2_id, montant, gagnant_id, est_nul, date, journal,
+                        tournoi_id):
+        """Insère une partie, ses deux participations et ses coups (dans la transaction courante).
+
+        Une partie de tournoi n'a que sa ligne et ses coups : ni participations ni agrégats.
+        """
+        conn.execute(
+            "INSERT INTO parties (id, joueur1_id, joueur2_id, montant, gagnant_id, est_nul, date, tournoi_id)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (partie_id, joueur1_id, joueur2_id, montant, gagnant_id, est_nul, date, tournoi_id)
+        )
+        if journal is not None:
+            conn.execute("INSERT INTO coups_parties (partie_id, entete, coups) VALUES (?, ?, ?)", (partie_id, *journal))
+        if tournoi_id is not None:
+            return partie_id
+        participations = []
+        totaux = []
+        for joueur_id in (joueur1_id, joueur2_id):
+            if est_nul:
+                resultat = 0
+            else:
+                resultat = 1 if gagnant_id == joueur_id else -1
+            participations.append((joueur_id, partie_id, montant, resultat, date))
+            totaux.append((
+                joueur_id, montant, montant * 2 if resultat == 1 else 0,
+                int(resultat == 1), int(resultat == 0), int(resultat == -1)
+            ))
+        conn.executemany(
+            "INSERT INTO participations (joueur_id, partie_id, montant, resultat, date) VALUES (?, ?, ?, ?, ?)",
+            participations
+        )
+        conn.executemany(REQUETE_MAJ_TOTAUX, totaux)
+        jour = str(date)[:10]
+        conn.executemany(REQUETE_MAJ_STATS_JOUR, [(jour, *total) for total in totaux])
+        return partie_id
+
+    async def record_game(self, joueur1_id, joueur2_id, montant, gagnant_id, est_nul, date=None, journal=None,
+                          tournoi_id=None):
+        """Met en file le résultat d'une partie et retourne son id ; l'écriture est groupée.
+
+        `journal` vaut (entete, coups) : voir encoder_entete, un octet par coup.
+        Avec `tournoi_id`, la partie est marquée comme partie de tournoi et
+        reste hors des stats (le montant vaut alors 0).
+        """
+        if date is None:
+            date = datetime.utcnow()
+        partie_id = next(self._ids_parties)
+        self._file.put((_PARTIE, (partie_id, joueur1_id, joueur2_id, montant, gagnant_id, est_nul, date, journal, tournoi_id)))
+        return partie_id
+
+    async def save_duel(self, duel):
+        """Met en file l'état courant d'un duel (dict aux clés de COLONNES_DUEL)."""
+        duel = dict(duel, maj=datetime.utcnow())
+        self._file.put((_DUEL, tuple(duel[colonne] for colonne in COLONNES_DUEL)))
+
+    async def delete_duel(self, duel_id):
+        """Met en file la suppression d'un duel terminé ou annulé."""
+        self._file.put((_FIN_DUEL, duel_id))
+
+    async def _tache_ecriture(self, fonction):
+        """Exécute `fonction(conn)` dans le thread writer, après les lots en attente."""
+        loop = asyncio.get_running_loop()
+        futur = loop.create_future()
+        self._file.put((_TACHE, fonction, loop, futur))
+        return await futur
+
+    async def rebuild_totals(self):
+        """Recalcule entièrement `totaux_joueurs` depuis `parties` et `stats_jour` depuis les participations."""
+        def recalculer(conn):
+            with conn:
+                conn.execute("DELETE FROM totaux_joueurs")
+                conn.execute("INSERT INTO totaux_joueurs " + REQUETE_TOTAUX_DEPUIS_DUELS)
+                conn.execute("DELETE FROM stats_jour")
+                conn.execute("INSERT INTO stats_jour " + REQUETE_STATS_JOUR_DEPUIS_PARTICIPATIONS)
+            self.version += 1
+            return conn.execute("SELECT COUNT(*) FROM totaux_joueurs").fetchone()[0]
+        return await self._tache_ecriture(recalculer)
+
+    async def flush(self):
+        """Attend que tout ce qui a été mis en file soit commité.
+
+        Lève EcrituresEnEchec si des écritures attendent encore un nouvel
+        essai, ou ont été abandonnées depuis le flush précédent.
+        """
+        loop = asyncio.get_running_loop()
+        futur = loop.create_future()
+        self._file.put((_BARRIERE, loop, futur))
+        await futur
+
+    # --- Lectures ---
+    def _lire_tout(self, requete, params=()):
+        return self._connexion().execute(requete, params).fetchall()
+
+    def _lire_un(self, requete, params=()):
+        return self._connexion().execute(requete, params).fetchone()
+
+    async def fetch_leaderboard_page(self, limite, apres=None, avant=None, fin=False, decalage=None):
+        """Une page du classement, dans l'ordre décroissant.
+
+        `apres` / `avant` sont des clés (kamas_gagnes, joueur_id) : la page
+        suit ou précède cette clé. `fin` renvoie les `limite` dernières lignes,
+        `decalage` saute ce nombre de lignes depuis le début.
+        """
+        if apres is not None:
+            return await self._executer(self._lecture, self._lire_tout, REQUETE_PAGE_APRES, (*apres, limite))
+        if avant is not None:
+            lignes = await self._executer(self._lecture, self._lire_tout, REQUETE_PAGE_AVANT, (*avant, limite))
+            return lignes[::-1]
+        if fin:
+            lignes = await self._executer(self._lecture, self._lire_tout, REQUETE_PAGE_FIN, (limite,))
+            return lignes[::-1]
+        if decalage is not None:
+            return await self._executer(self._lecture, self._lire_tout, REQUETE_PAGE_DECALAGE, (limite, decalage))
+        return await self._executer(self._lecture, self._lire_tout, REQUETE_PAGE_DEBUT, (limite,))
+
+    async def count_players(self):
+        """Nombre de joueurs présents au classement."""
+        ligne = await self._executer(self._lecture, self._lire_un, "SELECT COUNT(*) FROM totaux_joueurs")
+        return ligne[0]
+
+    def _lire_duels(self):
+        curseur = self._connexion().execute(f"SELECT {', '.join(COLONNES_DUEL)} FROM duels_actifs")
+        return [dict(zip(COLONNES_DUEL, ligne)) for ligne in curseur]
+
+    async def fetch_active_duels(self):
+        """Tous les duels en cours, en une seule lecture (sous forme de dicts)."""
+        return await self._executer(self._lecture, self._lire_duels)
+
+    async def fetch_leaderboard_period(self, debut, fin):
+        """Classement complet sur les jours [debut, fin), depuis les agrégats quotidiens."""
+        return await self._executer(self._lecture, self._lire_tout, REQUETE_CLASSEMENT_PERIODE, (debut, fin))
+
+    async def fetch_player_stats_period(self, player_id, debut, fin):
+        """Statistiques d'un joueur sur les jours [debut, fin), ou None."""
+        return await self._executer(
+            self._lecture, self._lire_un, REQUETE_STATS_JOUEUR_PERIODE, (player_id, debut, fin)
+        )
+
+    async def fetch_game(self, partie_id):
+        """Résultat et coups d'une partie, ou None si elle est inconnue ou sans journal."""
+        return await self._executer(self._lecture, self._lire_un, REQUETE_PARTIE, (partie_id,))
+
+    async def fetch_meta(self, cle):
+        """Valeur enregistrée sous `cle`, ou None."""
+        ligne = await self._executer(self._lecture, self._lire_un, "SELECT valeur FROM meta WHERE cle = ?", (cle,))
+        return ligne[0] if ligne else None
+
+    async def save_meta(self, cle, valeur):
+        """Enregistre `valeur` sous `cle` (commit immédiat dans le thread writer)."""
+        def enregistrer(conn):
+            with conn:
+                conn.execute("INSERT OR REPLACE INTO meta (cle, valeur) VALUES (?, ?)", (cle, valeur))
+        await self._tache_ecriture(enregistrer)
+
+    async def fetch_player_stats(self, player_id):
+        """Statistiques d'un joueur, ou None s'il n'a jamais joué."""
+        return await self._executer(self._lecture, self._lire_un, REQUETE_STATS_JOUEUR, (player_id,))
+
+    def close(self):
+        """Vide la file d'écriture puis ferme toutes les connexions."""
+        if self._writer.is_alive():
+            self._file.put(_ARRET)
+            self._writer.join()
+        self._lecture.shutdown(wait=True)
+        with self._verrou_connexions:
+            for conn in self._connexions:
+                conn.close()
+            self._connexions.clear()
+
+
+def _resoudre(futur, resultat=None):
+    if not futur.done():
+        futur.set_result(resultat)
+
+
+def _echouer(futur, erreur):
+    if not futur.done():
+        futur.set_exception(erreur)
@@ -0,0 +1,105 @@
+import secrets
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Optional
+
+
+class EtatDuel(str, Enum):
+    """États successifs d'un duel ; la valeur est celle persistée en base."""
+    OUVERT = "ouvert"
+    REJOINT = "rejoint"
+    CROUPIER = "croupier"
+    LANCE = "lance"
+
+
+def mention(user_id):
+    return f"<@{user_id}>"
+
+
+@dataclass(slots=True, eq=False)
+class Duel:
+    """Un duel en cours : uniquement des IDs et des noms, jamais d'objets Discord."""
+    joueur1_id: int
+    joueur1_nom: str
+    montant: int
+    channel_id: int
+    duel_id: str = field(default_factory=lambda: secrets.token_hex(6))
+    etat: EtatDuel = EtatDuel.OUVERT
+    # Message du lobby, puis celui de la partie une fois lancée
+    message_id: Optional[int] = None
+    joueur2_id: Optional[int] = None
+    joueur2_nom: Optional[str] = None
+    croupier_id: Optional[int] = None
+    croupier_nom: Optional[str] = None
+    # Variante : grille taille×taille, `aligner` symboles pour gagner
+    taille: int = 3
+    aligner: int = 3
+    # Croupier pingué ou ayant pris le duel (charge du pool, non persisté)
+    croupier_assigne_id: Optional[int] = None
+    # Niveau de l'IA pour une partie amicale contre le bot (joueur 2)
+    ia: Optional[str] = None
+    # Tournoi et match du tableau pour une partie de tournoi (non persistée)
+    tournoi: object = None
+    match: object = None
+    # Vue Discord attachée (RejoindreView puis TicTacToeView)
+    vue: object = None
+
+    def adversaire(self, joueur_id):
+        return self.joueur2_id if joueur_id == self.joueur1_id else self.joueur1_id
+
+    def nom(self, joueur_id):
+        if joueur_id == self.joueur1_id:
+            return self.joueur1_nom
+        if joueur_id == self.joueur2_id:
+            return self.joueur2_nom
+        return self.croupier_nom
+
+
+class RegistreDuels:
+    """Registre unique des duels, indexé par ID de duel, de joueur et de message."""
+
+    def __init__(self):
+        self.par_id = {}
+        self.par_joueur = {}
+        self.par_message = {}
+
+    def ajouter(self, duel):
+        self.par_id[duel.duel_id] = duel
+        self.par_joueur[duel.joueur1_id] = duel
+        # Le bot peut jouer plusieurs parties à la fois : il n'est pas indexé
+        if duel.joueur2_id is not None and duel.ia is None:
+            self.par_joueur[duel.joueur2_id] = duel
+        if duel.message_id is not None:
+            self.par_message[duel.message_id] = duel
+
+    def lier_joueur(self, duel, joueur_id):
+        self.par_joueur[joueur_id] = duel
+
+    def delier_joueur(self, duel, joueur_id):
+        if self.par_joueur.get(joueur_id) is duel:
+            del self.par_joueur[joueur_id]
+
+    def lier_message(self, duel, message_id):
+        if duel.message_id is not None and self.par_message.get(duel.message_id) is duel:
+            del self.par_message[duel.message_id]
+        duel.message_id = message_id
+        self.par_message[message_id] = duel
+
+    def retirer(self, duel):
+        self.par_id.pop(duel.duel_id, None)
+        for joueur_id in (duel.joueur1_id, duel.joueur2_id):
+            self.delier_joueur(duel, joueur_id)
+        if self.par_message.get(duel.message_id) is duel:
+            del self.par_message[duel.message_id]
+
+    def duel_du_joueur(self, joueur_id):
+        return self.par_joueur.get(joueur_id)
+
+    def duel_du_message(self, message_id):
+        return self.par_message.get(message_id)
+
+    def __len__(self):
+        return len(self.par_id)
+
+    def __iter__(self):
+        return iter(list(self.par_id.values()))
@@ -0,0 +1,92 @@
+import asyncio
+import heapq
+import itertools
+import time
+
+
+class Echeancier:
+    """Échéances de tous les duels, gérées par une seule tâche asyncio.
+
+    Les échéances sont rangées dans un tas : planifier, replanifier ou
+    annuler coûte O(log n) et une seule tâche dort jusqu'à la plus proche,
+    au lieu d'une tâche par duel. Une entrée remplacée ou annulée reste dans
+    le tas mais est ignorée quand elle en sort (suppression paresseuse).
+    """
+
+    def __init__(self):
+        self._tas = []
+        self._actives = {}
+        self._compteur = itertools.count()
+        self._reveil = asyncio.Event()
+        self._tache = None
+        # Rappels en cours d'exécution (référencés jusqu'à leur fin)
+        self._rappels = set()
+        self.expirees = 0
+
+    def planifier(self, cle, delai, rappel):
+        """Programme `rappel()` (coroutine) dans `delai` secondes, en remplaçant l'échéance de `cle`."""
+        echeance = time.monotonic() + max(0.0, delai)
+        numero = next(self._compteur)
+        self._actives[cle] = (numero, rappel)
+        heapq.heappush(self._tas, (echeance, numero, cle))
+        if len(self._tas) > 2 * len(self._actives) + 64:
+            self._compacter()
+        if self._tas[0][1] == numero:
+            # Nouvelle échéance la plus proche : la boucle doit se recaler
+            self._reveil.set()
+        self._demarrer()
+
+    def annuler(self, cle):
+        self._actives.pop(cle, None)
+
+    def _compacter(self):
+        """Reconstruit le tas sans les entrées périmées."""
+        self._tas = [
+            entree for entree in self._tas
+            if self._actives.get(entree[2], (None,))[0] == entree[1]
+        ]
+        heapq.heapify(self._tas)
+
+    def __contains__(self, cle):
+        return cle in self._actives
+
+    def __len__(self):
+        return len(self._actives)
+
+    def _demarrer(self):
+        if self._tache is None or self._tache.done():
+            self._tache = asyncio.get_running_loop().create_task(self._boucle())
+
+    async def _boucle(self):
+        while True:
+            # Purge des entrées remplacées ou annulées en tête de tas
+            while self._tas and self._actives.get(self._tas[0][2], (None,))[0] != self._tas[0][1]:
+                heapq.heappop(self._tas)
+            if not self._tas:
+                self._reveil.clear()
+                await self._reveil.wait()
+                continue
+
+            echeance, numero, cle = self._tas[0]
+            attente = echeance - time.monotonic()
+            if attente > 0:
+                self._reveil.clear()
+                try:
+                    await asyncio.wait_for(self._reveil.wait(), timeout=attente)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            heapq.heappop(self._tas)
+            _, rappel = self._actives.pop(cle)
+            self.expirees += 1
+            tache = asyncio.create_task(self._executer(cle, rappel))
+            self._rappels.add(tache)
+            tache.add_done_callback(self._rappels.discard)
+
+    @staticmethod
+    async def _executer(cle, rappel):
+        try:
+            await rappel()
+        except Exception as e:
+            print(f"❌ Erreur lors de l'expiration de {cle}:", e)
@@ -0,0 +1,98 @@
+import asyncio
+import time
+from collections import OrderedDict
+
+
+class SeauJetons:
+    """Seau à jetons : `capacite` éditions en rafale, puis `debit` par seconde."""
+
+    def __init__(self, capacite, debit):
+        self.capacite = capacite
+        self.debit = debit
+        self.jetons = float(capacite)
+        self.maj = time.monotonic()
+
+    def prendre(self):
+        """Prend un jeton ; renvoie l'attente (secondes) avant de pouvoir s'en servir."""
+        maintenant = time.monotonic()
+        self.jetons = min(self.capacite, self.jetons + (maintenant - self.maj) * self.debit)
+        self.maj = maintenant
+        self.jetons -= 1
+        return 0.0 if self.jetons >= 0 else -self.jetons / self.debit
+
+
+class _Salon:
+    __slots__ = ("seau", "attente", "tache")
+
+    def __init__(self, seau):
+        self.seau = seau
+        # message_id -> [kwargs fusionnés, futurs des appelants], dans l'ordre d'arrivée
+        self.attente = OrderedDict()
+        self.tache = None
+
+
+class FileEditions:
+    """Éditions de messages hors interaction, limitées par salon et fusionnées par message.
+
+    Chaque salon a son seau à jetons et une seule tâche qui vide sa file :
+    Discord limite les éditions par salon, et le salon #morpion est partagé
+    par tous les duels. Tant qu'une édition attend son jeton, une nouvelle
+    édition du même message la remplace (le dernier état gagne, les
+    arguments sont fusionnés) : une rafale ne coûte qu'un appel. Tous les
+    appelants fusionnés reçoivent le résultat de cet appel.
+    """
+
+    def __init__(self, envoyer, capacite=5, debit=1.0):
+        # envoyer(channel_id, message_id, kwargs) -> coroutine qui fait l'édition
+        self.envoyer = envoyer
+        self.capacite = capacite
+        self.debit = debit
+        self._salons = {}
+        self.envoyees = 0
+        self.fusionnees = 0
+
+    def soumettre(self, channel_id, message_id, **kwargs):
+        """Met l'édition en file ; renvoie un futur résolu par le Message édité."""
+        salon = self._salons.get(channel_id)
+        if salon is None:
+            salon = self._salons[channel_id] = _Salon(SeauJetons(self.capacite, self.debit))
+        loop = asyncio.get_running_loop()
+        futur = loop.create_future()
+        en_attente = salon.attente.get(message_id)
+        if en_attente is None:
+            salon.attente[message_id] = [kwargs, [futur]]
+        else:
+            en_attente[0].update(kwargs)
+            en_attente[1].append(futur)
+            self.fusionnees += 1
+        if salon.tache is None:
+            salon.tache = loop.create_task(self._vider(channel_id, salon))
+        return futur
+
+    async def editer(self, channel_id, message_id, **kwargs):
+        return await self.soumettre(channel_id, message_id, **kwargs)
+
+    async def _vider(self, channel_id, salon):
+        try:
+            while salon.attente:
+                attente = salon.seau.prendre()
+                if attente:
+                    # Les éditions qui arrivent pendant l'attente sont fusionnées
+                    await asyncio.sleep(attente)
+                message_id, (kwargs, futurs) = salon.attente.popitem(last=False)
+                try:
+                    resultat = await self.envoyer(channel_id, message_id, kwargs)
+                except Exception as e:
+                    for futur in futurs:
+                        if not futur.done():
+                            futur.set_exception(e)
+                else:
+                    for futur in futurs:
+                        if not futur.done():
+                            futur.set_result(resultat)
+                self.envoyees += 1
+        finally:
+            salon.tache = None
+
+    def __len__(self):
+        return sum(len(salon.attente) for salon in self._salons.values())
@@ -0,0 +1,207 @@
+"""Moteur de morpion sur bitboards.
+
+Chaque camp est un entier de N² bits (bit i = case i occupée). En 3×3 une
+victoire se teste par une lecture dans une table précalculée de 512
+entrées ; sur les grilles plus grandes (k alignés sur N×N), seules les
+quatre lignes qui passent par la dernière case jouée sont examinées, en
+O(k). Le nul se détecte par un compteur de cases libres.
+"""
+
+# Camps
+X = 0
+O = 1
+SYMBOLES = ("X", "O")
+
+# Nombre de cases de la grille 3×3
+CASES = 9
+GRILLE_PLEINE = (1 << CASES) - 1
+
+# Les huit alignements gagnants, sous forme de masques de bits
+LIGNES_GAGNANTES = tuple(
+    (1 << a) | (1 << b) | (1 << c)
+    for a, b, c in (
+        (0, 1, 2), (3, 4, 5), (6, 7, 8),
+        (0, 3, 6), (1, 4, 7), (2, 5, 8),
+        (0, 4, 8), (2, 4, 6),
+    )
+)
+
+# TABLE_VICTOIRE[bits] vaut 1 si les cases `bits` contiennent un alignement
+TABLE_VICTOIRE = bytes(
+    any(bits & ligne == ligne for ligne in LIGNES_GAGNANTES)
+    for bits in range(1 << CASES)
+)
+
+# Discord limite une vue à 25 boutons (5 rangées de 5)
+TAILLE_MAX = 5
+
+# Variantes proposées : taille de la grille et nombre de symboles à aligner
+VARIANTES = {
+    "3x3": (3, 3),
+    "4x4": (4, 4),
+    "5x5": (5, 4),
+}
+
+# Directions d'alignement (ligne, colonne) : horizontale, verticale, deux diagonales
+DIRECTIONS = ((0, 1), (1, 0), (1, 1), (1, -1))
+
+# Résultats d'un coup
+EN_COURS = 0
+VICTOIRE = 1
+NUL = 2
+
+
+class CoupInvalide(ValueError):
+    """Coup hors de la grille, sur une case occupée ou après la fin de partie."""
+
+
+class Morpion:
+    """Grille 3×3 classique (victoire par table)."""
+    __slots__ = ("camps", "coups", "termine")
+
+    taille = 3
+    aligner = 3
+    cases_total = CASES
+
+    def __init__(self):
+        self.camps = [0, 0]
+        self.coups = 0
+        self.termine = False
+
+    @property
+    def cle(self):
+        """Clé compacte de la position : bits de X sur 9 bits hauts, bits de O en bas."""
+        return (self.camps[X] << CASES) | self.camps[O]
+
+    @property
+    def occupees(self):
+        return self.camps[X] | self.camps[O]
+
+    def case_libre(self, case):
+        return 0 <= case < CASES and not (self.occupees >> case) & 1
+
+    def jouer(self, case, camp):
+        """Pose le symbole du `camp` sur `case` et retourne EN_COURS, VICTOIRE ou NUL."""
+        if self.termine or not self.case_libre(case):
+            raise CoupInvalide(case)
+        bits = self.camps[camp] | (1 << case)
+        self.camps[camp] = bits
+        self.coups += 1
+        if TABLE_VICTOIRE[bits]:
+            self.termine = True
+            return VICTOIRE
+        if self.coups == CASES:
+            self.termine = True
+            return NUL
+        return EN_COURS
+
+    def symbole(self, case):
+        if (self.camps[X] >> case) & 1:
+            return "X"
+        if (self.camps[O] >> case) & 1:
+            return "O"
+        return " "
+
+
+class Grille:
+    """Grille N×N où il faut aligner `aligner` symboles."""
+    __slots__ = ("taille", "aligner", "cases_total", "camps", "libres", "termine")
+
+    def __init__(self, taille, aligner):
+        if not 3 <= taille <= TAILLE_MAX or not 3 <= aligner <= taille:
+            raise ValueError(f"variante invalide : {taille}×{taille}, {aligner} alignés")
+        self.taille = taille
+        self.aligner = aligner
+        self.cases_total = taille * taille
+        self.camps = [0, 0]
+        self.libres = self.cases_total
+        self.termine = False
+
+    @property
+    def coups(self):
+        return self.cases_total - self.libres
+
+    @property
+    def cle(self):
+        """Clé compacte de la position : bits de X en haut, bits de O sur N² bits en bas."""
+        return (self.camps[X] << self.cases_total) | self.camps[O]
+
+    @property
+    def occupees(self):
+        return self.camps[X] | self.camps[O]
+
+    def case_libre(self, case):
+        return 0 <= case < self.cases_total and not (self.occupees >> case) & 1
+
+    def _aligne(self, case, bits):
+        """Un alignement passe-t-il par `case` ? Au plus k-1 cases lues de chaque côté, par direction."""
+        n, k = self.taille, self.aligner
+        ligne, colonne = divmod(case, n)
+        for dl, dc in DIRECTIONS:
+            compte = 1
+            for sens in (1, -1):
+                l, c = ligne + sens * dl, colonne + sens * dc
+                while compte < k and 0 <= l < n and 0 <= c < n and (bits >> (l * n + c)) & 1:
+                    compte += 1
+                    l += sens * dl
+                    c += sens * dc
+            if compte >= k:
+                return True
+        return False
+
+    def jouer(self, case, camp):
+        """Pose le symbole du `camp` sur `case` et retourne EN_COURS, VICTOIRE ou NUL."""
+        if self.termine or not self.case_libre(case):
+            raise CoupInvalide(case)
+        bits = self.camps[camp] | (1 << case)
+        self.camps[camp] = bits
+        self.libres -= 1
+        if self._aligne(case, bits):
+            self.termine = True
+            return VICTOIRE
+        if self.libres == 0:
+            self.termine = True
+            return NUL
+        return EN_COURS
+
+    def symbole(self, case):
+        if (self.camps[X] >> case) & 1:
+            return "X"
+        if (self.camps[O] >> case) & 1:
+            return "O"
+        return " "
+
+def nouvelle_partie(taille=3, aligner=3):
+    """Partie vide : le moteur 3×3 à table si possible, la grille générale sinon."""
+    if taille == 3 and aligner == 3:
+        return Morpion()
+    return Grille(taille, aligner)
+
+
+def etats_atteignables():
+    """Ensemble des clés de toutes les positions atteignables en jeu réel.
+
+    X peut ne pas commencer : les deux ordres de trait sont explorés.
+    """
+    vus = set()
+    explores = set()
+
+    def explorer(bits_x, bits_o, camp):
+        cle = (bits_x << CASES) | bits_o
+        if (cle, camp) in explores:
+            return
+        explores.add((cle, camp))
+        vus.add(cle)
+        if TABLE_VICTOIRE[bits_x] or TABLE_VICTOIRE[bits_o]:
+            return
+        libres = GRILLE_PLEINE & ~(bits_x | bits_o)
+        for case in range(CASES):
+            if (libres >> case) & 1:
+                if camp == X:
+                    explorer(bits_x | (1 << case), bits_o, O)
+                else:
+                    explorer(bits_x, bits_o | (1 << case), X)
+
+    explorer(0, 0, X)
+    explorer(0, 0, O)
+    return vus
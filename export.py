@@ -0,0 +1,117 @@
+"""Export en flux de l'historique des parties et des totaux par joueur.
+
+Les lignes sont lues par blocs (`fetchmany`) sur une connexion en lecture
+seule ouverte pour l'export, puis converties en CSV ou JSONL bloc par
+bloc : la mémoire utilisée ne dépend pas de la taille de l'historique.
+Les générateurs sont synchrones ; ils tournent dans le thread de Flask ou
+dans un thread dédié, jamais dans la boucle d'événements du bot.
+"""
+import csv
+import io
+import json
+import sqlite3
+from datetime import date, timedelta
+
+# Nombre de lignes lues (et converties) à la fois
+TAILLE_BLOC = 500
+
+FORMATS = {
+    "csv": "text/csv",
+    "jsonl": "application/x-ndjson",
+}
+
+COLONNES = {
+    "parties": ("id", "joueur1_id", "joueur2_id", "montant", "gagnant_id", "est_nul", "date", "tournoi_id"),
+    "joueurs": (
+        "joueur_id", "kamas_mises", "kamas_gagnes", "victoires", "nuls", "defaites", "total_parties",
+    ),
+}
+
+
+def requete_export(table, debut=None, fin=None, joueur_id=None):
+    """(requête, paramètres) de l'export ; `debut` et `fin` inclus (dates ISO AAAA-MM-JJ).
+
+    Même convention que /statsall et /mystats ; lève ValueError si une date
+    est invalide, ou si des dates sont données pour les totaux par joueur
+    (ils portent sur toute l'historique et ne se filtrent pas par date).
+    """
+    if table not in COLONNES:
+        raise ValueError(f"table inconnue : {table}")
+    colonnes = ", ".join(COLONNES[table])
+    if table == "joueurs":
+        if debut or fin:
+            raise ValueError("les totaux par joueur ne se filtrent pas par date")
+        if joueur_id is not None:
+            return f"SELECT {colonnes} FROM totaux_joueurs WHERE joueur_id = ?", (joueur_id,)
+        return f"SELECT {colonnes} FROM totaux_joueurs ORDER BY joueur_id", ()
+
+    conditions, params = [], []
+    if joueur_id is not None:
+        # Sur les colonnes de la partie, pas sur les participations : celles-ci
+        # ne couvrent que les duels, les parties de tournoi doivent aussi sortir
+        conditions.append("(joueur1_id = ? OR joueur2_id = ?)")
+        params.extend((joueur_id, joueur_id))
+    if debut:
+        conditions.append("date >= ?")
+        params.append(date.fromisoformat(debut).isoformat())
+    if fin:
+        # Fin incluse : tout ce qui précède le lendemain
+        conditions.append("date < ?")
+        params.append((date.fromisoformat(fin) + timedelta(days=1)).isoformat())
+    where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+    return f"SELECT {colonnes} FROM parties{where} ORDER BY id", tuple(params)
+
+
+def lignes(chemin, requete, params):
+    """Lignes de la requête, lues par blocs de TAILLE_BLOC."""
+    conn = sqlite3.connect(f"file:{chemin}?mode=ro", uri=True, check_same_thread=False)
+    try:
+        curseur = conn.execute(requete, params)
+        while True:
+            bloc = curseur.fetchmany(TAILLE_BLOC)
+            if not bloc:
+                break
+            yield bloc
+    finally:
+        conn.close()
+
+
+def exporter(chemin, table, format="csv", debut=None, fin=None, joueur_id=None):
+    """Générateur de morceaux de texte (un par bloc de lignes) au format demandé."""
+    if format not in FORMATS:
+        raise ValueError(f"format inconnu : {format}")
+    requete, params = requete_export(table, debut, fin, joueur_id)
+    colonnes = COLONNES[table]
+
+    if format == "jsonl":
+        for bloc in lignes(chemin, requete, params):
+            yield "".join(json.dumps(dict(zip(colonnes, ligne)), default=str) + "\n" for ligne in bloc)
+        return
+
+    tampon = io.StringIO()
+    ecrivain = csv.writer(tampon)
+    ecrivain.writerow(colonnes)
+    for bloc in lignes(chemin, requete, params):
+        ecrivain.writerows(bloc)
+        yield tampon.getvalue()
+        tampon.seek(0)
+        tampon.truncate()
+    if tampon.tell():
+        # Historique vide : seulement l'en-tête
+        yield tampon.getvalue()
+
+
+def exporter_fichier(fichier, chemin, table, format="csv", arret=None, **filtres):
+    """Écrit l'export dans un fichier binaire déjà ouvert ; retourne le nombre d'octets écrits.
+
+    `arret`, appelé après chaque bloc, interrompt l'export s'il renvoie
+    vrai : la fonction retourne alors None.
+    """
+    taille = 0
+    for morceau in exporter(chemin, table, format, **filtres):
+        donnees = morceau.encode()
+        fichier.write(donnees)
+        taille += len(donnees)
+        if arret is not None and arret():
+            return None
+    return taille
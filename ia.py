@@ -0,0 +1,178 @@
+"""Adversaire artificiel : table de jeu parfait précalculée.
+
+Toutes les positions 3×3 atteignables sont résolues une fois par negamax,
+vues du camp qui a le trait (« moi » contre « adversaire ») et réduites à
+leur représentant canonique sous les 8 symétries du carré (765 positions).
+Pour chacune des 627 positions non terminales, la table garde la valeur de
+chaque coup (victoire, nul ou défaite en jeu parfait). La table est écrite sur disque
+et rechargée au démarrage : choisir un coup pendant une partie est une
+lecture de dictionnaire, jamais une recherche.
+
+Usage : python ia.py [chemin] pour (re)générer le fichier.
+"""
+import os
+import random
+import struct
+import sys
+from array import array
+
+import engine
+
+# Niveaux de difficulté : probabilité de jouer un coup parfait (sinon coup au hasard)
+NIVEAUX = {
+    "facile": 0.2,
+    "moyen": 0.6,
+    "imbattable": 1.0,
+}
+
+# Valeur d'un coup codée sur 2 bits (0 : case occupée)
+DEFAITE = 1
+NUL = 2
+VICTOIRE = 3
+
+ENTETE = b"MORPIA"
+FORMAT_ENTETE = "<6sBI"
+VERSION_TABLE = 1
+
+# Les 8 symétries du carré, comme permutations des cases (case i -> PERMUTATIONS[s][i])
+_ROTATION = (6, 3, 0, 7, 4, 1, 8, 5, 2)
+_MIROIR = (2, 1, 0, 5, 4, 3, 8, 7, 6)
+
+
+def _composer(p, q):
+    """Permutation « p puis q »."""
+    return tuple(q[p[i]] for i in range(engine.CASES))
+
+
+def _symetries():
+    perms = [tuple(range(engine.CASES))]
+    for _ in range(3):
+        perms.append(_composer(perms[-1], _ROTATION))
+    perms += [_composer(p, _MIROIR) for p in perms[:4]]
+    return tuple(perms)
+
+
+PERMUTATIONS = _symetries()
+INVERSES = tuple(
+    tuple(perm.index(case) for case in range(engine.CASES)) for perm in PERMUTATIONS
+)
+
+# TRANSFORMEES[s][bits] : masque de cases `bits` après la symétrie s
+TRANSFORMEES = tuple(
+    array("H", (
+        sum(1 << perm[case] for case in range(engine.CASES) if (bits >> case) & 1)
+        for bits in range(1 << engine.CASES)
+    ))
+    for perm in PERMUTATIONS
+)
+
+
+def canonique(moi, adversaire):
+    """(clé canonique, symétrie qui y mène) pour la position vue du camp au trait."""
+    return min(
+        ((t[moi] << engine.CASES) | t[adversaire], s)
+        for s, t in enumerate(TRANSFORMEES)
+    )
+
+
+def resoudre():
+    """Résout toutes les positions atteignables ; renvoie {clé canonique: valeurs des coups}.
+
+    Les valeurs des 9 coups sont empaquetées sur 2 bits chacune, case 0 en
+    poids faible, dans le repère de la position canonique.
+    """
+    table = {}
+    valeurs = {}
+
+    def negamax(moi, adversaire):
+        cle, _ = canonique(moi, adversaire)
+        if cle in valeurs:
+            return valeurs[cle]
+        moi, adversaire = cle >> engine.CASES, cle & engine.GRILLE_PLEINE
+        if engine.TABLE_VICTOIRE[adversaire]:
+            valeur = -1
+        elif moi | adversaire == engine.GRILLE_PLEINE:
+            valeur = 0
+        else:
+            coups = 0
+            valeur = -1
+            libres = engine.GRILLE_PLEINE & ~(moi | adversaire)
+            for case in range(engine.CASES):
+                if (libres >> case) & 1:
+                    v = -negamax(adversaire, moi | (1 << case))
+                    coups |= (v + 2) << (2 * case)
+                    valeur = max(valeur, v)
+            table[cle] = coups
+        valeurs[cle] = valeur
+        return valeur
+
+    negamax(0, 0)
+    return table
+
+
+def sauvegarder(table, chemin):
+    entrees = array("Q", sorted((cle << 18) | coups for cle, coups in table.items()))
+    if sys.byteorder != "little":
+        entrees.byteswap()
+    temporaire = chemin + ".tmp"
+    with open(temporaire, "wb") as f:
+        f.write(struct.pack(FORMAT_ENTETE, ENTETE, VERSION_TABLE, len(entrees)))
+        f.write(entrees.tobytes())
+    os.replace(temporaire, chemin)
+
+
+def lire(chemin):
+    with open(chemin, "rb") as f:
+        entete, version, nombre = struct.unpack(FORMAT_ENTETE, f.read(struct.calcsize(FORMAT_ENTETE)))
+        if entete != ENTETE or version != VERSION_TABLE:
+            raise ValueError("table IA incompatible")
+        entrees = array("Q")
+        entrees.frombytes(f.read())
+    if len(entrees) != nombre:
+        raise ValueError("table IA tronquée")
+    if sys.byteorder != "little":
+        entrees.byteswap()
+    return {entree >> 18: entree & 0x3FFFF for entree in entrees}
+
+
+class IA:
+    def __init__(self):
+        self.table = {}
+
+    def charger(self, chemin):
+        """Charge la table depuis `chemin`, ou la calcule et l'écrit si elle manque."""
+        try:
+            self.table = lire(chemin)
+        except (OSError, ValueError, struct.error):
+            self.table = resoudre()
+            sauvegarder(self.table, chemin)
+        return len(self.table)
+
+    def valeurs_coups(self, moi, adversaire):
+        """{case: valeur} des coups légaux, dans le repère de la vraie grille."""
+        cle, s = canonique(moi, adversaire)
+        coups = self.table[cle]
+        inverse = INVERSES[s]
+        return {
+            inverse[case]: (coups >> (2 * case)) & 3
+            for case in range(engine.CASES)
+            if (coups >> (2 * case)) & 3
+        }
+
+    def choisir_coup(self, partie, camp, niveau):
+        """Case jouée par l'IA pour `camp` au niveau donné."""
+        valeurs = self.valeurs_coups(partie.camps[camp], partie.camps[1 - camp])
+        if random.random() < NIVEAUX[niveau]:
+            meilleure = max(valeurs.values())
+            return random.choice([case for case, v in valeurs.items() if v == meilleure])
+        return random.choice(list(valeurs))
+
+
+ia = IA()
+
+
+if __name__ == "__main__":
+    chemin = sys.argv[1] if len(sys.argv) > 1 else "ia_morpion.bin"
+    table = resoudre()
+    sauvegarder(table, chemin)
+    print(f"🧠 {len(table)} positions écrites dans {chemin} ({os.path.getsize(chemin)} octets).")
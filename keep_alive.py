@@ -1,18 +1,65 @@
-from flask import Flask
+import hmac
+import os
+from flask import Flask, Response, abort, request, stream_with_context
 from threading import Thread
 
+import export
+import metrics
+
 app = Flask('')
 
+# Jeton exigé par /export ; sans jeton configuré, la route est désactivée
+EXPORT_TOKEN = os.environ.get("EXPORT_TOKEN")
+
 
 @app.route('/')
 def home():
   return "le bot est en ligne jeux de morpions sleeping !"
 
 
+@app.route('/export')
+def export_route():
+  """/export?table=parties|joueurs&format=csv|jsonl&debut=AAAA-MM-JJ&fin=AAAA-MM-JJ&joueur=ID
+
+  `debut` / `fin` ne s'appliquent qu'aux parties : avec table=joueurs, 400.
+  """
+  jeton = request.headers.get("Authorization", "").removeprefix("Bearer ") or request.args.get("token", "")
+  if not EXPORT_TOKEN or not hmac.compare_digest(jeton, EXPORT_TOKEN):
+    abort(403)
+
+  table = request.args.get("table", "parties")
+  format = request.args.get("format", "csv")
+  joueur = request.args.get("joueur")
+  if table not in export.COLONNES or format not in export.FORMATS or (joueur and not joueur.isdigit()):
+    abort(400)
+  try:
+    # Dates vérifiées avant le début du flux : une erreur ici vaut 400, pas une réponse tronquée
+    export.requete_export(table, request.args.get("debut"), request.args.get("fin"))
+  except ValueError:
+    abort(400)
+
+  morceaux = export.exporter(
+    app.config["CHEMIN_DB"], table, format,
+    debut=request.args.get("debut"), fin=request.args.get("fin"),
+    joueur_id=int(joueur) if joueur else None
+  )
+  return Response(
+    stream_with_context(morceaux),
+    mimetype=export.FORMATS[format],
+    headers={"Content-Disposition": f"attachment; filename={table}.{format}"}
+  )
+
+
+@app.route('/metrics')
+def metrics_route():
+  return Response(metrics.registre.exposer(), mimetype="text/plain; version=0.0.4")
+
+
 def run():
   app.run(host='0.0.0.0', port=8088)
 
 
-def keep_alive():
+def keep_alive(chemin_db="tictactoe_stats.db"):
+  app.config["CHEMIN_DB"] = chemin_db
   t = Thread(target=run)
   t.start()
@@ -3,296 +3,677 @@ import discord
 from discord import app_commands
 from discord.ext import commands
 import random
+import signal
 import asyncio
-import sqlite3
+import gzip
+import hashlib
+import json
+import tempfile
+import time
 from datetime import datetime
+from cache import CacheMessages
+from croupiers import CacheRoles, PoolCroupiers
+from database import Database, decoder_entete, encoder_entete
+from duels import Duel, EtatDuel, RegistreDuels, mention
+from echeances import Echeancier
+from editions import FileEditions
+from matchmaking import FileAppariement
+from tournois import Tournoi
+from verrous import VerrousDuels
+from classement import (
+    JOUEURS_PAR_PAGE, PERIODES, bornes_periode, cache_stats, classement_courant, classement_periode, stats_joueur
+)
+import engine
+import export
+import metrics
+from metrics import chronometrer
+from ia import NIVEAUX, ia
+from rendu import EMOJIS_MORPION, cache_rendu
 from keep_alive import keep_alive # Assume this is handled by your environment
 
-token = os.environ['TOKEN_BOT_DISCORD']
-
-# Dictionnaire pour stocker les duels en cours.
-# La clé sera un tuple de (joueur1_id, joueur2_id) pour une identification unique.
-duels = {}
-
-# Dictionnaire de mappage pour retrouver un duel rapidement par l'ID d'un joueur
-duel_by_player = {}
-
-# Emojis pour la grille de morpion
-EMOJIS_MORPION = {
-    "X": "❌",
-    "O": "⭕",
-    " ": "◻️"
-}
+# Registre unique des duels en cours, indexé par duel, par joueur et par message
+registre = RegistreDuels()
 
 # Commission du croupier
 COMMISSION = 0.05
 
-# Connexion à la base de données
-conn = sqlite3.connect("tictactoe_stats.db")
-c = conn.cursor()
-c.execute("""
-CREATE TABLE IF NOT EXISTS parties (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    joueur1_id INTEGER NOT NULL,
-    joueur2_id INTEGER NOT NULL,
-    montant INTEGER NOT NULL,
-    gagnant_id INTEGER,
-    est_nul BOOLEAN NOT NULL,
-    date TIMESTAMP NOT NULL
+# Délais d'expiration en secondes : attente d'un second joueur, d'un croupier
+# (jusqu'au lancement de la partie), d'un coup pendant la partie et
+# d'un adversaire dans la file d'attente
+DELAI_REJOINDRE = int(os.environ.get("DELAI_REJOINDRE", 900))
+DELAI_CROUPIER = int(os.environ.get("DELAI_CROUPIER", 900))
+DELAI_COUP = int(os.environ.get("DELAI_COUP", 180))
+DELAI_FILE = int(os.environ.get("DELAI_FILE", 900))
+
+# Intervalle entre deux coups d'un /replay (une édition de message par coup)
+REPLAY_INTERVALLE = max(0.5, float(os.environ.get("REPLAY_INTERVALLE", 1.5)))
+
+# File d'attente des duels en mode appariement (/sleeping avec file)
+file_duels = FileAppariement(float(os.environ.get("FILE_ECART_MAX", 0.25)))
+
+# Tournois par id, et tournoi de chaque joueur inscrit et pas encore éliminé
+tournois = {}
+joueurs_tournoi = {}
+TOURNOI_MAX_JOUEURS = int(os.environ.get("TOURNOI_MAX_JOUEURS", 128))
+# Durée des inscriptions : sans lancement, le tournoi est annulé et ses inscrits libérés
+DELAI_INSCRIPTIONS = int(os.environ.get("DELAI_INSCRIPTIONS", 1800))
+# Tâches de fond des tournois (référencées jusqu'à leur fin)
+taches_tournoi = set()
+
+# Rôles résolus une fois par serveur et croupiers en service
+roles = CacheRoles()
+croupiers = PoolCroupiers()
+
+# Une seule tâche surveille les échéances de tous les duels
+echeancier = Echeancier()
+
+# Sérialise les transitions de chaque duel (clics simultanés, expirations)
+verrous = VerrousDuels()
+
+# Messages des duels gardés après envoi : /quit lit leur embed sans fetch_message
+messages = CacheMessages(int(os.environ.get("CACHE_MESSAGES", 1024)))
+
+# Éditions hors interaction (expirations, /quit) : EDITIONS_RAFALE éditions
+# par salon en rafale puis EDITIONS_PAR_SECONDE, fusionnées par message
+async def salon_de(channel_id):
+    return bot.get_channel(channel_id) or await bot.fetch_channel(channel_id)
+
+async def envoyer_edition(channel_id, message_id, kwargs):
+    # Toujours l'endpoint du salon (jeton du bot) : le jeton d'une interaction
+    # expire après 15 minutes, un lobby peut durer plus longtemps
+    channel = await salon_de(channel_id)
+    message = await channel.get_partial_message(message_id).edit(**kwargs)
+    messages.remplacer(message)
+    return message
+
+editions = FileEditions(
+    envoyer_edition,
+    capacite=int(os.environ.get("EDITIONS_RAFALE", 5)),
+    debit=float(os.environ.get("EDITIONS_PAR_SECONDE", 1.0))
 )
-""")
-conn.commit()
+
+# Base de données (accès hors de la boucle d'événements).
+# Les parties terminées sont écrites par lots : au plus DB_LOT_MAX parties
+# ou DB_FENETRE_MS millisecondes par transaction. Le schéma est ouvert au
+# démarrage du bot (preparer), pas à l'import.
+db = Database(
+    os.environ.get("DB_CHEMIN", "tictactoe_stats.db"),
+    lot_max=int(os.environ.get("DB_LOT_MAX", 50)),
+    fenetre_ms=int(os.environ.get("DB_FENETRE_MS", 200)),
+    ouvrir=False
+)
+
+# Métriques : temps base et API par commande, jauges lues par /metrics
+metrics.instrumenter_db(db)
+metrics.instrumenter_discord()
+metrics.registre.jauge(
+    "morpion_duels_en_cours", "Parties lancées en cours.",
+    lambda: sum(1 for d in registre if d.etat == EtatDuel.LANCE))
+metrics.registre.jauge(
+    "morpion_lobbies_en_attente", "Duels pas encore lancés (joueur ou croupier attendu).",
+    lambda: sum(1 for d in registre if d.etat != EtatDuel.LANCE))
+metrics.registre.jauge("morpion_tournois_en_cours", "Tournois en inscription ou en cours.", lambda: len(tournois))
+metrics.registre.jauge("morpion_file_attente", "Joueurs dans la file d'appariement.", lambda: len(file_duels))
+metrics.registre.jauge("morpion_echeances", "Échéances programmées.", lambda: len(echeancier))
+metrics.registre.jauge("morpion_editions_en_attente", "Éditions de messages en file.", lambda: len(editions))
+metrics.registre.jauge("morpion_editions_fusionnees_total", "Éditions absorbées par une plus récente.", lambda: editions.fusionnees, "counter")
+metrics.registre.jauge("morpion_messages_hits_total", "Messages de duel servis par le cache (fetch évité).", lambda: messages.hits, "counter")
+metrics.registre.jauge("morpion_messages_misses_total", "Messages de duel absents du cache.", lambda: messages.misses, "counter")
+metrics.registre.jauge("morpion_roles_hits_total", "Rôles servis par le cache par serveur.", lambda: roles.hits, "counter")
+metrics.registre.jauge("morpion_roles_misses_total", "Rôles recherchés dans la liste du serveur.", lambda: roles.misses, "counter")
+metrics.registre.jauge("morpion_db_lots_total", "Lots commités par le writer.", lambda: db.compteur.lots, "counter")
+metrics.registre.jauge("morpion_db_erreurs_total", "Lots en échec.", lambda: db.compteur.erreurs, "counter")
+metrics.registre.jauge("morpion_db_lignes_total", "Lignes écrites par le writer.", lambda: db.compteur.lignes, "counter")
+metrics.registre.jauge("morpion_db_abandons_total", "Écritures abandonnées après ESSAIS_MAX échecs.", lambda: db.compteur.abandons, "counter")
+metrics.registre.jauge("morpion_db_en_echec", "Écritures en attente d'un nouvel essai.", lambda: db.ecritures_en_echec)
+metrics.registre.histogramme_lu(
+    "morpion_db_taille_lot", "Lignes par lot commité.",
+    lambda: (db.compteur.tailles, db.compteur.lignes))
+metrics.registre.jauge(
+    "morpion_db_flush_millisecondes_total", "Temps cumulé des commits du writer.",
+    lambda: db.compteur.latence_totale_ms, "counter")
+metrics.registre.jauge("morpion_db_flush_max_millisecondes", "Commit le plus long du writer.", lambda: db.compteur.latence_max_ms)
+metrics.registre.jauge("morpion_cache_stats_hits_total", "Lectures de stats servies par le cache.", lambda: cache_stats.hits, "counter")
+metrics.registre.jauge("morpion_cache_stats_misses_total", "Lectures de stats parties en base.", lambda: cache_stats.misses, "counter")
+metrics.registre.jauge("morpion_cache_stats_entrees", "Entrées du cache de stats.", lambda: len(cache_stats))
+metrics.registre.jauge("morpion_rendu_hits_total", "Grilles servies par le cache de rendu.", lambda: cache_rendu.hits, "counter")
+metrics.registre.jauge("morpion_rendu_misses_total", "Grilles rendues faute d'entrée en cache.", lambda: cache_rendu.misses, "counter")
+metrics.registre.jauge("morpion_rendu_positions", "Grilles gardées par le cache de rendu.", lambda: len(cache_rendu))
+metrics.registre.jauge(
+    "morpion_rendu_taux_succes", "Part des grilles servies par le cache de rendu.",
+    lambda: cache_rendu.hits / max(1, cache_rendu.hits + cache_rendu.misses))
+metrics.registre.jauge("morpion_file_inscriptions_total", "Inscriptions dans la file d'appariement.", lambda: file_duels.compteur.inscriptions, "counter")
+metrics.registre.jauge("morpion_file_appariements_total", "Paires formées par la file.", lambda: file_duels.compteur.appariements, "counter")
+metrics.registre.jauge("morpion_file_abandons_total", "Joueurs sortis de la file sans adversaire.", lambda: file_duels.compteur.abandons, "counter")
+metrics.registre.jauge("morpion_file_profondeur_max", "Plus grand nombre de joueurs en file.", lambda: file_duels.compteur.profondeur_max)
+metrics.registre.jauge("morpion_file_attente_max_secondes", "Plus longue attente avant appariement.", lambda: file_duels.compteur.attente_max)
+metrics.registre.histogramme_lu(
+    "morpion_file_attente_secondes", "Attente en file avant appariement.",
+    lambda: (file_duels.compteur.attentes, file_duels.compteur.attente_totale))
 
 intents = discord.Intents.default()
 bot = commands.Bot(command_prefix="/", intents=intents)
 
-# --- Logique du jeu de morpion ---
-def check_win(board, player):
-    win_conditions = [
-        (0, 1, 2), (3, 4, 5), (6, 7, 8),
-        (0, 3, 6), (1, 4, 7), (2, 5, 8),
-        (0, 4, 8), (2, 4, 6),
-    ]
-    for condition in win_conditions:
-        if board[condition[0]] == board[condition[1]] == board[condition[2]] == player:
-            return True
-    return False
-
-def check_draw(board):
-    return " " not in board
-
-def create_board_display(board):
-    board_display = ""
-    for i in range(9):
-        board_display += EMOJIS_MORPION[board[i]]
-        if (i + 1) % 3 == 0:
-            board_display += "\n"
-    return board_display
-
-def create_board_embed(board, title, description, color, turn=None):
+@bot.tree.error
+async def erreur_commande(interaction: discord.Interaction, erreur: app_commands.AppCommandError):
+    # default_permissions n'est qu'un réglage par défaut, modifiable par le
+    # serveur : les commandes d'administration vérifient aussi côté bot
+    if isinstance(erreur, app_commands.MissingPermissions):
+        message = "❌ Cette commande est réservée aux administrateurs."
+    elif isinstance(erreur, app_commands.NoPrivateMessage):
+        message = "❌ Cette commande s'utilise sur un serveur."
+    else:
+        print(f"❌ Erreur dans /{interaction.command.name if interaction.command else '?'}:", erreur)
+        message = "❌ Une erreur est survenue."
+    if interaction.response.is_done():
+        await interaction.followup.send(message, ephemeral=True)
+    else:
+        await interaction.response.send_message(message, ephemeral=True)
+
+# --- Affichage du morpion (la logique de jeu est dans engine.py) ---
+def create_board_embed(partie, title, description, color, turn=None):
     embed = discord.Embed(
         title=title,
         description=description,
         color=color
     )
-    embed.add_field(name="Grille de jeu", value=create_board_display(board), inline=False)
+    embed.add_field(name="Grille de jeu", value=cache_rendu.grille(partie), inline=False)
     if turn:
-        embed.add_field(name="Tour de", value=f"{turn.mention}", inline=False)
+        embed.add_field(name="Tour de", value=mention(turn), inline=False)
     return embed
 
-def find_duel_by_user(user_id):
-    """Recherche un duel en cours par l'ID d'un utilisateur."""
-    if user_id in duel_by_player:
-        return duel_by_player[user_id]
-    return None, None
-
-def clean_up_duel(joueur1_id, joueur2_id):
-    """S'assure de bien supprimer le duel et ses références."""
-    duel_key = tuple(sorted((joueur1_id, joueur2_id)))
-    if duel_key in duels:
-        del duels[duel_key]
-    
-    if joueur1_id in duel_by_player:
-        del duel_by_player[joueur1_id]
-    if joueur2_id in duel_by_player:
-        del duel_by_player[joueur2_id]
+def nom_variante(duel):
+    return f"{duel.taille}×{duel.taille}, {duel.aligner} alignés"
+
+def create_lobby_embed(duel):
+    embed = discord.Embed(
+        title="⚔️ Nouveau Duel Morpion en attente de joueur",
+        description=f"{mention(duel.joueur1_id)} a misé **{f'{duel.montant:,}'.replace(',', ' ')}** kamas pour un duel.",
+        color=discord.Color.orange()
+    )
+    embed.add_field(name="👤 Joueur 1", value=mention(duel.joueur1_id), inline=True)
+    embed.add_field(name="👤 Joueur 2", value="🕓 En attente...", inline=True)
+    embed.add_field(name="Status", value="🕓 En attente d'un second joueur.", inline=False)
+    if duel.taille != 3:
+        embed.add_field(name="Variante", value=nom_variante(duel), inline=False)
+    embed.set_footer(text="Cliquez sur le bouton pour rejoindre le duel.")
+    return embed
+
+def completer_lobby_embed(embed, duel):
+    """Passe l'embed du lobby à l'étape « second joueur trouvé »."""
+    embed.title = f"⚔️ Duel entre {duel.joueur1_nom} et {duel.joueur2_nom}"
+    embed.set_field_at(1, name="👤 Joueur 2", value=mention(duel.joueur2_id), inline=True)
+    embed.set_field_at(2, name="Status", value="🕓 Un croupier est attendu pour lancer le duel.", inline=False)
+    embed.set_footer(text="Cliquez sur le bouton pour rejoindre en tant que croupier.")
+    return embed
+
+def appeler_croupier(guild, duel):
+    """Attribue un duel prêt à un croupier en service (ping direct), sinon pingue le rôle."""
+    croupier_id = croupiers.assigner(guild.id, exclus=(duel.joueur1_id, duel.joueur2_id))
+    if croupier_id is not None:
+        duel.croupier_assigne_id = croupier_id
+        return f"{mention(croupier_id)} — Un nouveau duel t'est attribué ! Tu es attendu comme croupier."
+    role_croupier = roles.role(guild, "croupier")
+    return f"{role_croupier.mention} — Un nouveau duel est prêt ! Un croupier est attendu." if role_croupier else ""
+
+def ping_joueurs(guild):
+    role_membre = roles.role(guild, "sleeping")
+    return f"{role_membre.mention} — Un nouveau duel est prêt ! Un joueur est attendu." if role_membre else ""
+
+def liberer_croupier(duel):
+    if duel.croupier_assigne_id is not None:
+        croupiers.liberer(duel.croupier_assigne_id)
+        duel.croupier_assigne_id = None
+
+def ajouter_pied_replay(embed, partie_id):
+    if partie_id is not None:
+        embed.set_footer(text=f"Partie n°{partie_id} — /replay {partie_id} pour la revoir")
+    return embed
+
+def clean_up_duel(duel):
+    """S'assure de bien supprimer le duel, ses index, son échéance et la charge de son croupier."""
+    registre.retirer(duel)
+    messages.retirer(duel.message_id)
+    echeancier.annuler(duel.duel_id)
+    liberer_croupier(duel)
+
+
+async def sauvegarder_duel(duel):
+    """Persiste l'état courant d'un duel (et la partie si elle est lancée)."""
+    # Parties amicales et de tournoi : non persistées
+    if duel.ia or duel.tournoi is not None:
+        return
+    partie = duel.vue if duel.etat == EtatDuel.LANCE else None
+    await db.save_duel({
+        "duel_id": duel.duel_id,
+        "etat": duel.etat.value,
+        "channel_id": duel.channel_id,
+        "message_id": duel.message_id,
+        "montant": duel.montant,
+        "joueur1_id": duel.joueur1_id,
+        "joueur1_nom": duel.joueur1_nom,
+        "joueur2_id": duel.joueur2_id,
+        "joueur2_nom": duel.joueur2_nom,
+        "croupier_id": duel.croupier_id,
+        "croupier_nom": duel.croupier_nom,
+        "joueur_actif_id": partie.joueur_actif_id if partie else None,
+        "coups": bytes(partie.coups) if partie else b"",
+        "taille": duel.taille,
+        "aligner": duel.aligner,
+    })
+
+async def editer_message(channel_id, message_id, **kwargs):
+    """Édite un message connu par ses IDs (hors interaction), via la file d'éditions."""
+    return await editions.editer(channel_id, message_id, **kwargs)
+
+def planifier_expiration(duel, ecoule=0.0):
+    """(Re)programme l'échéance du duel selon son état."""
+    if duel.etat == EtatDuel.LANCE:
+        delai, rappel = DELAI_COUP, lambda: expirer_partie(duel)
+    elif duel.etat == EtatDuel.OUVERT:
+        delai, rappel = DELAI_REJOINDRE, lambda: expirer_lobby(duel, "second joueur")
+    else:
+        delai, rappel = DELAI_CROUPIER, lambda: expirer_lobby(duel, "croupier")
+    echeancier.planifier(duel.duel_id, delai - ecoule, rappel)
+
+async def expirer_lobby(duel, manquant):
+    """Annule un duel resté trop longtemps sans second joueur ou sans croupier."""
+    async with verrous.verrou(duel.duel_id):
+        # Une transition a pu replanifier ou clore le duel pendant l'attente du verrou
+        if duel.duel_id in echeancier or registre.par_id.get(duel.duel_id) is not duel:
+            return
+        await _expirer_lobby(duel, manquant)
+
+async def _expirer_lobby(duel, manquant):
+    duel.vue.stop()
+    clean_up_duel(duel)
+    await db.delete_duel(duel.duel_id)
+    print(f"⌛ Duel {duel.duel_id} annulé : aucun {manquant}.")
+
+    embed = discord.Embed(
+        title="⌛ Duel expiré",
+        description=f"Le duel de **{duel.joueur1_nom}** a été annulé faute de {manquant}. Aucun kamas n'est engagé.",
+        color=discord.Color.red()
+    )
+    try:
+        await editer_message(duel.channel_id, duel.message_id, content="", embed=embed, view=None)
+    except discord.HTTPException:
+        pass
+
+async def expirer_partie(duel):
+    """Le joueur qui a la main n'a pas joué à temps : il perd par forfait."""
+    async with verrous.verrou(duel.duel_id):
+        if duel.duel_id in echeancier or registre.par_id.get(duel.duel_id) is not duel:
+            return
+        await _expirer_partie(duel)
+
+async def _expirer_partie(duel):
+    view = duel.vue
+    perdant_id = view.joueur_actif_id
+    gagnant_id = duel.adversaire(perdant_id)
+    embed = view.embed_fin(gagnant_id, is_draw=False, forfait_id=perdant_id)
+    partie_id = await view.terminer(gagnant_id, is_draw=False)
+    ajouter_pied_replay(embed, partie_id)
+    print(f"⌛ Duel {duel.duel_id} : forfait de {perdant_id}.")
+    try:
+        await editer_message(duel.channel_id, duel.message_id, embed=embed, view=None)
+    except discord.HTTPException:
+        pass
 
 
 # --- Vues Discord ---
 class TicTacToeView(discord.ui.View):
-    def __init__(self, duel_data):
+    def __init__(self, duel, joueur_actif_id=None, coups=()):
         super().__init__(timeout=None)
-        self.duel_data = duel_data
-        self.board = [" " for _ in range(9)]
-        self.joueur1 = duel_data["joueur1"]
-        self.joueur2 = duel_data["joueur2"]
+        metrics.vues.add(self)
+        self.duel = duel
+        self.partie = engine.nouvelle_partie(duel.taille, duel.aligner)
+        self.coups = []
         
-        self.joueur_actif = random.choice([self.joueur1, self.joueur2])
-        self.symboles = {
-            self.joueur1.id: "X",
-            self.joueur2.id: "O"
+        self.joueur_actif_id = joueur_actif_id or random.choice([duel.joueur1_id, duel.joueur2_id])
+        # Joueur qui a posé le premier symbole (recalculé pour une partie restaurée)
+        self.premier_id = self.joueur_actif_id
+        self.camps = {
+            duel.joueur1_id: engine.X,
+            duel.joueur2_id: engine.O
         }
-        
-        self.update_buttons()
+        self._embed_en_cours = None
 
-    def update_buttons(self):
-        self.clear_items()
-        for i in range(9):
-            row = i // 3
+        # Identifiant propre à la partie : les custom_id ne se chevauchent
+        # jamais entre duels simultanés.
+        self.game_id = duel.duel_id
+        self.cases_boutons = []
+        for i in range(self.partie.cases_total):
             button = discord.ui.Button(
-                emoji=EMOJIS_MORPION[self.board[i]],
+                emoji=EMOJIS_MORPION[" "],
                 style=discord.ButtonStyle.secondary,
-                custom_id=f"case_{i}",
-                disabled=self.board[i] != " ",
-                row=row
+                custom_id=f"morpion:{self.game_id}:{i}",
+                row=i // duel.taille
             )
             button.callback = self.on_button_click
             self.add_item(button)
-
+            self.cases_boutons.append(button)
+        # Composants sérialisés, mis à jour case par case
+        self._composants = super().to_components()
+
+        if coups:
+            self._rejouer(coups)
+
+    @property
+    def titre(self):
+        titre = f"⚔️ Duel entre {self.duel.joueur1_nom} (❌) et {self.duel.joueur2_nom} (⭕)"
+        if self.duel.taille != 3:
+            titre += f" — {nom_variante(self.duel)}"
+        return titre
+
+    def _rejouer(self, coups):
+        """Rejoue les coups d'une partie restaurée ; `joueur_actif_id` est celui qui a la main."""
+        autre_id = self.duel.adversaire(self.joueur_actif_id)
+        premier, second = (self.joueur_actif_id, autre_id) if len(coups) % 2 == 0 else (autre_id, self.joueur_actif_id)
+        self.premier_id = premier
+        for i, case in enumerate(coups):
+            joueur_id = premier if i % 2 == 0 else second
+            self.partie.jouer(case, self.camps[joueur_id])
+            self.coups.append(case)
+            self.update_case(case)
+
+    def update_case(self, case):
+        """Met à jour le seul bouton de la case qui vient d'être jouée."""
+        button = self.cases_boutons[case]
+        button.emoji = EMOJIS_MORPION[self.partie.symbole(case)]
+        button.disabled = True
+        self._composants[case // self.duel.taille]["components"][case % self.duel.taille] = button.to_component_dict()
+
+    def to_components(self):
+        return self._composants
+
+    @chronometrer("coup")
     async def on_button_click(self, interaction: discord.Interaction):
-        if interaction.user.id != self.joueur_actif.id:
+        # Un double clic ne peut pas jouer deux fois avant le changement de tour
+        async with verrous.verrou(self.duel.duel_id):
+            await self._jouer_coup(interaction)
+
+    async def _jouer_coup(self, interaction: discord.Interaction):
+        if self.is_finished():
+            await interaction.response.send_message("❌ Cette partie est terminée.", ephemeral=True)
+            return
+
+        if interaction.user.id != self.joueur_actif_id:
             await interaction.response.send_message("❌ Ce n'est pas ton tour !", ephemeral=True)
             return
 
-        case_index = int(interaction.data["custom_id"].split("_")[1])
-        symbole = self.symboles[self.joueur_actif.id]
-        self.board[case_index] = symbole
+        case_index = int(interaction.data["custom_id"].rsplit(":", 1)[1])
+        if not self.partie.case_libre(case_index):
+            await interaction.response.send_message("❌ Cette case est déjà prise.", ephemeral=True)
+            return
+
+        resultat = self.appliquer_coup(case_index)
+        if resultat == engine.EN_COURS and self.duel.ia:
+            # L'IA répond dans la même interaction : une seule édition du message
+            resultat = self.jouer_ia()
 
-        if check_win(self.board, symbole):
-            await self.end_game(interaction, self.joueur_actif, is_draw=False)
+        if resultat == engine.VICTOIRE:
+            await self.end_game(interaction, self.joueur_actif_id, is_draw=False)
             return
 
-        if check_draw(self.board):
+        if resultat == engine.NUL:
             await self.end_game(interaction, None, is_draw=True)
             return
 
-        # Passe le tour au joueur suivant
-        self.joueur_actif = self.joueur2 if self.joueur_actif.id == self.joueur1.id else self.joueur1
-        self.update_buttons()
-        
-        embed = create_board_embed(
-            self.board,
-            f"⚔️ Duel entre {self.joueur1.display_name} (❌) et {self.joueur2.display_name} (⭕)",
-            "Le jeu est en cours. Fais ton coup !",
-            discord.Color.blue(),
-            turn=self.joueur_actif
-        )
-        await interaction.response.edit_message(embed=embed, view=self)
+        # Coup persisté et échéance passée au nouveau joueur actif avant l'appel
+        # à Discord : si l'édition échoue, le coup joué en mémoire reste cohérent
+        # avec la base et c'est bien le nouveau joueur actif qui est attendu
+        await sauvegarder_duel(self.duel)
+        planifier_expiration(self.duel)
+        await interaction.response.edit_message(embed=self.embed_en_cours(), view=self)
+
+    def appliquer_coup(self, case):
+        """Joue `case` pour le joueur actif ; passe le tour si la partie continue."""
+        resultat = self.partie.jouer(case, self.camps[self.joueur_actif_id])
+        self.coups.append(case)
+        self.update_case(case)
+        if resultat == engine.EN_COURS:
+            self.joueur_actif_id = self.duel.adversaire(self.joueur_actif_id)
+        return resultat
+
+    def jouer_ia(self):
+        """Coup de l'IA (lecture de la table précalculée)."""
+        return self.appliquer_coup(ia.choisir_coup(self.partie, self.camps[self.joueur_actif_id], self.duel.ia))
+
+    def embed_en_cours(self):
+        """Embed de partie en cours : créé une fois, seuls la grille et le tour changent."""
+        if self._embed_en_cours is None:
+            self._embed_en_cours = create_board_embed(
+                self.partie,
+                self.titre,
+                "Le jeu est en cours. Fais ton coup !",
+                discord.Color.blue(),
+                turn=self.joueur_actif_id
+            )
+        else:
+            self._embed_en_cours.set_field_at(0, name="Grille de jeu", value=cache_rendu.grille(self.partie), inline=False)
+            self._embed_en_cours.set_field_at(1, name="Tour de", value=mention(self.joueur_actif_id), inline=False)
+        return self._embed_en_cours
 
-    async def end_game(self, interaction: discord.Interaction, winner, is_draw):
+    def embed_fin(self, gagnant_id, is_draw, forfait_id=None):
+        if self.duel.tournoi is not None:
+            return self.embed_fin_tournoi(gagnant_id, is_draw, forfait_id)
         if is_draw:
             title = "🤝 Match nul !"
-            description = f"La partie entre {self.joueur1.mention} et {self.joueur2.mention} se termine par un match nul."
+            description = f"La partie entre {mention(self.duel.joueur1_id)} et {mention(self.duel.joueur2_id)} se termine par un match nul."
             color = discord.Color.greyple()
-            gagnant_id = None
+        elif self.duel.ia:
+            title = f"🎉 Victoire de {self.duel.nom(gagnant_id)} !"
+            description = f"{mention(gagnant_id)} remporte la partie amicale (niveau {self.duel.ia})."
+            if forfait_id:
+                description = f"⌛ {mention(forfait_id)} n'a pas joué à temps et perd par forfait.\n\n" + description
+            color = discord.Color.green()
         else:
-            montant = self.duel_data["montant"]
+            montant = self.duel.montant
             gain_net = int(montant * 2 )
-            title = f"🎉 Victoire de {winner.display_name} !"
+            title = f"🎉 Victoire de {self.duel.nom(gagnant_id)} !"
             description = (
-                f"{winner.mention} remporte le duel et gagne :\n**{gain_net:,}** kamas\n.\n\n"
+                f"{mention(gagnant_id)} remporte le duel et gagne :\n**{gain_net:,}** kamas\n.\n\n"
                 f"Félicitations !"
             ).replace(",", " ")
+            if forfait_id:
+                description = f"⌛ {mention(forfait_id)} n'a pas joué à temps et perd par forfait.\n\n" + description
             color = discord.Color.green()
-            gagnant_id = winner.id
-        
-        embed = create_board_embed(self.board, title, description, color)
+        return create_board_embed(self.partie, title, description, color)
+
+    def embed_fin_tournoi(self, gagnant_id, is_draw, forfait_id=None):
+        if is_draw:
+            title = "🤝 Match nul !"
+            description = f"{mention(self.duel.joueur1_id)} et {mention(self.duel.joueur2_id)} font match nul : la partie est rejouée."
+            color = discord.Color.greyple()
+        else:
+            title = f"🎉 Victoire de {self.duel.nom(gagnant_id)} !"
+            if len(self.duel.tournoi.matchs) == 1:
+                description = f"{mention(gagnant_id)} remporte la finale du tournoi !"
+            else:
+                description = f"{mention(gagnant_id)} remporte le match et passe au tour suivant."
+            if forfait_id:
+                description = f"⌛ {mention(forfait_id)} n'a pas joué à temps et perd par forfait.\n\n" + description
+            color = discord.Color.green()
+        return create_board_embed(self.partie, title, description, color)
+
+    def journal(self):
+        """(entête, coups) de la partie, tels qu'enregistrés avec le résultat."""
+        return (
+            encoder_entete(self.duel.taille, self.duel.aligner, self.premier_id == self.duel.joueur1_id),
+            bytes(self.coups)
+        )
+
+    @chronometrer("fin_partie")
+    async def end_game(self, interaction: discord.Interaction, gagnant_id, is_draw):
+        embed = self.embed_fin(gagnant_id, is_draw)
+        # L'id de la partie est attribué à la mise en file : il figure dans le message final
+        partie_id = await self.terminer(gagnant_id, is_draw)
+        ajouter_pied_replay(embed, partie_id)
         await interaction.response.edit_message(embed=embed, view=None)
 
+    async def terminer(self, gagnant_id, is_draw):
+        """Clôt la partie : enregistrement du résultat (et des coups) et libération des joueurs.
+
+        Retourne l'id de la partie enregistrée, ou None.
+        """
+        self.stop()
+        # Suppression du duel du registre
+        clean_up_duel(self.duel)
+
+        # Les parties amicales contre l'IA ne sont ni persistées ni comptées
+        if self.duel.ia:
+            return None
+
+        # Les parties de tournoi sont écrites hors stats, puis le tableau avance
+        if self.duel.tournoi is not None:
+            return await fin_partie_tournoi(self, gagnant_id, is_draw)
+
         # Enregistrement dans la base de données
-        now = datetime.utcnow()
         try:
-            c.execute(
-                "INSERT INTO parties (joueur1_id, joueur2_id, montant, gagnant_id, est_nul, date) VALUES (?, ?, ?, ?, ?, ?)",
-                (self.joueur1.id, self.joueur2.id, self.duel_data["montant"], gagnant_id, is_draw, now)
+            partie_id = await db.record_game(
+                self.duel.joueur1_id, self.duel.joueur2_id, self.duel.montant, gagnant_id, is_draw, journal=self.journal()
             )
-            conn.commit()
+            await db.delete_duel(self.duel.duel_id)
         except Exception as e:
             print("❌ Erreur lors de l'insertion dans la base de données:", e)
-
-        # Suppression de l'entrée du duel du dictionnaire
-        clean_up_duel(self.joueur1.id, self.joueur2.id)
+            return None
+        return partie_id
 
 class RejoindreView(discord.ui.View):
-    def __init__(self, message_id, joueur1, montant):
+    def __init__(self, duel):
         super().__init__(timeout=None)
-        self.message_id_initial = message_id
-        self.joueur1 = joueur1
-        self.montant = montant
-        self.joueur2 = None
-        self.croupier = None
-        self.duel_data = {
-            "joueur1": self.joueur1,
-            "montant": self.montant,
-            "joueur2": self.joueur2,
-            "croupier": self.croupier,
-            "message_id_initial": self.message_id_initial
-        }
+        metrics.vues.add(self)
+        self.duel = duel
+        duel.vue = self
+        if duel.joueur2_id is not None:
+            self.ajouter_bouton_croupier()
+        if duel.croupier_id is not None:
+            self.ajouter_bouton_lancer()
+
+    def ajouter_bouton_croupier(self):
+        self.children[0].disabled = True
+        croupier_button = discord.ui.Button(label="🎲 Rejoindre en tant que Croupier", style=discord.ButtonStyle.secondary, custom_id="rejoindre_croupier")
+        croupier_button.callback = self.rejoindre_croupier
+        self.add_item(croupier_button)
+
+    def ajouter_bouton_lancer(self):
+        self.children[-1].disabled = True
+        lancer_button = discord.ui.Button(label="🎮 Lancer la partie", style=discord.ButtonStyle.success, custom_id="lancer_partie", row=1)
+        lancer_button.callback = self.lancer_partie
+        self.add_item(lancer_button)
 
     @discord.ui.button(label="🎯 Rejoindre le duel", style=discord.ButtonStyle.green, custom_id="rejoindre_duel")
+    @chronometrer("rejoindre")
     async def rejoindre(self, interaction: discord.Interaction, button: discord.ui.Button):
+        async with verrous.verrou(self.duel.duel_id):
+            await self._rejoindre(interaction)
+
+    async def _rejoindre(self, interaction: discord.Interaction):
+        duel = self.duel
         joueur2 = interaction.user
+
+        if self.is_finished() or duel.etat != EtatDuel.OUVERT:
+            await interaction.response.send_message("❌ Ce duel n'est plus disponible.", ephemeral=True)
+            return
         
-        if joueur2.id == self.joueur1.id:
+        if joueur2.id == duel.joueur1_id:
             await interaction.response.send_message("❌ Tu ne peux pas rejoindre ton propre duel.", ephemeral=True)
             return
         
         # Vérification si le joueur est déjà dans un duel
-        _, existing_duel = find_duel_by_user(joueur2.id)
-        if existing_duel:
+        if registre.duel_du_joueur(joueur2.id):
             await interaction.response.send_message("❌ Tu participes déjà à un autre duel.", ephemeral=True)
             return
 
-        self.joueur2 = joueur2
-        self.duel_data["joueur2"] = joueur2
-        
-        self.children[0].disabled = True
-        
-        self.add_item(discord.ui.Button(label="🎲 Rejoindre en tant que Croupier", style=discord.ButtonStyle.secondary, custom_id="rejoindre_croupier"))
-        self.children[-1].callback = self.rejoindre_croupier
+        if joueur2.id in file_duels:
+            await interaction.response.send_message("❌ Tu es dans la file d'attente. Utilise `/quit` pour en sortir.", ephemeral=True)
+            return
 
-        embed = interaction.message.embeds[0]
-        embed.title = f"⚔️ Duel entre {self.joueur1.display_name} et {self.joueur2.display_name}"
-        embed.set_field_at(1, name="👤 Joueur 2", value=f"{self.joueur2.mention}", inline=True)
-        embed.set_field_at(2, name="Status", value="🕓 Un croupier est attendu pour lancer le duel.", inline=False)
-        embed.set_footer(text="Cliquez sur le bouton pour rejoindre en tant que croupier.")
+        if joueur2.id in joueurs_tournoi:
+            await interaction.response.send_message("❌ Tu participes à un tournoi en cours.", ephemeral=True)
+            return
+
+        # Mise à jour du registre avant tout await : le joueur 2 ne peut
+        # plus rejoindre un autre duel en parallèle
+        duel.joueur2_id = joueur2.id
+        duel.joueur2_nom = joueur2.display_name
+        duel.etat = EtatDuel.REJOINT
+        registre.lier_joueur(duel, joueur2.id)
         
-        role_croupier = discord.utils.get(interaction.guild.roles, name="croupier")
-        contenu_ping = f"{role_croupier.mention} — Un nouveau duel est prêt ! Un croupier est attendu." if role_croupier else ""
+        self.ajouter_bouton_croupier()
+
+        embed = completer_lobby_embed(interaction.message.embeds[0], duel)
+        messages.set(interaction.message)
         
         await interaction.response.edit_message(
-            content=contenu_ping,
+            content=appeler_croupier(interaction.guild, duel),
             embed=embed,
             view=self,
             allowed_mentions=discord.AllowedMentions(roles=True)
         )
-        
-        # Mise à jour de l'entrée dans les dictionnaires pour le joueur 2
-        duel_key = tuple(sorted((self.joueur1.id, self.joueur2.id)))
-        duels[duel_key] = self.duel_data
-        duel_by_player[self.joueur2.id] = (duel_key, self.duel_data)
-        
-        # Correction pour l'entrée du joueur 1, qui peut avoir été ajoutée avec un placeholder
-        old_duel_key = tuple(sorted((self.joueur1.id, 0)))
-        if old_duel_key in duels:
-            del duels[old_duel_key]
-        
-        duel_by_player[self.joueur1.id] = (duel_key, self.duel_data)
+        await sauvegarder_duel(duel)
+        planifier_expiration(duel)
 
     async def rejoindre_croupier(self, interaction: discord.Interaction):
-        role_croupier = discord.utils.get(interaction.guild.roles, name="croupier")
-        if not role_croupier or role_croupier not in interaction.user.roles:
+        async with verrous.verrou(self.duel.duel_id):
+            await self._rejoindre_croupier(interaction)
+
+    async def _rejoindre_croupier(self, interaction: discord.Interaction):
+        duel = self.duel
+        if self.is_finished():
+            await interaction.response.send_message("❌ Ce duel n'est plus disponible.", ephemeral=True)
+            return
+
+        role_croupier = roles.role(interaction.guild, "croupier")
+        if not role_croupier or interaction.user.get_role(role_croupier.id) is None:
             await interaction.response.send_message("❌ Tu n'as pas le rôle de `croupier` pour rejoindre ce duel.", ephemeral=True)
             return
 
-        if self.croupier:
+        if duel.croupier_id is not None:
             await interaction.response.send_message("❌ Un croupier a déjà rejoint le duel.", ephemeral=True)
             return
             
-        self.croupier = interaction.user
-        self.duel_data["croupier"] = self.croupier
+        duel.croupier_id = interaction.user.id
+        duel.croupier_nom = interaction.user.display_name
+        duel.etat = EtatDuel.CROUPIER
+        # La charge passe du croupier pingué à celui qui a réellement pris le duel
+        if duel.croupier_assigne_id != duel.croupier_id:
+            liberer_croupier(duel)
+            duel.croupier_assigne_id = duel.croupier_id
+            croupiers.prendre(duel.croupier_id)
         
         embed = interaction.message.embeds[0]
-        embed.set_field_at(2, name="Status", value=f"✅ Prêt à jouer ! Croupier : {self.croupier.mention}", inline=False)
+        messages.set(interaction.message)
+        embed.set_field_at(2, name="Status", value=f"✅ Prêt à jouer ! Croupier : {mention(duel.croupier_id)}", inline=False)
         embed.set_footer(text="Le croupier peut lancer la partie.")
         
-        self.children[-1].disabled = True
-        lancer_button = discord.ui.Button(label="🎮 Lancer la partie", style=discord.ButtonStyle.success, custom_id="lancer_partie", row=1)
-        lancer_button.callback = self.lancer_partie
-        self.add_item(lancer_button)
+        self.ajouter_bouton_lancer()
         
         await interaction.response.edit_message(content="", embed=embed, view=self)
+        await sauvegarder_duel(duel)
+        planifier_expiration(duel)
 
     async def lancer_partie(self, interaction: discord.Interaction):
-        if interaction.user.id != self.croupier.id:
+        async with verrous.verrou(self.duel.duel_id):
+            await self._lancer_partie(interaction)
+
+    async def _lancer_partie(self, interaction: discord.Interaction):
+        duel = self.duel
+        if self.is_finished():
+            await interaction.response.send_message("❌ La partie a déjà été lancée.", ephemeral=True)
+            return
+
+        if interaction.user.id != duel.croupier_id:
             await interaction.response.send_message("❌ Seul le croupier peut lancer la partie.", ephemeral=True)
             return
 
-        if not self.joueur2:
+        if duel.joueur2_id is None:
             await interaction.response.send_message("❌ Le duel n'est pas prêt. Il faut deux joueurs.", ephemeral=True)
             return
 
         await interaction.response.defer()
+        self.stop()
 
         # Supprimer le message initial
         try:
@@ -301,28 +682,135 @@ class RejoindreView(discord.ui.View):
             pass
 
         # Créer le nouveau message pour le jeu de morpion
-        tictactoe_view = TicTacToeView(self.duel_data)
+        tictactoe_view = TicTacToeView(duel)
         embed = create_board_embed(
-            tictactoe_view.board,
-            f"⚔️ Duel entre {self.joueur1.display_name} (❌) et {self.joueur2.display_name} (⭕)",
-            f"Le joueur qui commence est {tictactoe_view.joueur_actif.mention}.",
+            tictactoe_view.partie,
+            tictactoe_view.titre,
+            f"Le joueur qui commence est {mention(tictactoe_view.joueur_actif_id)}.",
             discord.Color.blue(),
-            turn=tictactoe_view.joueur_actif
+            turn=tictactoe_view.joueur_actif_id
         )
 
-        await interaction.channel.send(embed=embed, view=tictactoe_view)
+        messages.retirer(duel.message_id)
+        message = await interaction.channel.send(embed=embed, view=tictactoe_view)
+        messages.set(message)
+        duel.vue = tictactoe_view
+        duel.etat = EtatDuel.LANCE
+        registre.lier_message(duel, message.id)
+        await sauvegarder_duel(duel)
+        planifier_expiration(duel)
+
+
+class TournoiView(discord.ui.View):
+    """Inscriptions d'un tournoi : inscription (ou désinscription), lancement et annulation."""
+
+    def __init__(self, tournoi):
+        super().__init__(timeout=None)
+        metrics.vues.add(self)
+        self.tournoi = tournoi
+        self.message_id = None
+
+    def embed(self):
+        tournoi = self.tournoi
+        embed = discord.Embed(
+            title="🏆 Tournoi de morpion — inscriptions ouvertes",
+            description=(
+                f"Mise d'entrée : **{f'{tournoi.mise:,}'.replace(',', ' ')}** kamas, à remettre à {mention(tournoi.organisateur_id)}.\n"
+                "Élimination directe, les matchs nuls sont rejoués."
+            ),
+            color=discord.Color.purple()
+        )
+        embed.add_field(name="Inscrits", value=f"{len(tournoi.inscrits)}/{tournoi.max_joueurs}", inline=True)
+        embed.add_field(name="Cagnotte", value=f"{f'{tournoi.cagnotte:,}'.replace(',', ' ')} kamas", inline=True)
+        if tournoi.taille != 3:
+            embed.add_field(name="Variante", value=f"{tournoi.taille}×{tournoi.taille}, {tournoi.aligner} alignés", inline=False)
+        embed.set_footer(text="Cliquez pour vous inscrire (ou vous désinscrire). L'organisateur lance le tournoi.")
+        return embed
+
+    @discord.ui.button(label="🏆 S'inscrire / se désinscrire", style=discord.ButtonStyle.green, custom_id="tournoi_inscription")
+    async def inscription(self, interaction: discord.Interaction, button: discord.ui.Button):
+        tournoi = self.tournoi
+        joueur = interaction.user
+        if tournoi.lance or self.is_finished():
+            await interaction.response.send_message("❌ Les inscriptions sont closes.", ephemeral=True)
+            return
+
+        if joueur.id in tournoi.inscrits:
+            tournoi.desinscrire(joueur.id)
+            joueurs_tournoi.pop(joueur.id, None)
+        else:
+            if joueur.id in joueurs_tournoi:
+                await interaction.response.send_message("❌ Tu es déjà inscrit à un autre tournoi.", ephemeral=True)
+                return
+            if registre.duel_du_joueur(joueur.id) or joueur.id in file_duels:
+                await interaction.response.send_message("❌ Termine ou quitte d'abord ton duel en cours.", ephemeral=True)
+                return
+            if not tournoi.inscrire(joueur.id, joueur.display_name):
+                await interaction.response.send_message("❌ Le tournoi est complet.", ephemeral=True)
+                return
+            joueurs_tournoi[joueur.id] = tournoi
+
+        await interaction.response.edit_message(embed=self.embed(), view=self)
+
+    @discord.ui.button(label="🚀 Lancer le tournoi", style=discord.ButtonStyle.blurple, custom_id="tournoi_lancer")
+    async def lancer(self, interaction: discord.Interaction, button: discord.ui.Button):
+        tournoi = self.tournoi
+        if interaction.user.id != tournoi.organisateur_id:
+            await interaction.response.send_message("❌ Seul l'organisateur peut lancer le tournoi.", ephemeral=True)
+            return
+        if tournoi.lance or self.is_finished():
+            await interaction.response.send_message("❌ Le tournoi est déjà lancé.", ephemeral=True)
+            return
+        if len(tournoi.inscrits) < 2:
+            await interaction.response.send_message("❌ Il faut au moins deux inscrits.", ephemeral=True)
+            return
+
+        matchs = tournoi.demarrer()
+        self.stop()
+        echeancier.annuler(f"inscriptions:{tournoi.tournoi_id}")
+        embed = self.embed()
+        embed.title = "🏆 Tournoi lancé !"
+        embed.set_footer(text=f"{len(tournoi.inscrits)} joueurs, {tournoi.nb_tours} tour(s). Bonne chance !")
+        await interaction.response.edit_message(embed=embed, view=None)
+        tache_tournoi(lancer_tour(tournoi, matchs))
+
+    @discord.ui.button(label="Annuler", style=discord.ButtonStyle.danger, custom_id="tournoi_annuler")
+    async def annuler(self, interaction: discord.Interaction, button: discord.ui.Button):
+        tournoi = self.tournoi
+        if interaction.user.id != tournoi.organisateur_id:
+            await interaction.response.send_message("❌ Seul l'organisateur peut annuler le tournoi.", ephemeral=True)
+            return
+        if tournoi.lance or self.is_finished():
+            await interaction.response.send_message("❌ Le tournoi est déjà lancé.", ephemeral=True)
+            return
+
+        self.stop()
+        echeancier.annuler(f"inscriptions:{tournoi.tournoi_id}")
+        liberer_tournoi(tournoi)
+        embed = self.embed()
+        embed.title = "❌ Tournoi annulé"
+        embed.color = discord.Color.red()
+        embed.set_footer(text="Les mises d'entrée sont rendues par l'organisateur.")
+        await interaction.response.edit_message(embed=embed, view=None)
 
 
 class StatsView(discord.ui.View):
-    def __init__(self, ctx, entries, page=0):
+    def __init__(self, ctx, classement, page=0, libelle=None):
         super().__init__(timeout=120)
+        metrics.vues.add(self)
         self.ctx = ctx
-        self.entries = entries
+        self.classement = classement
+        self.libelle = libelle
         self.page = page
-        self.entries_per_page = 10
-        self.max_page = (len(entries) - 1) // self.entries_per_page
+        self.entries_per_page = JOUEURS_PAR_PAGE
+        self.max_page = classement.max_page
+        self.slice_entries = []
         self.update_buttons()
 
+    async def charger_page(self):
+        """Lit uniquement la page courante depuis le classement."""
+        self.slice_entries = await self.classement.page(self.page)
+
     def update_buttons(self):
         self.first_page.disabled = self.page == 0
         self.prev_page.disabled = self.page == 0
@@ -331,10 +819,9 @@ class StatsView(discord.ui.View):
         self.stop_button.disabled = False
         
     def get_embed(self):
-        embed = discord.Embed(title="📊 Statistiques Morpion", color=discord.Color.gold())
-        start = self.page * self.entries_per_page
-        end = start + self.entries_per_page
-        slice_entries = self.entries[start:end]
+        titre = "📊 Statistiques Morpion" + (f" — {self.libelle}" if self.libelle else "")
+        embed = discord.Embed(title=titre, color=discord.Color.gold())
+        slice_entries = self.slice_entries
 
         if not slice_entries:
             embed.description = "Aucune donnée à afficher."
@@ -362,6 +849,7 @@ class StatsView(discord.ui.View):
     async def first_page(self, interaction: discord.Interaction, button: discord.ui.Button):
         self.page = 0
         self.update_buttons()
+        await self.charger_page()
         await interaction.response.edit_message(embed=self.get_embed(), view=self)
 
     @discord.ui.button(label="◀️", style=discord.ButtonStyle.secondary)
@@ -369,6 +857,7 @@ class StatsView(discord.ui.View):
         if self.page > 0:
             self.page -= 1
         self.update_buttons()
+        await self.charger_page()
         await interaction.response.edit_message(embed=self.get_embed(), view=self)
 
     @discord.ui.button(label="▶️", style=discord.ButtonStyle.secondary)
@@ -376,10 +865,14 @@ class StatsView(discord.ui.View):
         if self.page < self.max_page:
             self.page += 1
         self.update_buttons()
+        await self.charger_page()
         await interaction.response.edit_message(embed=self.get_embed(), view=self)
 
     @discord.ui.button(label="⏭️", style=discord.ButtonStyle.secondary)
     async def last_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        # Une seule lecture depuis la fin ; le nombre de pages suit la base actuelle
+        self.slice_entries = await self.classement.derniere_page()
+        self.max_page = self.classement.max_page
         self.page = self.max_page
         self.update_buttons()
         await interaction.response.edit_message(embed=self.get_embed(), view=self)
@@ -391,187 +884,566 @@ class StatsView(discord.ui.View):
 
 
 # --- Commandes du bot ---
+CHOIX_VARIANTES = [
+    app_commands.Choice(name=f"{nom} ({aligner} alignés)", value=nom)
+    for nom, (_, aligner) in engine.VARIANTES.items()
+]
+
 @bot.tree.command(name="sleeping", description="Lancer un duel de morpion avec un montant.")
-@app_commands.describe(montant="Montant misé en kamas")
-async def duel(interaction: discord.Interaction, montant: int):
+@app_commands.describe(
+    montant="Montant misé en kamas",
+    file="Attendre un adversaire de mise proche au lieu de publier un lobby",
+    contre_ia="Partie amicale contre le bot (la mise est ignorée)",
+    variante="Taille de la grille et nombre de symboles à aligner"
+)
+@app_commands.choices(
+    contre_ia=[app_commands.Choice(name=niveau.capitalize(), value=niveau) for niveau in NIVEAUX],
+    variante=CHOIX_VARIANTES
+)
+@chronometrer("sleeping")
+async def duel(interaction: discord.Interaction, montant: int, file: bool = False, contre_ia: str = None, variante: str = "3x3"):
     if not isinstance(interaction.channel, discord.TextChannel) or interaction.channel.name != "morpion":
         await interaction.response.send_message("❌ Cette commande ne peut être utilisée que dans le salon #morpion.", ephemeral=True)
         return
     
-    if montant <= 0:
+    if montant <= 0 and contre_ia is None:
         await interaction.response.send_message("❌ Le montant doit être supérieur à 0.", ephemeral=True)
         return
 
-    _, existing_duel = find_duel_by_user(interaction.user.id)
-    if existing_duel:
+    if registre.duel_du_joueur(interaction.user.id):
         await interaction.response.send_message(
             "❌ Tu participes déjà à un autre duel. Termine-le ou utilise `/quit` pour l'annuler.",
             ephemeral=True
         )
         return
-            
-    embed = discord.Embed(
-        title="⚔️ Nouveau Duel Morpion en attente de joueur",
-        description=f"{interaction.user.mention} a misé **{f'{montant:,}'.replace(',', ' ')}** kamas pour un duel.",
-        color=discord.Color.orange()
-    )
-    embed.add_field(name="👤 Joueur 1", value=f"{interaction.user.mention}", inline=True)
-    embed.add_field(name="👤 Joueur 2", value="🕓 En attente...", inline=True)
-    embed.add_field(name="Status", value="🕓 En attente d'un second joueur.", inline=False)
-    embed.set_footer(text="Cliquez sur le bouton pour rejoindre le duel.")
 
-    # La vue est créée, mais sans l'ID de message pour l'instant
-    view = RejoindreView(message_id=None, joueur1=interaction.user, montant=montant)
-    
-    role_membre = discord.utils.get(interaction.guild.roles, name="sleeping")
-    contenu_ping = f"{role_membre.mention} — Un nouveau duel est prêt ! Un joueur est attendu." if role_membre else ""
-    
-    # On envoie le message et on attend la réponse pour récupérer son ID
-    await interaction.response.send_message(content=contenu_ping, embed=embed, view=view, allowed_mentions=discord.AllowedMentions(roles=True))
-    
-    message = await interaction.original_response()
-    
-    # On met à jour l'ID du message dans l'instance de la vue
-    view.message_id_initial = message.id
-    
-    # Enfin, on met à jour l'ID du message dans le dictionnaire du duel
-    duel_key = tuple(sorted((interaction.user.id, 0))) # Utiliser 0 comme placeholder pour joueur2_id
-    view.duel_data["message_id_initial"] = message.id # Met à jour la valeur dans le dictionnaire
-    
-    duels[duel_key] = view.duel_data
-    duel_by_player[interaction.user.id] = (duel_key, view.duel_data)
+    if interaction.user.id in file_duels:
+        await interaction.response.send_message(
+            "❌ Tu es déjà dans la file d'attente. Utilise `/quit` pour en sortir.", ephemeral=True)
+        return
+
+    if interaction.user.id in joueurs_tournoi:
+        await interaction.response.send_message("❌ Tu participes à un tournoi en cours.", ephemeral=True)
+        return
+
+    taille, aligner = engine.VARIANTES[variante]
+
+    if contre_ia is not None:
+        if taille != 3:
+            await interaction.response.send_message("❌ Le bot ne joue qu'en 3×3.", ephemeral=True)
+            return
+        await defier_ia(interaction, contre_ia)
+        return
+
+    if file:
+        await rejoindre_file(interaction, montant, taille, aligner)
+        return
+
+    # Le duel et sa vue sont créés, mais sans l'ID de message pour l'instant
+    nouveau_duel = Duel(
+        joueur1_id=interaction.user.id,
+        joueur1_nom=interaction.user.display_name,
+        montant=montant,
+        channel_id=interaction.channel.id,
+        taille=taille,
+        aligner=aligner
+    )
+    view = RejoindreView(nouveau_duel)
+    embed = create_lobby_embed(nouveau_duel)
     
+    await publier_lobby(interaction, nouveau_duel, view, embed, ping_joueurs(interaction.guild))
+
+async def publier_lobby(interaction: discord.Interaction, nouveau_duel, view, embed, contenu_ping):
+    # Les joueurs sont enregistrés avant tout await : un second /sleeping simultané
+    # est refusé. Le verrou du duel retient /quit tant que le message n'existe pas.
+    registre.ajouter(nouveau_duel)
+    async with verrous.verrou(nouveau_duel.duel_id):
+        # On envoie le message et on attend la réponse pour récupérer son ID
+        try:
+            await interaction.response.send_message(content=contenu_ping, embed=embed, view=view, allowed_mentions=discord.AllowedMentions(roles=True))
+            message = await interaction.original_response()
+        except discord.HTTPException:
+            clean_up_duel(nouveau_duel)
+            raise
+
+        registre.lier_message(nouveau_duel, message.id)
+        messages.set(message)
+        await sauvegarder_duel(nouveau_duel)
+        planifier_expiration(nouveau_duel)
+
+async def defier_ia(interaction: discord.Interaction, niveau):
+    """Partie amicale immédiate contre le bot : ni lobby, ni croupier, ni mise."""
+    nouveau_duel = Duel(
+        joueur1_id=interaction.user.id,
+        joueur1_nom=interaction.user.display_name,
+        montant=0,
+        channel_id=interaction.channel.id,
+        etat=EtatDuel.LANCE,
+        joueur2_id=bot.user.id,
+        joueur2_nom=bot.user.display_name,
+        ia=niveau
+    )
+    view = TicTacToeView(nouveau_duel)
+    nouveau_duel.vue = view
+    if view.joueur_actif_id == bot.user.id:
+        view.jouer_ia()
+
+    registre.ajouter(nouveau_duel)
+    async with verrous.verrou(nouveau_duel.duel_id):
+        try:
+            await interaction.response.send_message(embed=view.embed_en_cours(), view=view)
+            message = await interaction.original_response()
+        except discord.HTTPException:
+            clean_up_duel(nouveau_duel)
+            raise
+        registre.lier_message(nouveau_duel, message.id)
+        messages.set(message)
+        planifier_expiration(nouveau_duel)
+
+async def rejoindre_file(interaction: discord.Interaction, montant, taille, aligner):
+    """Mode appariement : seul un duel apparié publie un lobby (et un ping croupier)."""
+    joueur = interaction.user
+    adversaire = file_duels.inscrire(joueur.id, joueur.display_name, montant, interaction.channel.id, (taille, aligner))
+    if adversaire is None:
+        echeancier.planifier(f"file:{joueur.id}", DELAI_FILE, lambda: expirer_file(joueur.id))
+        await interaction.response.send_message(
+            f"🕓 Tu es dans la file d'attente pour **{f'{montant:,}'.replace(',', ' ')}** kamas. "
+            "Le duel sera publié dès qu'un adversaire de mise proche se présente (`/quit` pour sortir).",
+            ephemeral=True
+        )
+        return
+
+    echeancier.annuler(f"file:{adversaire.joueur_id}")
+    print(f"🤝 Appariement {adversaire.montant} ↔ {montant} après {time.monotonic() - adversaire.arrivee:.1f} s (file : {len(file_duels)}).")
+
+    # Le joueur qui attendait crée le duel ; la mise retenue est la plus petite des deux
+    nouveau_duel = Duel(
+        joueur1_id=adversaire.joueur_id,
+        joueur1_nom=adversaire.joueur_nom,
+        montant=min(montant, adversaire.montant),
+        channel_id=interaction.channel.id,
+        etat=EtatDuel.REJOINT,
+        joueur2_id=joueur.id,
+        joueur2_nom=joueur.display_name,
+        taille=taille,
+        aligner=aligner
+    )
+    view = RejoindreView(nouveau_duel)
+    embed = completer_lobby_embed(create_lobby_embed(nouveau_duel), nouveau_duel)
+    contenu_ping = f"{mention(nouveau_duel.joueur1_id)} {mention(nouveau_duel.joueur2_id)} {appeler_croupier(interaction.guild, nouveau_duel)}".rstrip()
+    try:
+        await publier_lobby(interaction, nouveau_duel, view, embed, contenu_ping)
+    except discord.HTTPException:
+        # Lobby non publié (publier_lobby a nettoyé le duel) : le joueur qui
+        # attendait reprend sa place dans la file
+        if adversaire.joueur_id not in file_duels and registre.duel_du_joueur(adversaire.joueur_id) is None:
+            file_duels.reinscrire(adversaire)
+            reste = max(0.0, DELAI_FILE - (time.monotonic() - adversaire.arrivee))
+            echeancier.planifier(f"file:{adversaire.joueur_id}", reste, lambda: expirer_file(adversaire.joueur_id))
+        raise
+
+async def expirer_file(joueur_id):
+    if file_duels.desinscrire(joueur_id) is not None:
+        print(f"⌛ {joueur_id} retiré de la file d'attente : aucun adversaire.")
 
 @bot.tree.command(name="quit", description="Annule le duel en cours que tu as lancé ou que tu as rejoint.")
 async def quit_duel(interaction: discord.Interaction):
-    duel_key, duel_data = find_duel_by_user(interaction.user.id)
-    
-    if duel_key is None:
+    if file_duels.desinscrire(interaction.user.id) is not None:
+        echeancier.annuler(f"file:{interaction.user.id}")
+        await interaction.response.send_message("✅ Tu as quitté la file d'attente.", ephemeral=True)
+        return
+
+    duel_en_cours = registre.duel_du_joueur(interaction.user.id)
+    if duel_en_cours is None:
+        await interaction.response.send_message(
+            "❌ Tu n'as aucun duel en attente à annuler ou à quitter.", ephemeral=True)
+        return
+
+    async with verrous.verrou(duel_en_cours.duel_id):
+        await _quitter_duel(interaction, duel_en_cours)
+
+async def _quitter_duel(interaction: discord.Interaction, duel_en_cours):
+    # Revérifié sous le verrou : le duel a pu expirer entre-temps, et un autre
+    # duel du joueur n'est pas protégé par ce verrou
+    if registre.duel_du_joueur(interaction.user.id) is not duel_en_cours:
         await interaction.response.send_message(
             "❌ Tu n'as aucun duel en attente à annuler ou à quitter.", ephemeral=True)
         return
-    
-    joueur1 = duel_data["joueur1"]
-    joueur2 = duel_data["joueur2"]
-    montant = duel_data["montant"]
 
+    if duel_en_cours.etat == EtatDuel.LANCE:
+        await interaction.response.send_message(
+            "❌ La partie est déjà lancée : termine-la (un joueur inactif perd par forfait).", ephemeral=True)
+        return
+
+    # Message gardé depuis l'envoi du lobby ; fetch seulement après un redémarrage
+    message_initial = messages.get(duel_en_cours.message_id)
     try:
-        message_initial = await interaction.channel.fetch_message(duel_data["message_id_initial"])
+        if message_initial is None:
+            message_initial = await interaction.channel.fetch_message(duel_en_cours.message_id)
+            messages.set(message_initial)
     except discord.NotFound:
         await interaction.response.send_message("❌ Le message du duel initial n'a pas été trouvé. Le duel a été supprimé.", ephemeral=True)
         # Nettoyer les données même si le message n'est pas trouvé
-        clean_up_duel(joueur1.id, joueur2.id if joueur2 else 0)
+        duel_en_cours.vue.stop()
+        clean_up_duel(duel_en_cours)
+        await db.delete_duel(duel_en_cours.duel_id)
         return
 
-    if interaction.user.id == joueur1.id:
+    if interaction.user.id == duel_en_cours.joueur1_id:
         # C'est le joueur 1 qui annule le duel
         
         embed_initial = message_initial.embeds[0]
         embed_initial.title = "❌ Duel annulé"
-        embed_initial.description = f"Le duel de **{joueur1.display_name}** a été annulé."
+        embed_initial.description = f"Le duel de **{duel_en_cours.joueur1_nom}** a été annulé."
         embed_initial.color = discord.Color.red()
-        await message_initial.edit(embed=embed_initial, view=None, content="")
+        # Nettoyage d'abord : le message a pu disparaître (le cache évite le fetch
+        # qui l'aurait révélé) et l'édition peut attendre son tour dans la file
+        duel_en_cours.vue.stop()
+        clean_up_duel(duel_en_cours)
+        await db.delete_duel(duel_en_cours.duel_id)
         await interaction.response.send_message("✅ Ton duel a bien été annulé.", ephemeral=True)
+        try:
+            await editer_message(duel_en_cours.channel_id, duel_en_cours.message_id, embed=embed_initial, view=None, content="")
+        except discord.HTTPException as e:
+            print(f"❌ Message du duel {duel_en_cours.duel_id} annulé non mis à jour:", e)
+
+    elif interaction.user.id == duel_en_cours.joueur2_id:
+        # C'est le joueur 2 qui quitte le duel : le lobby repart de zéro
+        registre.delier_joueur(duel_en_cours, duel_en_cours.joueur2_id)
+        duel_en_cours.joueur2_id = duel_en_cours.joueur2_nom = None
+        duel_en_cours.croupier_id = duel_en_cours.croupier_nom = None
+        liberer_croupier(duel_en_cours)
+        duel_en_cours.etat = EtatDuel.OUVERT
+        duel_en_cours.vue.stop()
+        new_view = RejoindreView(duel_en_cours)
 
-        # Nettoyer les entrées des dictionnaires après avoir mis à jour le message
-        clean_up_duel(joueur1.id, joueur2.id if joueur2 else 0)
-
-    elif joueur2 and interaction.user.id == joueur2.id:
-        # C'est le joueur 2 qui quitte le duel
-        
-        # Nettoyer les anciennes entrées avant de recréer un nouveau duel
-        clean_up_duel(joueur1.id, joueur2.id)
-
-        new_view = RejoindreView(message_id=message_initial.id, joueur1=joueur1, montant=montant)
-        
-        new_embed = discord.Embed(
-            title="⚔️ Nouveau Duel Morpion en attente de joueur",
-            description=f"{joueur1.mention} a misé **{f'{montant:,}'.replace(',', ' ')}** kamas pour un duel.",
-            color=discord.Color.orange()
-        )
-        new_embed.add_field(name="👤 Joueur 1", value=f"{joueur1.mention}", inline=True)
-        new_embed.add_field(name="👤 Joueur 2", value="🕓 En attente...", inline=True)
-        new_embed.add_field(name="Status", value="🕓 En attente d'un second joueur.", inline=False)
-        new_embed.set_footer(text="Cliquez sur le bouton pour rejoindre le duel.")
-
-        role_membre = discord.utils.get(interaction.guild.roles, name="sleeping")
-        contenu_ping = f"{role_membre.mention} — Un nouveau duel est prêt ! Un joueur est attendu." if role_membre else ""
-        
-        await message_initial.edit(content=contenu_ping, embed=new_embed, view=new_view, allowed_mentions=discord.AllowedMentions(roles=True))
         await interaction.response.send_message("✅ Tu as quitté le duel. Le créateur attend maintenant un autre joueur.", ephemeral=True)
+        try:
+            await editer_message(
+                duel_en_cours.channel_id, duel_en_cours.message_id,
+                content=ping_joueurs(interaction.guild), embed=create_lobby_embed(duel_en_cours), view=new_view,
+                allowed_mentions=discord.AllowedMentions(roles=True)
+            )
+        except discord.NotFound:
+            # Lobby supprimé entre-temps : le duel ne peut plus être rejoint
+            new_view.stop()
+            clean_up_duel(duel_en_cours)
+            await db.delete_duel(duel_en_cours.duel_id)
+            return
+        except discord.HTTPException as e:
+            print(f"❌ Lobby du duel {duel_en_cours.duel_id} non mis à jour:", e)
 
-        # Créer une nouvelle entrée dans les dictionnaires pour le duel en attente
-        duel_key_new = tuple(sorted((joueur1.id, 0)))
-        new_duel_data = {"joueur1": joueur1, "montant": montant, "joueur2": None, "croupier": None, "message_id_initial": message_initial.id}
-        duels[duel_key_new] = new_duel_data
-        duel_by_player[joueur1.id] = (duel_key_new, new_duel_data)
+        await sauvegarder_duel(duel_en_cours)
+        planifier_expiration(duel_en_cours)
     else:
         # Cas où le joueur n'est pas le joueur 1 ou 2
         await interaction.response.send_message(
             "❌ Impossible d'annuler ou de quitter ce duel.", ephemeral=True)
 
-# Commandes de statistiques (inchangées)
-@bot.tree.command(name="statsall", description="Affiche les stats de morpion à vie.")
-async def statsall(interaction: discord.Interaction):
+@bot.tree.command(name="replay", description="Rejoue une partie terminée coup par coup.")
+@app_commands.describe(partie_id="Numéro de la partie (affiché à la fin de chaque duel)")
+async def replay(interaction: discord.Interaction, partie_id: int):
+    ligne = await db.fetch_game(partie_id)
+    if ligne is None:
+        await interaction.response.send_message("❌ Partie introuvable (ou jouée avant l'enregistrement des coups).", ephemeral=True)
+        return
+
+    joueur1_id, joueur2_id, montant, gagnant_id, est_nul, date, entete, coups = ligne
+    taille, aligner, joueur1_commence = decoder_entete(entete)
+    partie = engine.nouvelle_partie(taille, aligner)
+    camp = engine.X if joueur1_commence else engine.O
+    titre = f"📼 Replay de la partie n°{partie_id}"
+    description = (
+        f"{mention(joueur1_id)} (❌) contre {mention(joueur2_id)} (⭕) — "
+        f"{f'{montant:,}'.replace(',', ' ')} kamas, {taille}×{taille}"
+    )
+    fin = "\n\n🤝 Match nul." if est_nul else f"\n\n🎉 Victoire de {mention(gagnant_id)}."
+    if not coups:
+        # Forfait avant le premier coup
+        description += fin
+
+    # Un seul message, édité à chaque coup
+    await interaction.response.send_message(
+        embed=create_board_embed(partie, titre, description, discord.Color.dark_teal())
+    )
+    for numero, case in enumerate(coups, start=1):
+        await asyncio.sleep(REPLAY_INTERVALLE)
+        partie.jouer(case, camp)
+        camp ^= 1
+        if numero == len(coups):
+            description += fin
+        embed = create_board_embed(partie, titre, description, discord.Color.dark_teal())
+        embed.set_footer(text=f"Coup {numero}/{len(coups)}")
+        try:
+            await interaction.edit_original_response(embed=embed)
+        except discord.HTTPException:
+            return
+
+
+@bot.tree.command(name="service", description="Prendre ou quitter le service de croupier.")
+@app_commands.guild_only()
+async def service(interaction: discord.Interaction):
+    role_croupier = roles.role(interaction.guild, "croupier")
+    if not role_croupier or interaction.user.get_role(role_croupier.id) is None:
+        await interaction.response.send_message("❌ Seuls les membres ayant le rôle `croupier` peuvent prendre le service.", ephemeral=True)
+        return
+
+    if croupiers.basculer(interaction.user.id, interaction.guild.id):
+        await interaction.response.send_message(
+            "✅ Tu es en service : les duels prêts te seront attribués directement.", ephemeral=True)
+    else:
+        await interaction.response.send_message(
+            "✅ Tu n'es plus en service. Les duels déjà attribués restent à ta charge.", ephemeral=True)
+
+
+# --- Tournois ---
+def tache_tournoi(coroutine):
+    """Lance une étape de tournoi en tâche de fond, hors de l'interaction qui l'a déclenchée."""
+    tache = asyncio.create_task(coroutine)
+    taches_tournoi.add(tache)
+    tache.add_done_callback(taches_tournoi.discard)
+
+def liberer_tournoi(tournoi):
+    tournois.pop(tournoi.tournoi_id, None)
+    for joueur_id in tournoi.inscrits:
+        if joueurs_tournoi.get(joueur_id) is tournoi:
+            del joueurs_tournoi[joueur_id]
+
+def embed_tour(tournoi, matchs):
+    lignes = [
+        f"{mention(match.joueur1_id)} ⚔️ {mention(match.joueur2_id)}" if match.joueur2_id is not None
+        else f"{mention(match.joueur1_id)} est exempté"
+        for match in tournoi.matchs
+    ]
+    description = "\n".join(lignes)
+    if len(description) > 4000:
+        description = description[:4000].rsplit("\n", 1)[0] + "\n…"
+    nom_tour = "Finale" if len(tournoi.matchs) == 1 else f"Tour {tournoi.tour}/{tournoi.nb_tours}"
+    embed = discord.Embed(title=f"🏆 Tournoi — {nom_tour}", description=description, color=discord.Color.purple())
+    embed.set_footer(text=f"{len(matchs)} match(s) lancés en même temps. Un joueur inactif perd par forfait.")
+    return embed
+
+async def lancer_tour(tournoi, matchs):
+    """Annonce le tour puis lance tous ses matchs en même temps, sans croupier."""
+    try:
+        salon = await salon_de(tournoi.channel_id)
+        await salon.send(embed=embed_tour(tournoi, matchs))
+    except discord.HTTPException as e:
+        print(f"❌ Annonce du tour {tournoi.tour} du tournoi {tournoi.tournoi_id} impossible:", e)
+    await asyncio.gather(*(lancer_match(tournoi, match) for match in matchs))
+
+async def lancer_match(tournoi, match):
+    """Publie la partie d'un match ; elle se déroule comme un duel lancé, sans être persistée."""
+    duel = Duel(
+        joueur1_id=match.joueur1_id,
+        joueur1_nom=tournoi.nom(match.joueur1_id),
+        montant=0,
+        channel_id=tournoi.channel_id,
+        etat=EtatDuel.LANCE,
+        joueur2_id=match.joueur2_id,
+        joueur2_nom=tournoi.nom(match.joueur2_id),
+        taille=tournoi.taille,
+        aligner=tournoi.aligner,
+        tournoi=tournoi,
+        match=match
+    )
+    view = TicTacToeView(duel)
+    duel.vue = view
+    description = f"🏆 Tournoi, tour {tournoi.tour}/{tournoi.nb_tours}. {mention(view.joueur_actif_id)} commence."
+    if match.nuls:
+        description += f"\nPartie rejouée après {match.nuls} nul(s)."
+    embed = create_board_embed(view.partie, view.titre, description, discord.Color.blue(), turn=view.joueur_actif_id)
+
+    registre.ajouter(duel)
+    try:
+        salon = await salon_de(tournoi.channel_id)
+        message = await salon.send(content=f"{mention(duel.joueur1_id)} {mention(duel.joueur2_id)}", embed=embed, view=view)
+    except discord.HTTPException as e:
+        # Nouvel essai plus tard : le tableau ne doit pas rester bloqué sur ce match
+        print(f"❌ Match de tournoi {duel.joueur1_id} / {duel.joueur2_id} non publié, nouvel essai dans 10 s:", e)
+        view.stop()
+        clean_up_duel(duel)
+        echeancier.planifier(f"tournoi:{duel.duel_id}", 10, lambda: lancer_match(tournoi, match))
+        return
+    registre.lier_message(duel, message.id)
+    messages.set(message)
+    planifier_expiration(duel)
+
+async def fin_partie_tournoi(view, gagnant_id, is_draw):
+    """Partie de tournoi terminée : résultat mis en file (sans mise ni stats), nul rejoué.
+
+    Appelée pendant l'interaction du dernier coup : le tour suivant est lancé
+    en tâche de fond. Retourne l'id de la partie, ou None.
+    """
+    tournoi, match = view.duel.tournoi, view.duel.match
+    try:
+        partie_id = await db.record_game(
+            view.duel.joueur1_id, view.duel.joueur2_id, 0, gagnant_id, is_draw,
+            journal=view.journal(), tournoi_id=tournoi.tournoi_id
+        )
+    except Exception as e:
+        print(f"❌ Erreur lors de l'enregistrement d'une partie du tournoi {tournoi.tournoi_id}:", e)
+        partie_id = None
+    if is_draw:
+        match.nuls += 1
+        tache_tournoi(lancer_match(tournoi, match))
+        return partie_id
+
+    dernier_du_tour = tournoi.resultat(match, gagnant_id)
+    joueurs_tournoi.pop(match.perdant(), None)
+    if dernier_du_tour:
+        tache_tournoi(cloturer_tour(tournoi))
+    return partie_id
+
+async def cloturer_tour(tournoi):
+    """Ouvre le tour suivant ou sacre le champion."""
+    matchs = tournoi.tour_suivant()
+    if matchs:
+        await lancer_tour(tournoi, matchs)
+        return
+
+    liberer_tournoi(tournoi)
+    print(f"🏆 Tournoi {tournoi.tournoi_id} : {tournoi.champion_id} champion parmi {len(tournoi.inscrits)} joueurs.")
+    embed = discord.Embed(
+        title=f"🏆 {tournoi.nom(tournoi.champion_id)} remporte le tournoi !",
+        description=(
+            f"{mention(tournoi.champion_id)} s'impose parmi {len(tournoi.inscrits)} joueurs et remporte la cagnotte de "
+            f"**{f'{tournoi.cagnotte:,}'.replace(',', ' ')}** kamas, remise par {mention(tournoi.organisateur_id)}."
+        ),
+        color=discord.Color.gold()
+    )
+    try:
+        salon = await salon_de(tournoi.channel_id)
+        await salon.send(embed=embed)
+    except discord.HTTPException as e:
+        print(f"❌ Annonce du champion du tournoi {tournoi.tournoi_id} impossible:", e)
+
+@bot.tree.command(name="tournoi", description="Ouvre les inscriptions d'un tournoi à élimination directe.")
+@app_commands.describe(
+    mise="Mise d'entrée en kamas, remise à l'organisateur (croupier)",
+    variante="Taille de la grille et nombre de symboles à aligner"
+)
+@app_commands.choices(variante=CHOIX_VARIANTES)
+@chronometrer("tournoi")
+async def tournoi_commande(interaction: discord.Interaction, mise: int, variante: str = "3x3"):
     if not isinstance(interaction.channel, discord.TextChannel) or interaction.channel.name != "morpion":
         await interaction.response.send_message("❌ Cette commande ne peut être utilisée que dans le salon #morpion.", ephemeral=True)
         return
 
-    c.execute("""
-    SELECT joueur_id,
-           SUM(montant) as kamas_mises,
-           SUM(CASE WHEN gagnant_id = joueur_id THEN montant * 2 ELSE 0 END) as kamas_gagnes,
-           SUM(CASE WHEN gagnant_id = joueur_id THEN 1 ELSE 0 END) as victoires,
-           SUM(CASE WHEN est_nul = 1 THEN 1 ELSE 0 END) as nuls,
-           SUM(CASE WHEN gagnant_id != joueur_id AND est_nul = 0 THEN 1 ELSE 0 END) as defaites,
-           COUNT(*) as total_parties
-    FROM (
-        SELECT joueur1_id as joueur_id, montant, gagnant_id, est_nul FROM parties
-        UNION ALL
-        SELECT joueur2_id as joueur_id, montant, gagnant_id, est_nul FROM parties
+    role_croupier = roles.role(interaction.guild, "croupier")
+    if not role_croupier or interaction.user.get_role(role_croupier.id) is None:
+        await interaction.response.send_message("❌ Seul un `croupier` peut organiser un tournoi.", ephemeral=True)
+        return
+
+    if mise <= 0:
+        await interaction.response.send_message("❌ La mise doit être supérieure à 0.", ephemeral=True)
+        return
+
+    taille, aligner = engine.VARIANTES[variante]
+    nouveau_tournoi = Tournoi(
+        interaction.user.id, mise, interaction.channel.id, taille, aligner, max_joueurs=TOURNOI_MAX_JOUEURS
+    )
+    tournois[nouveau_tournoi.tournoi_id] = nouveau_tournoi
+    view = TournoiView(nouveau_tournoi)
+    role_membre = roles.role(interaction.guild, "sleeping")
+    try:
+        await interaction.response.send_message(
+            content=f"{role_membre.mention} — Un tournoi ouvre ses inscriptions !" if role_membre else None,
+            embed=view.embed(),
+            view=view,
+            allowed_mentions=discord.AllowedMentions(roles=True)
+        )
+        view.message_id = (await interaction.original_response()).id
+    except discord.HTTPException:
+        liberer_tournoi(nouveau_tournoi)
+        raise
+    echeancier.planifier(
+        f"inscriptions:{nouveau_tournoi.tournoi_id}", DELAI_INSCRIPTIONS, lambda: expirer_inscriptions(view)
     )
-    GROUP BY joueur_id
-    ORDER BY kamas_gagnes DESC
-    """)
-    data = c.fetchall()
 
-    stats = []
-    for user_id, kamas_mises, kamas_gagnes, victoires, nuls, defaites, total_parties in data:
-        stats.append((user_id, kamas_mises, kamas_gagnes, victoires, nuls, defaites, total_parties))
+async def expirer_inscriptions(view):
+    """Tournoi jamais lancé : annulé, ses inscrits peuvent de nouveau jouer des duels."""
+    tournoi = view.tournoi
+    if tournoi.lance or view.is_finished():
+        return
+    view.stop()
+    liberer_tournoi(tournoi)
+    print(f"⌛ Tournoi {tournoi.tournoi_id} annulé : pas lancé à temps ({len(tournoi.inscrits)} inscrits).")
+    embed = view.embed()
+    embed.title = "⌛ Tournoi expiré"
+    embed.color = discord.Color.red()
+    embed.set_footer(text="Le tournoi n'a pas été lancé à temps. Les mises d'entrée sont rendues par l'organisateur.")
+    try:
+        await editer_message(tournoi.channel_id, view.message_id, embed=embed, view=None)
+    except discord.HTTPException:
+        pass
+
+
+# --- Statistiques : classement paginé et par période, fiche joueur ---
+def libelle_periode(periode, bornes, debut, fin):
+    if debut or fin:
+        return f"du {debut or '…'} au {fin or '…'}"
+    return None if bornes is None else PERIODES[periode]
+
+DESCRIPTIONS_PERIODE = {
+    "periode": "Période des statistiques (par défaut : à vie)",
+    "debut": "Plage personnalisée : premier jour inclus (AAAA-MM-JJ, UTC)",
+    "fin": "Plage personnalisée : dernier jour inclus (AAAA-MM-JJ, UTC)",
+}
+CHOIX_PERIODE = [app_commands.Choice(name=libelle.capitalize(), value=periode) for periode, libelle in PERIODES.items()]
+
+@bot.tree.command(name="statsall", description="Affiche les stats de morpion, à vie ou sur une période.")
+@app_commands.describe(**DESCRIPTIONS_PERIODE)
+@app_commands.choices(periode=CHOIX_PERIODE)
+@chronometrer("statsall")
+async def statsall(interaction: discord.Interaction, periode: str = "tout", debut: str = None, fin: str = None):
+    if not isinstance(interaction.channel, discord.TextChannel) or interaction.channel.name != "morpion":
+        await interaction.response.send_message("❌ Cette commande ne peut être utilisée que dans le salon #morpion.", ephemeral=True)
+        return
+
+    try:
+        bornes = bornes_periode(periode, debut, fin)
+    except ValueError:
+        await interaction.response.send_message("❌ Les dates doivent être au format AAAA-MM-JJ.", ephemeral=True)
+        return
 
-    if not stats:
+    if bornes is None:
+        classement = await classement_courant(db)
+    else:
+        # Somme des agrégats quotidiens de la période, jamais un parcours des parties
+        classement = await classement_periode(db, *bornes)
+
+    if classement.total == 0:
         await interaction.response.send_message("Aucune donnée statistique disponible.", ephemeral=True)
         return
 
-    view = StatsView(interaction, stats)
+    view = StatsView(interaction, classement, libelle=libelle_periode(periode, bornes, debut, fin))
+    await view.charger_page()
     await interaction.response.send_message(embed=view.get_embed(), view=view, ephemeral=False)
 
 @bot.tree.command(name="mystats", description="Affiche tes statistiques de morpion personnelles.")
-async def mystats(interaction: discord.Interaction):
+@app_commands.describe(**DESCRIPTIONS_PERIODE)
+@app_commands.choices(periode=CHOIX_PERIODE)
+@chronometrer("mystats")
+async def mystats(interaction: discord.Interaction, periode: str = "tout", debut: str = None, fin: str = None):
     user_id = interaction.user.id
 
-    c.execute("""
-    SELECT joueur_id,
-           SUM(montant) as kamas_mises,
-           SUM(CASE WHEN gagnant_id = joueur_id THEN montant * 2 ELSE 0 END) as kamas_gagnes,
-           SUM(CASE WHEN est_nul = 1 THEN 1 ELSE 0 END) as nuls,
-           SUM(CASE WHEN gagnant_id != joueur_id AND est_nul = 0 THEN 1 ELSE 0 END) as defaites,
-           COUNT(*) as total_parties
-    FROM (
-        SELECT joueur1_id as joueur_id, montant, gagnant_id, est_nul FROM parties
-        UNION ALL
-        SELECT joueur2_id as joueur_id, montant, gagnant_id, est_nul FROM parties
-    )
-    WHERE joueur_id = ?
-    GROUP BY joueur_id
-    """, (user_id,))
-    
-    stats_data = c.fetchone()
+    try:
+        bornes = bornes_periode(periode, debut, fin)
+    except ValueError:
+        await interaction.response.send_message("❌ Les dates doivent être au format AAAA-MM-JJ.", ephemeral=True)
+        return
+    libelle = libelle_periode(periode, bornes, debut, fin)
+
+    stats_data = await stats_joueur(db, user_id, bornes)
 
     if not stats_data:
         embed = discord.Embed(
             title="📊 Tes Statistiques Morpion",
-            description="❌ Tu n'as pas encore participé à un duel. Joue ton premier duel pour voir tes stats !",
+            description=(
+                f"❌ Tu n'as joué aucun duel sur cette période ({libelle})." if libelle
+                else "❌ Tu n'as pas encore participé à un duel. Joue ton premier duel pour voir tes stats !"
+            ),
             color=discord.Color.red()
         )
         await interaction.response.send_message(embed=embed, ephemeral=True)
@@ -583,7 +1455,7 @@ async def mystats(interaction: discord.Interaction):
 
     embed = discord.Embed(
         title=f"📊 Statistiques de {interaction.user.display_name}",
-        description="Voici un résumé de tes performances au morpion.",
+        description="Voici un résumé de tes performances au morpion" + (f" ({libelle})." if libelle else "."),
         color=discord.Color.gold()
     )
 
@@ -606,16 +1478,241 @@ async def mystats(interaction: discord.Interaction):
 
     await interaction.response.send_message(embed=embed, ephemeral=True)
 
+@bot.tree.command(name="recalculstats", description="Recalcule les totaux du classement depuis l'historique des parties.")
+@app_commands.guild_only()
+@app_commands.default_permissions(administrator=True)
+@app_commands.checks.has_permissions(administrator=True)
+async def recalculstats(interaction: discord.Interaction):
+    await interaction.response.defer(ephemeral=True)
+    try:
+        nb_joueurs = await db.rebuild_totals()
+    except Exception as e:
+        print("❌ Erreur lors du recalcul des totaux:", e)
+        await interaction.followup.send("❌ Le recalcul des statistiques a échoué.", ephemeral=True)
+        return
+    await interaction.followup.send(f"✅ Totaux recalculés pour **{nb_joueurs}** joueurs.", ephemeral=True)
+
+
+def ecrire_export(table, format, limite, **filtres):
+    """Écrit l'export compressé dans un fichier temporaire ; retourne (chemin, taille).
+
+    L'écriture s'arrête dès que le fichier compressé dépasse `limite`
+    octets : le fichier est supprimé et le chemin vaut None.
+    """
+    with tempfile.NamedTemporaryFile(suffix=f".{format}.gz", delete=False) as brut:
+        try:
+            with gzip.GzipFile(fileobj=brut, mode="wb") as fichier:
+                complet = export.exporter_fichier(
+                    fichier, db.chemin, table, format, arret=lambda: brut.tell() > limite, **filtres
+                )
+        except BaseException:
+            brut.close()
+            os.remove(brut.name)
+            raise
+        taille = brut.tell()
+    if complet is None or taille > limite:
+        os.remove(brut.name)
+        return None, taille
+    return brut.name, taille
+
+@bot.tree.command(name="export", description="Exporte l'historique des parties ou les totaux par joueur.")
+@app_commands.guild_only()
+@app_commands.default_permissions(administrator=True)
+@app_commands.checks.has_permissions(administrator=True)
+@app_commands.describe(
+    table="Historique des parties ou totaux par joueur",
+    format="Format du fichier",
+    debut="Date de début incluse (AAAA-MM-JJ), parties seulement",
+    fin="Date de fin incluse (AAAA-MM-JJ), parties seulement",
+    joueur="Limiter l'export à un joueur"
+)
+@app_commands.choices(
+    table=[app_commands.Choice(name=table.capitalize(), value=table) for table in export.COLONNES],
+    format=[app_commands.Choice(name=format.upper(), value=format) for format in export.FORMATS]
+)
+async def export_commande(interaction: discord.Interaction, table: str = "parties", format: str = "csv",
+                          debut: str = None, fin: str = None, joueur: discord.Member = None):
+    try:
+        export.requete_export(table, debut, fin)
+    except ValueError:
+        if table == "joueurs" and (debut or fin):
+            message = "❌ Les totaux par joueur sont des totaux à vie : retire `debut` et `fin`."
+        else:
+            message = "❌ Les dates doivent être au format AAAA-MM-JJ."
+        await interaction.response.send_message(message, ephemeral=True)
+        return
+
+    await interaction.response.defer(ephemeral=True)
+    # Lecture par blocs et compression dans un thread : la boucle d'événements reste libre
+    limite = interaction.guild.filesize_limit
+    try:
+        chemin, taille = await asyncio.to_thread(
+            ecrire_export, table, format, limite, debut=debut, fin=fin, joueur_id=joueur.id if joueur else None
+        )
+    except Exception as e:
+        print("❌ Erreur lors de l'export:", e)
+        await interaction.followup.send("❌ L'export a échoué.", ephemeral=True)
+        return
+    if chemin is None:
+        await interaction.followup.send(
+            f"❌ L'export compressé dépasse la limite de Discord ({limite // 1024} Ko). "
+            "Utilise la route `/export` du serveur web ou des filtres plus restrictifs.",
+            ephemeral=True
+        )
+        return
+    try:
+        await interaction.followup.send(
+            f"✅ Export `{table}` ({format.upper()}, {taille // 1024} Ko compressés).",
+            file=discord.File(chemin, filename=f"{table}.{format}.gz"),
+            ephemeral=True
+        )
+    finally:
+        os.remove(chemin)
+
 
 # --- Démarrage du bot ---
-@bot.event
-async def on_ready():
-    print(f"{bot.user} est prêt !")
+async def restaurer_duels():
+    """Recharge en une lecture les duels persistés et rattache leurs vues."""
+    lignes = await db.fetch_active_duels()
+    arret = await db.fetch_meta("arret")
+    arret = datetime.fromisoformat(arret) if arret else None
+    for ligne in lignes:
+        duel_restaure = Duel(
+            duel_id=ligne["duel_id"],
+            etat=EtatDuel(ligne["etat"]),
+            channel_id=ligne["channel_id"],
+            message_id=ligne["message_id"],
+            montant=ligne["montant"],
+            joueur1_id=ligne["joueur1_id"],
+            joueur1_nom=ligne["joueur1_nom"],
+            joueur2_id=ligne["joueur2_id"],
+            joueur2_nom=ligne["joueur2_nom"],
+            croupier_id=ligne["croupier_id"],
+            croupier_nom=ligne["croupier_nom"],
+            taille=ligne["taille"],
+            aligner=ligne["aligner"]
+        )
+        if duel_restaure.etat == EtatDuel.LANCE:
+            view = TicTacToeView(duel_restaure, joueur_actif_id=ligne["joueur_actif_id"], coups=ligne["coups"])
+            duel_restaure.vue = view
+        else:
+            view = RejoindreView(duel_restaure)
+
+        bot.add_view(view, message_id=duel_restaure.message_id)
+        registre.ajouter(duel_restaure)
+        if duel_restaure.croupier_id is not None:
+            duel_restaure.croupier_assigne_id = duel_restaure.croupier_id
+            croupiers.prendre(duel_restaure.croupier_id)
+        # Le temps où le bot était arrêté ne compte pas : une partie lancée
+        # repart avec un délai de coup complet, un lobby garde le temps écoulé
+        # avant l'arrêt propre (aucun si l'arrêt n'a pas été noté)
+        if duel_restaure.etat == EtatDuel.LANCE or arret is None:
+            ecoule = 0.0
+        else:
+            ecoule = max(0.0, (arret - datetime.fromisoformat(ligne["maj"])).total_seconds())
+        planifier_expiration(duel_restaure, ecoule)
+    return len(lignes)
+
+async def _etape(nom, fonction, *args):
+    """Exécute une étape bloquante du démarrage dans un thread ; renvoie (nom, durée, résultat)."""
+    debut = time.perf_counter()
+    resultat = await asyncio.to_thread(fonction, *args)
+    return nom, time.perf_counter() - debut, resultat
+
+async def preparer():
+    """Base (schéma et migrations), table IA et rendus préparés en parallèle."""
+    debut = time.perf_counter()
+    etapes = await asyncio.gather(
+        _etape("base", db.ouvrir),
+        _etape("table IA", ia.charger, os.environ.get("IA_TABLE", "ia_morpion.bin")),
+        _etape("rendus", cache_rendu.prechauffer),
+    )
+    details = ", ".join(f"{nom} {duree * 1000:.0f} ms" for nom, duree, _ in etapes)
+    print(f"⏱️ Préparation en {(time.perf_counter() - debut) * 1000:.0f} ms ({details}).")
+    print(f"🧠 Table IA : {etapes[1][2]} positions")
+    print(f"🧩 Rendus préchauffés : {len(cache_rendu)} positions, {cache_rendu.empreinte_octets() // 1024} Ko")
+
+def empreinte_commandes():
+    """Empreinte (SHA-256) du schéma des commandes tel qu'il serait envoyé à Discord."""
+    schema = sorted((commande.to_dict(bot.tree) for commande in bot.tree.get_commands()), key=lambda c: c["name"])
+    return hashlib.sha256(json.dumps(schema, sort_keys=True).encode()).hexdigest()
+
+async def synchroniser_commandes():
+    """Synchronise les commandes seulement si leur schéma a changé depuis la dernière fois."""
+    cle = f"commandes:{bot.application_id}"
+    empreinte = empreinte_commandes()
+    if await db.fetch_meta(cle) == empreinte:
+        print("✅ Commandes inchangées : pas de synchronisation.")
+        return
     try:
         await bot.tree.sync()
-        print("✅ Commandes synchronisées.")
     except Exception as e:
         print(f"Erreur : {e}")
+        return
+    await db.save_meta(cle, empreinte)
+    print("✅ Commandes synchronisées.")
+
+@bot.event
+async def setup_hook():
+    # Une seule fois par processus, avant la connexion à la gateway (on_ready
+    # revient à chaque reconnexion)
+    debut = time.perf_counter()
+    keep_alive(db.chemin)
+    await preparer()
+    etape = time.perf_counter()
+    nb_duels = await restaurer_duels()
+    print(f"♻️ {nb_duels} duel(s) restauré(s) en {(time.perf_counter() - etape) * 1000:.0f} ms.")
+    etape = time.perf_counter()
+    await synchroniser_commandes()
+    print(f"⏱️ Synchronisation des commandes : {(time.perf_counter() - etape) * 1000:.0f} ms.")
+    print(f"⏱️ Démarrage prêt en {(time.perf_counter() - debut) * 1000:.0f} ms.")
+
+# Les rôles en cache sont invalidés à chaque changement côté serveur
+@bot.event
+async def on_guild_role_create(role):
+    roles.invalider(role.guild.id)
+
+@bot.event
+async def on_guild_role_delete(role):
+    roles.invalider(role.guild.id)
 
-keep_alive()
-bot.run(token)
+@bot.event
+async def on_guild_role_update(before, after):
+    roles.invalider(after.guild.id)
+
+@bot.event
+async def on_ready():
+    print(f"{bot.user} est prêt !")
+
+# Démarrage seulement en exécution directe : benchmarks/charge.py importe ce
+# module pour piloter les commandes et les vues hors ligne.
+async def executer_bot(token):
+    # bot.run ne gère que Ctrl-C ; un déploiement arrête le processus par
+    # SIGTERM, qui doit lui aussi fermer le bot puis vider la file d'écriture
+    try:
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, lambda: asyncio.ensure_future(bot.close()))
+    except NotImplementedError:
+        # Pas de gestionnaire de signaux dans la boucle (Windows)
+        pass
+    try:
+        async with bot:
+            await bot.start(token)
+    finally:
+        # Instant de l'arrêt : au redémarrage, seuls les délais écoulés avant lui comptent.
+        # Base jamais ouverte (connexion refusée avant setup_hook) : rien à marquer,
+        # et sans writer l'écriture attendrait indéfiniment
+        if db.ouverte:
+            try:
+                await db.save_meta("arret", datetime.utcnow().isoformat())
+            except Exception as e:
+                print("❌ Erreur lors de l'enregistrement de l'arrêt:", e)
+
+if __name__ == "__main__":
+    token = os.environ['TOKEN_BOT_DISCORD']
+    discord.utils.setup_logging()
+    try:
+        asyncio.run(executer_bot(token))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        db.close()
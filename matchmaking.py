@@ -0,0 +1,157 @@
+import bisect
+import itertools
+import time
+from dataclasses import dataclass, field
+
+# Écart relatif maximal entre deux mises appariées (0.25 : 1000 ↔ 800..1250)
+ECART_MAX = 0.25
+
+# Bornes (secondes) de l'histogramme des temps d'attente avant appariement
+TRANCHES_ATTENTE = (5, 15, 30, 60, 120, 300, 600)
+
+
+@dataclass(slots=True, order=True)
+class Inscription:
+    """Un joueur en file ; l'ordre (mise, numéro) est celui des listes triées."""
+    montant: int
+    numero: int
+    joueur_id: int = field(compare=False)
+    joueur_nom: str = field(compare=False)
+    channel_id: int = field(compare=False)
+    arrivee: float = field(compare=False)
+    variante: tuple = field(compare=False, default=(3, 3))
+
+
+def _mise(inscription):
+    return inscription.montant
+
+
+def tranche(montant):
+    """Tranche de mise : puissance de deux (1, 2-3, 4-7, 8-15, ...)."""
+    return montant.bit_length()
+
+
+class CompteurFile:
+    """Profondeur de la file et temps d'attente avant appariement."""
+
+    def __init__(self):
+        self.inscriptions = 0
+        self.appariements = 0
+        self.abandons = 0
+        self.profondeur_max = 0
+        self.attente_totale = 0.0
+        self.attente_max = 0.0
+        self.attentes = {borne: 0 for borne in TRANCHES_ATTENTE}
+        self.attentes["+"] = 0
+
+    def enregistrer_attente(self, attente):
+        self.attente_totale += attente
+        self.attente_max = max(self.attente_max, attente)
+        for borne in TRANCHES_ATTENTE:
+            if attente <= borne:
+                self.attentes[borne] += 1
+                break
+        else:
+            self.attentes["+"] += 1
+
+
+class FileAppariement:
+    """File d'attente des duels, indexée par salon, variante et tranche de mise.
+
+    Chaque tranche (salon, variante, puissance de deux) garde ses inscriptions triées
+    par mise : trouver l'adversaire le plus proche est une recherche
+    dichotomique dans la tranche du joueur et ses deux voisines, au lieu d'un
+    parcours de toute la file. L'insertion décale la fin d'une liste (O(n)
+    dans la tranche, en mémoire contiguë) : un tas ne sait pas trouver la
+    mise la plus proche, seulement la plus petite. Deux mises sont compatibles si leur écart
+    relatif ne dépasse pas `ecart_max` ; à écart égal, le plus ancien passe.
+    """
+
+    def __init__(self, ecart_max=ECART_MAX):
+        # L'écart est borné à 1 : un adversaire est alors au plus à une tranche
+        self.ecart_max = min(ecart_max, 1.0)
+        self._tranches = {}
+        self._par_joueur = {}
+        self._numeros = itertools.count()
+        self.compteur = CompteurFile()
+
+    def __contains__(self, joueur_id):
+        return joueur_id in self._par_joueur
+
+    def __len__(self):
+        return len(self._par_joueur)
+
+    def compatibles(self, a, b):
+        return max(a, b) <= min(a, b) * (1 + self.ecart_max)
+
+    def _candidat(self, channel_id, variante, montant):
+        """Inscription compatible la plus proche de `montant`, ou None."""
+        meilleur = None
+        t = tranche(montant)
+        for voisine in (t - 1, t, t + 1):
+            liste = self._tranches.get((channel_id, variante, voisine))
+            if not liste:
+                continue
+            i = bisect.bisect_left(liste, montant, key=_mise)
+            # Plus ancienne inscription à la mise immédiatement supérieure ou égale
+            if i < len(liste):
+                meilleur = self._plus_proche(meilleur, liste[i], montant)
+            # Plus ancienne inscription à la mise immédiatement inférieure
+            if i > 0:
+                montant_bas = liste[i - 1].montant
+                j = bisect.bisect_left(liste, montant_bas, key=_mise)
+                meilleur = self._plus_proche(meilleur, liste[j], montant)
+        return meilleur
+
+    def _plus_proche(self, meilleur, inscription, montant):
+        if not self.compatibles(inscription.montant, montant):
+            return meilleur
+        if meilleur is None:
+            return inscription
+        ecart, ecart_meilleur = abs(inscription.montant - montant), abs(meilleur.montant - montant)
+        if ecart < ecart_meilleur or (ecart == ecart_meilleur and inscription.numero < meilleur.numero):
+            return inscription
+        return meilleur
+
+    def inscrire(self, joueur_id, joueur_nom, montant, channel_id, variante=(3, 3)):
+        """Apparie le joueur s'il a un adversaire compatible, sinon l'inscrit.
+
+        Renvoie l'inscription de l'adversaire (retirée de la file) ou None.
+        """
+        self.compteur.inscriptions += 1
+        adversaire = self._candidat(channel_id, variante, montant)
+        if adversaire is not None:
+            self._retirer(adversaire)
+            self.compteur.appariements += 1
+            self.compteur.enregistrer_attente(time.monotonic() - adversaire.arrivee)
+            return adversaire
+
+        inscription = Inscription(montant, next(self._numeros), joueur_id, joueur_nom, channel_id, time.monotonic(), variante)
+        bisect.insort(self._tranches.setdefault((channel_id, variante, tranche(montant)), []), inscription)
+        self._par_joueur[joueur_id] = inscription
+        self.compteur.profondeur_max = max(self.compteur.profondeur_max, len(self._par_joueur))
+        return None
+
+    def reinscrire(self, inscription):
+        """Remet en file une inscription retirée par inscrire(), à sa place d'origine."""
+        bisect.insort(self._tranches.setdefault(
+            (inscription.channel_id, inscription.variante, tranche(inscription.montant)), []
+        ), inscription)
+        self._par_joueur[inscription.joueur_id] = inscription
+        self.compteur.appariements -= 1
+
+    def _retirer(self, inscription):
+        cle = (inscription.channel_id, inscription.variante, tranche(inscription.montant))
+        liste = self._tranches[cle]
+        del liste[bisect.bisect_left(liste, inscription)]
+        if not liste:
+            del self._tranches[cle]
+        del self._par_joueur[inscription.joueur_id]
+
+    def desinscrire(self, joueur_id):
+        """Retire un joueur de la file ; renvoie son inscription ou None."""
+        inscription = self._par_joueur.get(joueur_id)
+        if inscription is not None:
+            self._retirer(inscription)
+            self.compteur.abandons += 1
+        return inscription
@@ -0,0 +1,273 @@
+"""Métriques du bot au format texte Prometheus.
+
+La collecte est faite pour le chemin chaud : observer une durée coûte une
+recherche dichotomique et trois additions, sans verrou ni allocation. Les
+jauges sont des fonctions évaluées seulement quand /metrics est lu.
+
+Chaque commande ou bouton chronométré (décorateur `chronometrer`) mesure
+sa durée totale et, à part, le temps passé dans la base et dans l'API
+Discord. Ces deux temps sont cumulés dans une variable de contexte par
+les enveloppes posées sur Database (`instrumenter_db`) et sur les deux
+points de passage HTTP de discord.py (`instrumenter_discord`).
+"""
+import bisect
+import contextvars
+import functools
+import time
+import weakref
+
+# Bornes (secondes) des histogrammes de durée
+BORNES_DUREE = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+# [temps base, temps API] de la commande en cours dans la tâche courante
+_mesure_courante = contextvars.ContextVar("mesure_courante", default=None)
+
+
+def _etiquettes(noms, valeurs, extra=""):
+    paires = [f'{nom}="{valeur}"' for nom, valeur in zip(noms, valeurs)]
+    if extra:
+        paires.append(extra)
+    return "{" + ",".join(paires) + "}" if paires else ""
+
+
+class Histogramme:
+    def __init__(self, nom, aide, etiquettes=(), bornes=BORNES_DUREE):
+        self.nom = nom
+        self.aide = aide
+        self.etiquettes = etiquettes
+        self.bornes = bornes
+        # valeurs d'étiquettes -> [compte par tranche (non cumulé), somme, total]
+        self._series = {}
+
+    def observer(self, valeur, *etiquettes):
+        serie = self._series.get(etiquettes)
+        if serie is None:
+            serie = self._series[etiquettes] = [[0] * (len(self.bornes) + 1), 0.0, 0]
+        serie[0][bisect.bisect_left(self.bornes, valeur)] += 1
+        serie[1] += valeur
+        serie[2] += 1
+
+    def exposer(self):
+        lignes = [f"# HELP {self.nom} {self.aide}", f"# TYPE {self.nom} histogram"]
+        for valeurs, (comptes, somme, total) in list(self._series.items()):
+            cumul = 0
+            for borne, compte in zip(self.bornes, comptes):
+                cumul += compte
+                etiquettes = _etiquettes(self.etiquettes, valeurs, 'le="%s"' % borne)
+                lignes.append(f"{self.nom}_bucket{etiquettes} {cumul}")
+            etiquettes = _etiquettes(self.etiquettes, valeurs, 'le="+Inf"')
+            lignes.append(f"{self.nom}_bucket{etiquettes} {total}")
+            etiquettes = _etiquettes(self.etiquettes, valeurs)
+            lignes.append(f"{self.nom}_sum{etiquettes} {somme}")
+            lignes.append(f"{self.nom}_count{etiquettes} {total}")
+        return lignes
+
+
+class Compteur:
+    def __init__(self, nom, aide, etiquettes=()):
+        self.nom = nom
+        self.aide = aide
+        self.etiquettes = etiquettes
+        self._valeurs = {}
+
+    def inc(self, *etiquettes, n=1):
+        self._valeurs[etiquettes] = self._valeurs.get(etiquettes, 0) + n
+
+    def exposer(self):
+        lignes = [f"# HELP {self.nom} {self.aide}", f"# TYPE {self.nom} counter"]
+        for valeurs, valeur in list(self._valeurs.items()):
+            lignes.append(f"{self.nom}{_etiquettes(self.etiquettes, valeurs)} {valeur}")
+        return lignes
+
+
+class Jauge:
+    """Valeur lue à la demande (`fonction()`), sans coût sur le chemin chaud."""
+
+    def __init__(self, nom, aide, fonction, type_="gauge"):
+        self.nom = nom
+        self.aide = aide
+        self.fonction = fonction
+        self.type = type_
+
+    def exposer(self):
+        try:
+            valeur = self.fonction()
+        except Exception as e:
+            print(f"❌ Erreur lors de la lecture de la métrique {self.nom}:", e)
+            return []
+        return [f"# HELP {self.nom} {self.aide}", f"# TYPE {self.nom} {self.type}", f"{self.nom} {valeur}"]
+
+
+class HistogrammeLu:
+    """Histogramme tenu ailleurs, lu à la demande.
+
+    `fonction()` renvoie (tranches, somme) où `tranches` associe chaque borne
+    supérieure à son compte non cumulé, la clé "+" recevant le dépassement
+    (forme de CompteurFile.attentes et CompteurEcriture.tailles).
+    """
+
+    def __init__(self, nom, aide, fonction):
+        self.nom = nom
+        self.aide = aide
+        self.fonction = fonction
+
+    def exposer(self):
+        try:
+            tranches, somme = self.fonction()
+            tranches = dict(tranches)
+        except Exception as e:
+            print(f"❌ Erreur lors de la lecture de la métrique {self.nom}:", e)
+            return []
+        lignes = [f"# HELP {self.nom} {self.aide}", f"# TYPE {self.nom} histogram"]
+        depassement = tranches.pop("+", 0)
+        cumul = 0
+        for borne, compte in sorted(tranches.items()):
+            cumul += compte
+            lignes.append(f'{self.nom}_bucket{{le="{borne}"}} {cumul}')
+        total = cumul + depassement
+        lignes.append(f'{self.nom}_bucket{{le="+Inf"}} {total}')
+        lignes.append(f"{self.nom}_sum {somme}")
+        lignes.append(f"{self.nom}_count {total}")
+        return lignes
+
+
+class RegistreMetriques:
+    def __init__(self):
+        self._metriques = []
+
+    def ajouter(self, metrique):
+        self._metriques.append(metrique)
+        return metrique
+
+    def histogramme(self, nom, aide, etiquettes=(), bornes=BORNES_DUREE):
+        return self.ajouter(Histogramme(nom, aide, etiquettes, bornes))
+
+    def compteur(self, nom, aide, etiquettes=()):
+        return self.ajouter(Compteur(nom, aide, etiquettes))
+
+    def jauge(self, nom, aide, fonction, type_="gauge"):
+        return self.ajouter(Jauge(nom, aide, fonction, type_))
+
+    def histogramme_lu(self, nom, aide, fonction):
+        return self.ajouter(HistogrammeLu(nom, aide, fonction))
+
+    def exposer(self):
+        lignes = []
+        for metrique in self._metriques:
+            lignes.extend(metrique.exposer())
+        return "\n".join(lignes) + "\n"
+
+
+registre = RegistreMetriques()
+
+DUREES = registre.histogramme(
+    "morpion_commande_secondes", "Durée totale des commandes et boutons.", ("commande",))
+DUREES_DB = registre.histogramme(
+    "morpion_commande_db_secondes", "Temps passé dans la base pendant une commande.", ("commande",))
+DUREES_API = registre.histogramme(
+    "morpion_commande_api_secondes", "Temps passé dans l'API Discord pendant une commande.", ("commande",))
+ERREURS = registre.compteur(
+    "morpion_commande_erreurs_total", "Commandes terminées par une exception.", ("commande",))
+REQUETES_DB = registre.histogramme(
+    "morpion_db_requete_secondes", "Durée des lectures et tâches de la base vues depuis la boucle.")
+REQUETES_API = registre.histogramme(
+    "morpion_discord_requete_secondes", "Durée des requêtes HTTP vers Discord.", ("methode",))
+
+# Vues Discord créées et pas encore ramassées ; filtrées à la lecture
+vues = weakref.WeakSet()
+
+registre.jauge(
+    "morpion_vues_ouvertes", "Vues Discord actives (non terminées).",
+    lambda: sum(1 for vue in list(vues) if not vue.is_finished()))
+
+
+def _ajouter(indice, duree):
+    mesure = _mesure_courante.get()
+    if mesure is not None:
+        mesure[indice] += duree
+
+
+def chronometrer(nom):
+    """Décore une coroutine (commande, bouton) : durée totale, temps base et temps API.
+
+    Les appels imbriqués (fin de partie pendant un coup) reportent leurs
+    temps base/API sur la mesure englobante.
+    """
+    def decorateur(fonction):
+        @functools.wraps(fonction)
+        async def enveloppe(*args, **kwargs):
+            parente = _mesure_courante.get()
+            mesure = [0.0, 0.0]
+            jeton = _mesure_courante.set(mesure)
+            debut = time.perf_counter()
+            try:
+                return await fonction(*args, **kwargs)
+            except Exception:
+                ERREURS.inc(nom)
+                raise
+            finally:
+                duree = time.perf_counter() - debut
+                _mesure_courante.reset(jeton)
+                DUREES.observer(duree, nom)
+                DUREES_DB.observer(mesure[0], nom)
+                DUREES_API.observer(mesure[1], nom)
+                if parente is not None:
+                    parente[0] += mesure[0]
+                    parente[1] += mesure[1]
+        return enveloppe
+    return decorateur
+
+
+def instrumenter_db(db):
+    """Chronomètre les lectures et tâches de `db` attendues par la boucle d'événements."""
+    executer, tache_ecriture = db._executer, db._tache_ecriture
+
+    async def _executer(executor, fonction, *args):
+        debut = time.perf_counter()
+        try:
+            return await executer(executor, fonction, *args)
+        finally:
+            duree = time.perf_counter() - debut
+            REQUETES_DB.observer(duree)
+            _ajouter(0, duree)
+
+    async def _tache_ecriture(fonction):
+        debut = time.perf_counter()
+        try:
+            return await tache_ecriture(fonction)
+        finally:
+            duree = time.perf_counter() - debut
+            REQUETES_DB.observer(duree)
+            _ajouter(0, duree)
+
+    db._executer = _executer
+    db._tache_ecriture = _tache_ecriture
+
+
+def instrumenter_discord():
+    """Chronomètre toutes les requêtes HTTP de discord.py.
+
+    Les appels REST du bot passent par HTTPClient.request, les réponses aux
+    interactions par AsyncWebhookAdapter.request : envelopper ces deux
+    méthodes couvre tout le trafic vers l'API.
+    """
+    from discord.http import HTTPClient
+    from discord.webhook.async_ import AsyncWebhookAdapter
+
+    for classe in (HTTPClient, AsyncWebhookAdapter):
+        requete = classe.request
+        if getattr(requete, "_chronometree", False):
+            continue
+
+        @functools.wraps(requete)
+        async def enveloppe(self, route, *args, _requete=requete, **kwargs):
+            debut = time.perf_counter()
+            try:
+                return await _requete(self, route, *args, **kwargs)
+            finally:
+                duree = time.perf_counter() - debut
+                REQUETES_API.observer(duree, route.method)
+                _ajouter(1, duree)
+
+        enveloppe._chronometree = True
+        classe.request = enveloppe
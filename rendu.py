@@ -0,0 +1,94 @@
+import sys
+
+import engine
+
+# Emojis pour la grille de morpion
+EMOJIS_MORPION = {
+    "X": "❌",
+    "O": "⭕",
+    " ": "◻️"
+}
+
+
+# Nombre maximal de positions mémorisées pour les grilles plus grandes que 3×3
+GRANDES_GRILLES_MAX = 4096
+
+
+class CacheRendu:
+    """Grilles d'emojis mémorisées par clé de position (`Morpion.cle`).
+
+    Une grille 3×3 n'a que quelques milliers de positions atteignables :
+    après le premier rendu (ou le préchauffage), afficher une position est
+    une simple lecture de dictionnaire. Les grilles plus grandes ont bien
+    trop de positions pour être préchauffées : elles passent par un cache
+    borné, indexé par (taille, clé), qui évince les plus anciennes.
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._grilles = {}
+        self._grandes = {}
+
+    @staticmethod
+    def _dessiner(cle, taille=3):
+        cases = taille * taille
+        bits_x = cle >> cases
+        bits_o = cle & ((1 << cases) - 1)
+        lignes = []
+        for debut in range(0, cases, taille):
+            ligne = ""
+            for case in range(debut, debut + taille):
+                if (bits_x >> case) & 1:
+                    ligne += EMOJIS_MORPION["X"]
+                elif (bits_o >> case) & 1:
+                    ligne += EMOJIS_MORPION["O"]
+                else:
+                    ligne += EMOJIS_MORPION[" "]
+            lignes.append(ligne + "\n")
+        return "".join(lignes)
+
+    def grille(self, partie):
+        if partie.taille != 3:
+            return self._grande_grille(partie)
+        cle = partie.cle
+        grille = self._grilles.get(cle)
+        if grille is None:
+            self.misses += 1
+            grille = self._grilles[cle] = self._dessiner(cle)
+        else:
+            self.hits += 1
+        return grille
+
+    def _grande_grille(self, partie):
+        cle = (partie.taille, partie.cle)
+        grille = self._grandes.get(cle)
+        if grille is None:
+            self.misses += 1
+            if len(self._grandes) >= GRANDES_GRILLES_MAX:
+                del self._grandes[next(iter(self._grandes))]
+            grille = self._grandes[cle] = self._dessiner(partie.cle, partie.taille)
+        else:
+            self.hits += 1
+        return grille
+
+    def prechauffer(self):
+        """Dessine d'avance toutes les positions atteignables."""
+        for cle in engine.etats_atteignables():
+            if cle not in self._grilles:
+                self._grilles[cle] = self._dessiner(cle)
+
+    def __len__(self):
+        return len(self._grilles) + len(self._grandes)
+
+    def empreinte_octets(self):
+        """Taille approximative du cache en mémoire (dictionnaires + chaînes)."""
+        return sum(
+            sys.getsizeof(grilles) + sum(
+                sys.getsizeof(cle) + sys.getsizeof(grille) for cle, grille in grilles.items()
+            )
+            for grilles in (self._grilles, self._grandes)
+        )
+
+
+cache_rendu = CacheRendu()
@@ -0,0 +1,116 @@
+import random
+import secrets
+from dataclasses import dataclass
+from itertools import zip_longest
+from typing import Optional
+
+
+@dataclass(slots=True, eq=False)
+class Match:
+    """Un match du tableau ; `joueur2_id` vaut None pour une exemption."""
+    joueur1_id: int
+    joueur2_id: Optional[int]
+    gagnant_id: Optional[int] = None
+    # Parties nulles rejouées avant la décision
+    nuls: int = 0
+
+    @property
+    def termine(self):
+        return self.gagnant_id is not None
+
+    def perdant(self):
+        if self.joueur2_id is None or self.gagnant_id is None:
+            return None
+        return self.joueur2_id if self.gagnant_id == self.joueur1_id else self.joueur1_id
+
+
+class Tournoi:
+    """Tournoi à élimination directe : inscriptions, tableau et tours successifs.
+
+    Le tableau est complété à la puissance de deux supérieure par des
+    exemptions, intercalées entre les vrais matchs pour que deux exemptés ne
+    se retrouvent pas d'emblée. Les vainqueurs d'un tour sont appariés dans
+    l'ordre du tableau (match 2k contre match 2k+1). Chaque partie est
+    écrite dès qu'elle se termine, par la file d'écriture des duels.
+    Aucune logique Discord ici : main.py lance les parties et rapporte les
+    résultats.
+    """
+
+    def __init__(self, organisateur_id, mise, channel_id, taille=3, aligner=3, max_joueurs=128):
+        self.tournoi_id = secrets.token_hex(4)
+        self.organisateur_id = organisateur_id
+        self.mise = mise
+        self.channel_id = channel_id
+        self.taille = taille
+        self.aligner = aligner
+        self.max_joueurs = max_joueurs
+        # joueur_id -> nom, dans l'ordre d'inscription
+        self.inscrits = {}
+        self.lance = False
+        self.tour = 0
+        self.matchs = []
+        # Matchs du tour courant pas encore décidés
+        self.restants = 0
+        self.champion_id = None
+
+    def inscrire(self, joueur_id, nom):
+        if self.lance or joueur_id in self.inscrits or len(self.inscrits) >= self.max_joueurs:
+            return False
+        self.inscrits[joueur_id] = nom
+        return True
+
+    def desinscrire(self, joueur_id):
+        if self.lance:
+            return False
+        return self.inscrits.pop(joueur_id, None) is not None
+
+    def nom(self, joueur_id):
+        return self.inscrits.get(joueur_id, str(joueur_id))
+
+    @property
+    def cagnotte(self):
+        return self.mise * len(self.inscrits)
+
+    @property
+    def nb_tours(self):
+        return (len(self.inscrits) - 1).bit_length()
+
+    def demarrer(self, rng=random):
+        """Tire le tableau au sort et ouvre le premier tour ; renvoie les matchs à jouer."""
+        if len(self.inscrits) < 2:
+            raise ValueError("il faut au moins deux joueurs")
+        self.lance = True
+        joueurs = list(self.inscrits)
+        rng.shuffle(joueurs)
+        exemptions = (1 << self.nb_tours) - len(joueurs)
+        exemptes = [Match(joueur_id, None, gagnant_id=joueur_id) for joueur_id in joueurs[:exemptions]]
+        reste = joueurs[exemptions:]
+        matchs = [Match(reste[i], reste[i + 1]) for i in range(0, len(reste), 2)]
+        tableau = [match for paire in zip_longest(exemptes, matchs) for match in paire if match is not None]
+        return self._ouvrir_tour(tableau)
+
+    def _ouvrir_tour(self, matchs):
+        self.tour += 1
+        self.matchs = matchs
+        a_jouer = [match for match in matchs if not match.termine]
+        self.restants = len(a_jouer)
+        return a_jouer
+
+    def resultat(self, match, gagnant_id):
+        """Décide un match ; renvoie True quand c'était le dernier du tour."""
+        if match.termine:
+            return False
+        match.gagnant_id = gagnant_id
+        self.restants -= 1
+        return self.restants == 0
+
+    def tour_suivant(self):
+        """Ouvre le tour suivant depuis les vainqueurs ; renvoie ses matchs ([] si fini)."""
+        vainqueurs = [match.gagnant_id for match in self.matchs]
+        if len(vainqueurs) == 1:
+            self.champion_id = vainqueurs[0]
+            self.matchs = []
+            return []
+        return self._ouvrir_tour([
+            Match(vainqueurs[i], vainqueurs[i + 1]) for i in range(0, len(vainqueurs), 2)
+        ])
@@ -0,0 +1,32 @@
+import asyncio
+import contextlib
+
+
+class VerrousDuels:
+    """Un verrou asyncio par duel, créé à la demande et libéré après usage.
+
+    Les transitions d'un même duel (rejoindre, croupier, lancement, coups,
+    abandon, expiration) sont sérialisées ; deux duels différents ne
+    s'attendent jamais l'un l'autre.
+    """
+
+    def __init__(self):
+        # cle -> [verrou, nombre de tâches qui le tiennent ou l'attendent]
+        self._verrous = {}
+
+    @contextlib.asynccontextmanager
+    async def verrou(self, cle):
+        entree = self._verrous.get(cle)
+        if entree is None:
+            entree = self._verrous[cle] = [asyncio.Lock(), 0]
+        entree[1] += 1
+        try:
+            async with entree[0]:
+                yield
+        finally:
+            entree[1] -= 1
+            if entree[1] == 0:
+                del self._verrous[cle]
+
+    def __len__(self):
+        return len(self._verrous)